@@ -0,0 +1,36 @@
+"""add registered_name trigram index
+
+Revision ID: 3f9c2d7a1b84
+Revises: 60ba853299dc
+Create Date: 2026-10-17 12:10:42.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2d7a1b84'
+down_revision: Union[str, Sequence[str], None] = '60ba853299dc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Триграммный индекс для нечеткого поиска собак (DOG_MATCHER=pg_trgm)
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        'ix_dog_registered_name_trgm',
+        'dog',
+        [sa.text('lower(registered_name) gin_trgm_ops')],
+        postgresql_using='gin'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_dog_registered_name_trgm', table_name='dog')
+    op.execute("DROP EXTENSION IF EXISTS pg_trgm")
@@ -0,0 +1,62 @@
+"""add scrape job tables
+
+Revision ID: b7e41c9d2f06
+Revises: 3f9c2d7a1b84
+Create Date: 2026-10-17 15:02:37.540912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e41c9d2f06'
+down_revision: Union[str, Sequence[str], None] = '3f9c2d7a1b84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('scrape_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('start_page', sa.Integer(), nullable=False),
+        sa.Column('cursor', sa.Integer(), nullable=False),
+        sa.Column('max_pages', sa.Integer(), nullable=False),
+        sa.Column('pages_done', sa.Integer(), nullable=False),
+        sa.Column('pages_failed', sa.Integer(), nullable=False),
+        sa.Column('dogs_processed', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_scrape_job_source'), 'scrape_job', ['source'], unique=False)
+
+    op.create_table('scrape_job_page',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.Integer(), nullable=False),
+        sa.Column('page', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('dog_ids', sa.JSON(), nullable=True),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['job_id'], ['scrape_job.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('job_id', 'page', name='uq_scrape_job_page')
+    )
+    op.create_index(op.f('ix_scrape_job_page_job_id'), 'scrape_job_page', ['job_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_scrape_job_page_job_id'), table_name='scrape_job_page')
+    op.drop_table('scrape_job_page')
+    op.drop_index(op.f('ix_scrape_job_source'), table_name='scrape_job')
+    op.drop_table('scrape_job')
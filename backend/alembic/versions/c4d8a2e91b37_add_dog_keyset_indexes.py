@@ -0,0 +1,36 @@
+"""add dog keyset pagination indexes
+
+Revision ID: c4d8a2e91b37
+Revises: b7e41c9d2f06
+Create Date: 2026-10-17 16:05:12.604218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d8a2e91b37'
+down_revision: Union[str, Sequence[str], None] = 'b7e41c9d2f06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Колонки сортировки списка собак; индекс (колонка, id) на каждую для keyset-пагинации
+SORT_COLUMNS = [
+    'registered_name', 'call_name', 'year_of_birth', 'date_of_birth',
+    'land_of_birth', 'land_of_standing', 'modified_at'
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for column in SORT_COLUMNS:
+        op.create_index(f'ix_dog_{column}_id', 'dog', [column, 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for column in SORT_COLUMNS:
+        op.drop_index(f'ix_dog_{column}_id', table_name='dog')
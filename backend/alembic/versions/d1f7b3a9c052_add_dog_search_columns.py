@@ -0,0 +1,71 @@
+"""add dog full-text search columns and trigram indexes
+
+Revision ID: d1f7b3a9c052
+Revises: c4d8a2e91b37
+Create Date: 2026-10-17 17:20:36.918442
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1f7b3a9c052'
+down_revision: Union[str, Sequence[str], None] = 'c4d8a2e91b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Генерируемые колонки для фильтра search (services/dog_search.py), пересчитываются самим Postgres
+    op.execute("""
+        ALTER TABLE dog ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple'::regconfig, coalesce(registered_name, '')), 'A') ||
+            setweight(to_tsvector('simple'::regconfig, coalesce(call_name, '')), 'A') ||
+            setweight(to_tsvector('simple'::regconfig, coalesce(registration_number, '')), 'B') ||
+            setweight(to_tsvector('simple'::regconfig, coalesce(sire_name, '')), 'C') ||
+            setweight(to_tsvector('simple'::regconfig, coalesce(dam_name, '')), 'C')
+        ) STORED
+    """)
+    op.execute("""
+        ALTER TABLE dog ADD COLUMN search_text text GENERATED ALWAYS AS (
+            lower(
+                coalesce(registered_name, '') || ' ' || coalesce(call_name, '') || ' ' ||
+                coalesce(registration_number, '') || ' ' || coalesce(sire_name, '') || ' ' ||
+                coalesce(dam_name, '')
+            )
+        ) STORED
+    """)
+    op.create_index('ix_dog_search_vector', 'dog', ['search_vector'], postgresql_using='gin')
+    op.create_index(
+        'ix_dog_search_text_trgm',
+        'dog',
+        [sa.text('search_text gin_trgm_ops')],
+        postgresql_using='gin'
+    )
+    # Фильтры owner_name / breeder_name
+    op.create_index(
+        'ix_owner_name_trgm',
+        'owner',
+        [sa.text('lower(name) gin_trgm_ops')],
+        postgresql_using='gin'
+    )
+    op.create_index(
+        'ix_breeder_name_trgm',
+        'breeder',
+        [sa.text('lower(name) gin_trgm_ops')],
+        postgresql_using='gin'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_breeder_name_trgm', table_name='breeder')
+    op.drop_index('ix_owner_name_trgm', table_name='owner')
+    op.drop_index('ix_dog_search_text_trgm', table_name='dog')
+    op.drop_index('ix_dog_search_vector', table_name='dog')
+    op.drop_column('dog', 'search_text')
+    op.drop_column('dog', 'search_vector')
@@ -0,0 +1,50 @@
+"""separate dog search_text fields so substrings do not span two fields
+
+Revision ID: e3b5c7d9f214
+Revises: d1f7b3a9c052
+Create Date: 2026-10-17 21:05:12.447310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b5c7d9f214'
+down_revision: Union[str, Sequence[str], None] = 'd1f7b3a9c052'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _recreate_search_text(separator: str) -> None:
+    # Выражение генерируемой колонки не меняется на месте: пересоздаем колонку и ее индекс
+    op.drop_index('ix_dog_search_text_trgm', table_name='dog')
+    op.drop_column('dog', 'search_text')
+    op.execute(f"""
+        ALTER TABLE dog ADD COLUMN search_text text GENERATED ALWAYS AS (
+            lower(
+                coalesce(registered_name, '') || {separator} || coalesce(call_name, '') || {separator} ||
+                coalesce(registration_number, '') || {separator} || coalesce(sire_name, '') || {separator} ||
+                coalesce(dam_name, '')
+            )
+        ) STORED
+    """)
+    op.create_index(
+        'ix_dog_search_text_trgm',
+        'dog',
+        [sa.text('search_text gin_trgm_ops')],
+        postgresql_using='gin'
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Разделитель 0x1F вместо пробела: '%term%' больше не совпадает на стыке двух полей
+    _recreate_search_text("chr(31)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _recreate_search_text("' '")
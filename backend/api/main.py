@@ -157,7 +157,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from core.config import settings
 from core.database import engine
 from api.routers import dogs_router, breedbase_router, breedarchive_router, huskypedigree_router, pedigree_router, \
-    ofa_router
+    ofa_router, scrape_jobs_router
+from services.pedigree_graph import pedigree_graph
+from utils.browser_pool import browser_pool
+from utils.http_client import close_http_client
+from utils.cache import cache
+from utils.http_cache import http_cache
+from utils.single_flight import single_flight
 
 import logging
 from logging.handlers import RotatingFileHandler
@@ -205,9 +211,22 @@ async def startup():
     except Exception as e:
         print(f"Database connection failed: {e}")
 
+    # Загрузка графа родословной в память
+    try:
+        await pedigree_graph.start()
+    except Exception as e:
+        print(f"Pedigree graph loading failed: {e}")
+
+    # Инвалидации L1-кэша из других воркеров
+    cache.start()
+
 
 @app.on_event("shutdown")
-def shutdown_event():
+async def shutdown_event():
+    await cache.stop()
+    await pedigree_graph.stop()
+    await browser_pool.close()
+    await close_http_client()
     print("Application shutdown")
 
 
@@ -223,7 +242,13 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "service": "pedigree-backend"}
+    return {
+        "status": "healthy",
+        "service": "pedigree-backend",
+        "http_cache": http_cache.stats(),
+        "cache": cache.stats(),
+        "single_flight": single_flight.stats(),
+    }
 
 
 # Подключение роутеров
@@ -233,6 +258,7 @@ app.include_router(breedarchive_router, prefix="/api/v1/breedarchive", tags=["br
 app.include_router(breedbase_router, prefix="/api/v1/breedbase", tags=["breedbase"])
 app.include_router(huskypedigree_router, prefix="/api/v1/huskypedigree", tags=["huskypedigree"])
 app.include_router(ofa_router, prefix="/api/v1/ofa")
+app.include_router(scrape_jobs_router, prefix="/api/v1/scrape-jobs")
 
 # instrumentation - ОНО ТОРМОЗИТ (?)
 # FastAPIInstrumentor.instrument_app(app)
@@ -4,7 +4,8 @@ from .breedbase import router as breedbase_router
 from .huskypedigree import router as huskypedigree_router
 from .pedigree import router as pedigree_router
 from .ofa import router as ofa_router
+from .scrape_jobs import router as scrape_jobs_router
 
 
 # "pedigree_router"
-__all__ = ["dogs_router", "breedbase_router", "breedarchive_router", "huskypedigree_router", "pedigree_router", "ofa_router"]
\ No newline at end of file
+__all__ = ["dogs_router", "breedbase_router", "breedarchive_router", "huskypedigree_router", "pedigree_router", "ofa_router", "scrape_jobs_router"]
\ No newline at end of file
@@ -1,20 +1,93 @@
 import asyncio
+import json
+import time
 from fastapi import APIRouter, Query, HTTPException
-from typing import Optional
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Dict, Optional
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 import logging
-import httpx
 
 from models.dog import Dog
-from core.parsersConfig import BREEDARCHIVE_API, BREEDARCHIVE_DOG_PATH, HEADERS
+from core.parsersConfig import BREEDARCHIVE_API, BREEDARCHIVE_DOG_PATH
 from core.database import session_scope
-from parsers.breedarchive import parse_data_from_page_scripts, process_animal_by_uuid, process_animal_with_new_session, parse_breedarchive_browse_page
+from parsers.breedarchive import parse_data_from_page_scripts, process_animal_by_uuid, process_animal_with_new_session, process_animals_bulk, parse_breedarchive_browse_page, \
+    fetch_entries, ENTRIES_PAGE_SIZE
+from utils.http_client import http_client
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+async def fetch_pages_events(
+    pagesCount: int,
+    startPage: int,
+    isFullSync: bool,
+    isRefresh: bool,
+    bulk: bool,
+    concurrency: int
+) -> AsyncIterator[Dict[str, Any]]:
+    # Конвейер: следующая страница списка загружается, пока обрабатывается текущая,
+    # собаки страницы обрабатываются не более чем по concurrency одновременно
+    client = http_client()
+    semaphore = asyncio.Semaphore(concurrency)
+    pages: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+    async def produce():
+        start = startPage * ENTRIES_PAGE_SIZE
+        fetched = 0
+        try:
+            while True:
+                data = await fetch_entries(client, start)
+                await pages.put((start, data))
+                fetched += ENTRIES_PAGE_SIZE
+                start += ENTRIES_PAGE_SIZE
+                if not data.get("has_more", False) or (not isFullSync and fetched >= pagesCount * ENTRIES_PAGE_SIZE or start > 225):
+                    break
+        except Exception as e:
+            await pages.put(e)
+            return
+        await pages.put(None)
+
+    async def process(animal: Dict) -> int:
+        async with semaphore:
+            return await process_animal_with_new_session(client, animal, isRefresh)
+
+    logger.info(f'Start fetching recent updates data from BreedArchive API...')
+    if not isFullSync:
+        available_pages = int((250 - startPage * ENTRIES_PAGE_SIZE) / ENTRIES_PAGE_SIZE)
+        logger.info(f'Start page: {startPage} \nPages to parse: {pagesCount} \nAvailable pages: {available_pages}')
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await pages.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            start, data = item
+            animals = data.get("animals", [])
+            started = time.perf_counter()
+            event = {"event": "page", "start": start}
+
+            if bulk:
+                async with session_scope() as session:
+                    stats = await process_animals_bulk(client, session, animals)
+                event["parsed_dog_ids"] = stats.pop("dog_ids")
+                event["ingest"] = stats
+            else:
+                results = await asyncio.gather(*(process(animal) for animal in animals), return_exceptions=True)
+                event["parsed_dog_ids"] = [r for r in results if isinstance(r, int)]
+
+            event["failed"] = len(animals) - len(event["parsed_dog_ids"])
+            event["seconds"] = round(time.perf_counter() - started, 2)
+            logger.info(f'Start: {start}, processed_dogs_count: {len(event["parsed_dog_ids"])}, failed: {event["failed"]}')
+            yield event
+    finally:
+        producer.cancel()
+
 @router.post("/dog/fetchPages", tags=["breedarchive"])
 async def sync_breedarchive_data(
     pagesCount: Optional[int] = Query(
@@ -31,48 +104,38 @@ async def sync_breedarchive_data(
     ),
     isFullSync: bool = False, 
     isRefresh: bool = False,
+    bulk: bool = Query(False, description="Пакетная запись страницы (upsert одним flush)"),
+    concurrency: int = Query(4, ge=1, le=16, description="Сколько собак страницы обрабатывается одновременно. Каждая собака загружает страницы своей родословной параллельно, до BREEDARCHIVE_PAGE_CONCURRENCY штук, так что всего одновременных загрузок страниц до concurrency × BREEDARCHIVE_PAGE_CONCURRENCY"),
+    stream: bool = Query(False, description="Отдавать прогресс по страницам в NDJSON по мере обработки"),
 ):
+    events = fetch_pages_events(pagesCount, startPage, isFullSync, isRefresh, bulk, concurrency)
+
+    if stream:
+        async def ndjson():
+            parsed_count = 0
+            try:
+                async for event in events:
+                    parsed_count += len(event["parsed_dog_ids"])
+                    yield json.dumps(event, default=str) + "\n"
+                yield json.dumps({"event": "done", "status": "success", "processed_dogs_count": parsed_count}) + "\n"
+            except Exception as e:
+                logger.error(f"Error in breedarchive fetchPages stream: {str(e)}")
+                yield json.dumps({"event": "error", "detail": str(e), "processed_dogs_count": parsed_count}) + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
     try:
-        async with httpx.AsyncClient() as client:
-            start = startPage * 25
-            parsed_dog_ids = []
-            parsedRowsCounter = 0
-            available_pages = int((250 - startPage * 25) / 25)
-            has_more = True
-
-            logger.info(f'Start fetching recent updates data from BreedArchive API...')
-            
-            if(not isFullSync):
-                logger.info(f'Start page: {startPage} \nPages to parse: {pagesCount} \nAvailable pages: {available_pages}')
-            
-            while True:
-                url = f"{BREEDARCHIVE_API}/ng_animal/get_entries?operation=all&start={start}"
-                response = await client.get(url, headers=HEADERS)
-                data = response.json()
-
-                semaphore = asyncio.Semaphore(8)
-                tasks = []
-                            
-                for animal in data["animals"]:
-                    async with semaphore:
-                        tasks.append(
-                            process_animal_with_new_session(client, animal, isRefresh)
-                        )
-                
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                parsed_dog_ids.extend([r for r in results if isinstance(r, int)])
-                
-                parsedRowsCounter += 25
-                start += 25
-                
-                if not data.get("has_more", False) or (not isFullSync and parsedRowsCounter >= pagesCount * 25 or start > 225):
-                    has_more = False
-                    break    
-                    
-                logger.info(f'Start: {start}, parsed_dog_ids: {parsed_dog_ids}, "processed_dogs_count": {len(parsed_dog_ids)}')
-                                
-            return {"status": "success", "parsed_dog_ids": parsed_dog_ids, "processed_dogs_count": len(parsed_dog_ids)}
+        parsed_dog_ids = []
+        ingest_stats = []
+        async for event in events:
+            parsed_dog_ids.extend(event["parsed_dog_ids"])
+            if bulk:
+                ingest_stats.append(event["ingest"])
+
+        result = {"status": "success", "parsed_dog_ids": parsed_dog_ids, "processed_dogs_count": len(parsed_dog_ids)}
+        if bulk:
+            result["ingest"] = ingest_stats
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
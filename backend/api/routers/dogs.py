@@ -1,66 +1,39 @@
 from datetime import datetime
 import logging
-from fastapi import APIRouter, Depends, Query, HTTPException, Body
+from fastapi import APIRouter, Depends, Query, HTTPException, Body, BackgroundTasks, Request
 from sqlalchemy import select, update
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
-from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
 import os
 
-from models.dog import Dog, DogListResponse, DogRead
+from models.dog import Dog, DogCursorResponse, DogListResponse, DogRead, DogReadSimple
 from models.merge_log import MergeLog
 from services.dog_service import DogService
-from core.database import get_async_session
+from services.dog_search import suggest_dogs
+from services.read_cache import DOG_TTL, dog_dependencies, etag_matches, json_response, list_etag, not_modified, read_through
+from services.coi_service import CoiService
+from core.database import async_session, get_async_session
+from utils.serialization import dumps, serializer
+from utils.single_flight import single_flight
 import json
 
 logger = logging.getLogger(__name__)
 
+# Карточки собак собираются без валидации DogRead на каждый объект (utils/serialization.py)
+dog_read = serializer(DogRead)
+
 router = APIRouter()
 
 class DogNotesUpdateRequest(BaseModel):
     notes: Optional[str] = None
     data_correctness_notes: Optional[str] = None
 
-@router.get("/{dog_id}", response_model=DogRead, tags=["dogs"])
-async def get_dog(
-    dog_id: int,
-    session: AsyncSession = Depends(get_async_session)
-):
-    try:
-        result = await session.execute(
-            select(Dog)
-            .where(Dog.id == dog_id)
-            .options(
-                selectinload(Dog.titles),
-                selectinload(Dog.owners),
-                selectinload(Dog.breeders),
-                selectinload(Dog.dam),
-                selectinload(Dog.sire),
-                selectinload(Dog.litters_as_dam),
-                selectinload(Dog.litters_as_sire),
-                selectinload(Dog.litters_as_mating_partner),
-                selectinload(Dog.birth_litter),
-                selectinload(Dog.siblings),
-                selectinload(Dog.medical_records),
-                selectinload(Dog.merge_logs),
-            )
-        )
-        dog = result.scalars().first()
-        if not dog:
-            raise HTTPException(status_code=404, detail="Dog not found")
-        return dog
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-# Эндпоинт для получения списка собак с фильтрами
-@router.get("/", response_model=DogListResponse, tags=["dogs"])
-async def get_dogs(
-    # Пагинация
-    page: int = Query(1, ge=1),
-    per_page: int = Query(20, ge=1, le=100),
-
+# Фильтры и сортировка списка собак, общие для постраничного и курсорного режима
+def dog_list_filters(
     # Основные фильтры
     search: Optional[str] = Query(None, description="Search in registered_name, registration_number, call_name"),
 
@@ -91,56 +64,147 @@ async def get_dogs(
     # Сортировка
     sort_by: Optional[str] = Query('registered_name', enum=[
         'registered_name', 'call_name', 'year_of_birth', 'date_of_birth',
-        'land_of_birth', 'land_of_standing', 'modified_at'
+        'land_of_birth', 'land_of_standing', 'modified_at', 'relevance'
     ]),
     sort_order: Optional[str] = Query('asc', enum=['asc', 'desc']),
+) -> Dict[str, Any]:
+    return dict(
+        search=search,
+        color=color,
+        land_of_birth=land_of_birth,
+        land_of_standing=land_of_standing,
+        owner_name=owner_name,
+        breeder_name=breeder_name,
+
+        sex=sex,
+        neutered=neutered,
+        frozen_semen=frozen_semen,
+        artificial_insemination=artificial_insemination,
+        has_photo=has_photo,
+        has_conflicts=has_conflicts,
+
+        min_year=min_year,
+        max_year=max_year,
+        date_of_birth_start=date_of_birth_start,
+        date_of_birth_end=date_of_birth_end,
+        date_of_death_start=date_of_death_start,
+        date_of_death_end=date_of_death_end,
+        modified_at_start=modified_at_start,
+        modified_at_end=modified_at_end,
+
+        sort_by=sort_by,
+        sort_order=sort_order
+    )
+
+# Подсказки для поля поиска по префиксам слов
+@router.get("/search/suggest", response_model=List[DogReadSimple], tags=["dogs"])
+async def suggest_dogs_route(
+    q: str = Query(..., min_length=1, description="Typed prefix of a name, call name or registration number"),
+    limit: int = Query(10, ge=1, le=50),
+    session: AsyncSession = Depends(get_async_session)
+):
+    try:
+        return await suggest_dogs(session, q, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
+# Список для таблицы: легкие строки и курсор вместо номера страницы.
+# Объявлен до /{dog_id}, иначе "list" разбирался бы как id собаки
+@router.get("/list", response_model=DogCursorResponse, tags=["dogs"])
+async def get_dogs_list(
+    request: Request,
+    per_page: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    count: str = Query("none", enum=["none", "estimate", "exact"], description="Total rows: skip, estimate or exact count"),
+    filters: Dict[str, Any] = Depends(dog_list_filters),
     session: AsyncSession = Depends(get_async_session)
 ):
+    etag = await list_etag(request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
     try:
-        return await DogService(session).get_dogs_paginated(
-            page=page,
-            per_page=per_page,
-
-            search=search,
-            color=color,
-            land_of_birth=land_of_birth,
-            land_of_standing=land_of_standing,
-            owner_name=owner_name,
-            breeder_name=breeder_name,
-
-            sex=sex,
-            neutered=neutered,
-            frozen_semen=frozen_semen,
-            artificial_insemination=artificial_insemination,
-            has_photo=has_photo,
-            has_conflicts=has_conflicts,
-
-            min_year=min_year,
-            max_year=max_year,
-            date_of_birth_start=date_of_birth_start,
-            date_of_birth_end=date_of_birth_end,
-            date_of_death_start=date_of_death_start,
-            date_of_death_end=date_of_death_end,
-            modified_at_start=modified_at_start,
-            modified_at_end=modified_at_end,
-
-            sort_by=sort_by,
-            sort_order=sort_order
-        )
+        result = await DogService(session).get_dogs_keyset(per_page=per_page, cursor=cursor, count=count, **filters)
+        return json_response(dumps(result), request, etag=etag)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{dog_id}", response_model=DogRead, tags=["dogs"])
+async def get_dog(
+    dog_id: int,
+    request: Request
+):
+    async def load():
+        # Своя сессия: загрузку ждут и другие запросы, а сессия запроса закрывается вместе с ним
+        async with async_session() as session:
+            result = await session.execute(
+                select(Dog)
+                .where(Dog.id == dog_id)
+                .options(
+                    selectinload(Dog.titles),
+                    selectinload(Dog.owners),
+                    selectinload(Dog.breeders),
+                    selectinload(Dog.dam),
+                    selectinload(Dog.sire),
+                    selectinload(Dog.litters_as_dam),
+                    selectinload(Dog.litters_as_sire),
+                    selectinload(Dog.litters_as_mating_partner),
+                    selectinload(Dog.birth_litter),
+                    selectinload(Dog.siblings),
+                    selectinload(Dog.medical_records),
+                    selectinload(Dog.merge_logs),
+                )
+            )
+            dog = result.scalars().first()
+            return dog_read(dog)
+
+    try:
+        response = await read_through(f"dog:{dog_id}", dog_dependencies(dog_id), load, DOG_TTL, request)
+        if response is None:
+            raise HTTPException(status_code=404, detail="Dog not found")
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Эндпоинт для получения списка собак с фильтрами
+@router.get("/", response_model=DogListResponse, tags=["dogs"])
+async def get_dogs(
+    request: Request,
+    # Пагинация
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+
+    filters: Dict[str, Any] = Depends(dog_list_filters),
+    session: AsyncSession = Depends(get_async_session)
+):
+    etag = await list_etag(request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    try:
+        result = await DogService(session).get_dogs_paginated(page=page, per_page=per_page, **filters)
+        data = dumps({"data": [dog_read(dog) for dog in result["data"]], "meta": result["meta"]})
+        return json_response(data, request, etag=etag)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{dog_id}/calculate-coi", tags=["dogs"])
 async def calculate_coi(
     dog_id: int,
-    max_generations: int = Query(10, ge=1, le=20, description="Maximum number of generations to analyze"),
-    session: AsyncSession = Depends(get_async_session)
+    max_generations: int = Query(10, ge=1, le=20, description="Maximum number of generations to analyze")
 ):
+    async def calculate() -> bytes:
+        # Своя сессия: расчет переживает отмену запроса, который его начал
+        async with async_session() as session:
+            result = await DogService(session).calculate_coi(dog_id, max_generations)
+        return json.dumps(jsonable_encoder(result)).encode()
+
     try:
-        dog_service = DogService(session)
-        result = await dog_service.calculate_coi(dog_id, max_generations)
-        return result
+        # Одновременные запросы расчета для одной собаки ждут один общий расчет
+        data = await single_flight.do(f"coi:{dog_id}:{max_generations}", calculate)
+        return Response(content=data, media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
@@ -224,6 +288,40 @@ async def batch_calculate_coi(
         logger.error(f"Error in batch COI calculation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error in batch COI calculation: {str(e)}")
 
+async def recalculate_coi_job(modified_since: Optional[datetime] = None):
+    async with async_session() as session:
+        try:
+            await CoiService(session).recalculate(modified_since)
+        except Exception as e:
+            logger.error(f"Error in population COI recalculation: {str(e)}")
+
+@router.post("/recalculate-coi", tags=["dogs"])
+async def recalculate_coi(
+    background_tasks: BackgroundTasks,
+    modified_since: Optional[datetime] = Query(None, description="Only dogs modified since this date; all dogs if omitted"),
+    background: bool = Query(True, description="Run in background and return immediately"),
+    session: AsyncSession = Depends(get_async_session)
+):
+    try:
+        if background:
+            background_tasks.add_task(recalculate_coi_job, modified_since)
+            return {"status": "scheduled", "modified_since": modified_since}
+
+        return await CoiService(session).recalculate(modified_since)
+    except Exception as e:
+        logger.error(f"Error in population COI recalculation: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error in population COI recalculation: {str(e)}")
+
+@router.post("/recalculate-coi/dirty", tags=["dogs"])
+async def recalculate_dirty_coi(
+    session: AsyncSession = Depends(get_async_session)
+):
+    try:
+        return await CoiService(session).recalculate_dirty()
+    except Exception as e:
+        logger.error(f"Error refreshing stale COI: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error refreshing stale COI: {str(e)}")
+
 # Роут для разрешения конфликтов по dog_id
 @router.post("/{dog_id}/resolve_conflicts", tags=["dogs"])
 async def resolve_conflicts(
@@ -0,0 +1,61 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import logging
+
+from core.database import get_async_session
+from services.scrape_jobs import ScrapeJobService, SOURCES, retry_failed_pages
+from tasks.update_data import scrape_source
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["scrape-jobs"])
+
+@router.post("/{source}/start")
+async def start_scrape_job(
+    source: str,
+    max_pages: Optional[int] = Query(None, ge=1, description="Pages to crawl; full listing if omitted")
+):
+    if source not in SOURCES:
+        raise HTTPException(status_code=404, detail=f"Unknown source: {source}")
+    # Обход идет в воркерах Celery, а не в процессе API: задача сама продолжит незавершенный обход
+    # или пропустит запуск, если обход источника уже идет
+    try:
+        task = scrape_source.delay(source, max_pages)
+    except Exception as e:
+        logger.error(f"Error queueing scrape job for {source}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error queueing scrape job: {str(e)}")
+    return {"status": "queued", "task_id": task.id, "source": source, "max_pages": max_pages}
+
+@router.get("/")
+async def list_scrape_jobs(
+    source: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    session: AsyncSession = Depends(get_async_session)
+):
+    return await ScrapeJobService(session).list(source, limit)
+
+@router.get("/{job_id}")
+async def get_scrape_job(
+    job_id: int,
+    session: AsyncSession = Depends(get_async_session)
+):
+    status = await ScrapeJobService(session).status(job_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Scrape job not found")
+    return status
+
+@router.post("/{job_id}/retry-failed")
+async def retry_failed_scrape_pages(
+    job_id: int,
+    background_tasks: BackgroundTasks,
+    session: AsyncSession = Depends(get_async_session)
+):
+    job = await ScrapeJobService(session).get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scrape job not found")
+    if job.pages_failed == 0:
+        return {"status": "nothing_to_retry", "job_id": job_id}
+
+    background_tasks.add_task(retry_failed_pages, job_id)
+    return {"status": "scheduled", "job_id": job_id, "pages_failed": job.pages_failed}
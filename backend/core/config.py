@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 from pydantic_settings import BaseSettings
 from pydantic import AnyHttpUrl, RedisDsn, validator
 
@@ -18,6 +18,46 @@ class Settings(BaseSettings):
     REDIS_URL: RedisDsn
     
     BREEDARCHIVE_USER: str
+
+    # Нечеткий поиск собак: "index" - триграммный индекс в процессе, "pg_trgm" - поиск в Postgres
+    DOG_MATCHER: Literal["index", "pg_trgm"] = "index"
+    DOG_MATCHER_TRGM_THRESHOLD: float = 0.3
+    DOG_MATCHER_TRGM_LIMIT: int = 20
+
+    # Общий пул браузеров Playwright для парсеров
+    BROWSER_POOL_SIZE: int = 2
+    BROWSER_MAX_PAGES: int = 8  # одновременно открытых страниц на процесс
+    BROWSER_PAGE_MAX_USES: int = 50  # после стольких переходов контекст страницы пересоздается
+    BROWSER_MAX_BROWSER_PAGES: int = 500  # после стольких контекстов браузер перезапускается
+
+    # Дисковый кэш HTTP-ответов парсеров; TTL в секундах по источникам
+    HTTP_CACHE_PATH: str = "http_cache.sqlite3"
+    HTTP_CACHE_TTL: Dict[str, int] = {
+        "breedarchive": 6 * 3600,
+        "breedbase": 8 * 24 * 3600,
+        "huskypedigree": 8 * 24 * 3600,
+    }
+
+    # Обход сайтов парсерами: число воркеров и лимит запросов в секунду на хост
+    CRAWL_WORKERS: int = 4
+    CRAWL_DEFAULT_RATE: float = 1.0
+    CRAWL_BURST: int = 2
+    CRAWL_HOST_RATES: Dict[str, float] = {
+        "breedbase.ru": 2.0,
+        "husky.pedigre.net": 2.0,
+        "siberianhusky.breedarchive.com": 1.0,
+    }
+
+    # Сколько страниц собак родословной Breedarchive загружается одновременно
+    BREEDARCHIVE_PAGE_CONCURRENCY: int = 8
+
+    # Полный обход в Celery: страниц списка в одной задаче воркера
+    SCRAPE_CHUNK_PAGES: int = 10
+
+    # L1-кэш в памяти каждого воркера API перед Redis; TTL - страховка на случай потерянной инвалидации
+    CACHE_L1_MAX_ENTRIES: int = 10000
+    CACHE_L1_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_L1_TTL: int = 300
     
     class Config:
         case_sensitive = True
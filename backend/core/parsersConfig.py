@@ -22,5 +22,4 @@ HEADERS = {
     "accept": "application/json",
     "x-requested-with": "XMLHttpRequest"
 }
-DELAY_RANGE = (1, 3)  # Случайная задержка между запросами в секундах
 MAX_RETRIES = 3
\ No newline at end of file
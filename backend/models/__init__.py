@@ -2,9 +2,10 @@ from .associations import DogBreederLink, DogOwnerLink
 from .people import Breeder, Owner, BreederRead, OwnerRead
 from .litters import Litter, LitterBase, LitterRead
 from .title import Title, TitleRead
-from .dog import Dog, DogBase, DogSiblingLink, DogCreate, DogRead, DogReadSimple
+from .dog import Dog, DogBase, DogSiblingLink, DogCreate, DogRead, DogReadSimple, DogListItem, DogCursorResponse
 from .medicalRecord import MedicalRecord, MedicalRecordBase, MedicalRecordCreate, MedicalRecordRead
 from .merge_log import MergeLog, MergeLogRead
+from .scrape_job import ScrapeJob, ScrapeJobPage
 
 # "DogRead"
 __all__ = [
@@ -14,6 +15,8 @@ __all__ = [
     "DogCreate",
     "DogRead",
     "DogReadSimple",
+    "DogListItem",
+    "DogCursorResponse",
     "Breeder",
     "Owner",
     "Litter",
@@ -31,4 +34,6 @@ __all__ = [
     "BreederRead",
     "OwnerRead",
     "LitterRead",
+    "ScrapeJob",
+    "ScrapeJobPage",
 ]
\ No newline at end of file
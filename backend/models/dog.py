@@ -1,11 +1,12 @@
 
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import JSON, Column, DateTime, Index, Integer, ForeignKeyConstraint
+from sqlalchemy import JSON, Column, Computed, DateTime, Index, Integer, ForeignKeyConstraint, Text, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from typing import Optional, List, Dict, Union, TYPE_CHECKING
 from datetime import datetime, date
 # from pydantic import validator
 
-from models.response import PaginationMeta
+from models.response import CursorMeta, PaginationMeta
 
 from .associations import DogBreederLink, DogOwnerLink
 from .people import Breeder, Owner
@@ -172,16 +173,50 @@ class DogSiblingLink(SQLModel, table=True):
         }
     )
 
+# Выражения генерируемых колонок поиска (services/dog_search.py), совпадают с миграциями
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('simple'::regconfig, coalesce(registered_name, '')), 'A') ||
+    setweight(to_tsvector('simple'::regconfig, coalesce(call_name, '')), 'A') ||
+    setweight(to_tsvector('simple'::regconfig, coalesce(registration_number, '')), 'B') ||
+    setweight(to_tsvector('simple'::regconfig, coalesce(sire_name, '')), 'C') ||
+    setweight(to_tsvector('simple'::regconfig, coalesce(dam_name, '')), 'C')
+"""
+# Поля разделены символом 0x1F, которого нет в данных: подстрока не совпадет на стыке двух полей
+SEARCH_TEXT_SQL = """
+    lower(
+        coalesce(registered_name, '') || chr(31) || coalesce(call_name, '') || chr(31) ||
+        coalesce(registration_number, '') || chr(31) || coalesce(sire_name, '') || chr(31) ||
+        coalesce(dam_name, '')
+    )
+"""
+SEARCH_COLUMNS = ["search_vector", "search_text"]
+
 class Dog(DogBase, table=True):
     __table_args__ = (
+        # Генерируемые колонки поиска есть только в таблице: ORM их не читает и не пишет
+        Column("search_vector", TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)),
+        Column("search_text", Text, Computed(SEARCH_TEXT_SQL, persisted=True)),
         Index('ix_dog_dam_id', 'dam_id'),
         Index('ix_dog_sire_id', 'sire_id'),
+        # Keyset-пагинация списка собак по колонке сортировки и id
+        Index('ix_dog_registered_name_id', 'registered_name', 'id'),
+        Index('ix_dog_call_name_id', 'call_name', 'id'),
+        Index('ix_dog_year_of_birth_id', 'year_of_birth', 'id'),
+        Index('ix_dog_date_of_birth_id', 'date_of_birth', 'id'),
+        Index('ix_dog_land_of_birth_id', 'land_of_birth', 'id'),
+        Index('ix_dog_land_of_standing_id', 'land_of_standing', 'id'),
+        Index('ix_dog_modified_at_id', 'modified_at', 'id'),
+        # Поиск: префиксы слов по search_vector, подстроки по search_text, нечеткое сравнение имен (pg_trgm)
+        Index('ix_dog_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_dog_search_text_trgm', text('search_text gin_trgm_ops'), postgresql_using='gin'),
+        Index('ix_dog_registered_name_trgm', text('lower(registered_name) gin_trgm_ops'), postgresql_using='gin'),
         # Явное имя для внешнего ключа birth_litter_id
         ForeignKeyConstraint(
             ["birth_litter_id"], ["litter.id"],
             name="fk_dog_birth_litter_id"
         ),
     )
+    __mapper_args__ = {"exclude_properties": SEARCH_COLUMNS}
     id: int = Field(default=None, primary_key=True)
     # Relationships
     dam_id: Optional[int] = Field(
@@ -431,6 +466,42 @@ class DogReadSimple(SQLModel):
     class Config:
         from_attributes = True
 
+# Строка таблицы списка собак: только колонки, без связей
+class DogListItem(SQLModel):
+    id: int
+    uuid: str
+    registered_name: Optional[str]
+    call_name: Optional[str]
+    sex: int
+    year_of_birth: Optional[int]
+    date_of_birth: Optional[datetime]
+    land_of_birth: Optional[str]
+    land_of_standing: Optional[str]
+    color: Optional[str]
+    color_marking: Optional[str]
+    photo_url: Optional[str]
+    coi: Optional[float]
+    coi_updated_on: Optional[datetime]
+    incomplete_pedigree: Optional[bool]
+    neutered: Optional[bool]
+    approved_for_breeding: Optional[bool]
+    frozen_semen: Optional[bool]
+    artificial_insemination: Optional[bool]
+    has_conflicts: Optional[bool]
+    source: Optional[str]
+    modified_at: Optional[datetime]
+    dam_id: Optional[int]
+    dam_name: Optional[str]
+    sire_id: Optional[int]
+    sire_name: Optional[str]
+
+    class Config:
+        from_attributes = True
+
+class DogCursorResponse(SQLModel):
+    data: List[DogListItem]
+    meta: CursorMeta
+
 # Обновляем DogRead для использования упрощенных моделей
 class DogRead(DogBase):
     id: int
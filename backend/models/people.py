@@ -1,11 +1,16 @@
 
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index, text
 from typing import List, Optional, Any
 
 from .associations import DogBreederLink, DogOwnerLink
 
 class Breeder(SQLModel, table=True):
     __tablename__ = "breeder"
+    __table_args__ = (
+        # Фильтр breeder_name: подстрока в lower(name)
+        Index('ix_breeder_name_trgm', text('lower(name) gin_trgm_ops'), postgresql_using='gin'),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     uuid: Optional[str] = Field(unique=True, index=True)
     name: str
@@ -37,6 +42,10 @@ class Breeder(SQLModel, table=True):
 
 class Owner(SQLModel, table=True):
     __tablename__ = "owner"
+    __table_args__ = (
+        # Фильтр owner_name: подстрока в lower(name)
+        Index('ix_owner_name_trgm', text('lower(name) gin_trgm_ops'), postgresql_using='gin'),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     uuid: Optional[str] = Field(unique=True, index=True)
     name: str
@@ -10,6 +10,13 @@ class PaginationMeta(SQLModel):
     total_pages: int
     has_more: bool
 
+class CursorMeta(SQLModel):
+    per_page: int
+    next_cursor: Optional[str] = None
+    has_more: bool
+    total: Optional[int] = None
+    total_is_estimate: bool = False
+
 class DogListResponse(SQLModel):
     data: List['Dog']
     meta: PaginationMeta
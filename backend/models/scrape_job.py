@@ -0,0 +1,33 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Column, JSON, UniqueConstraint
+from typing import List, Optional
+from datetime import datetime
+
+class ScrapeJob(SQLModel, table=True):
+    __tablename__ = "scrape_job"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    source: str = Field(index=True)  # breedarchive / breedbase / huskypedigree
+    status: str = Field(default="pending")  # pending / running / completed / failed
+    start_page: int = 0
+    cursor: int = 0  # следующая страница списка, с которой продолжится обход
+    max_pages: int
+    pages_done: int = 0
+    pages_failed: int = 0
+    dogs_processed: int = 0
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)  # он же heartbeat запущенного обхода
+    finished_at: Optional[datetime] = None
+
+class ScrapeJobPage(SQLModel, table=True):
+    # Чекпоинт по одной странице списка: обработанные собаки или ошибка для повторной попытки
+    __tablename__ = "scrape_job_page"
+    __table_args__ = (UniqueConstraint("job_id", "page", name="uq_scrape_job_page"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: int = Field(foreign_key="scrape_job.id", index=True)
+    page: int
+    status: str  # done / failed
+    attempts: int = 1
+    dog_ids: Optional[List[int]] = Field(sa_column=Column(JSON), default=None)
+    error: Optional[str] = None
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
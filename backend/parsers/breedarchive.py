@@ -2,28 +2,32 @@ import httpx
 import logging
 import asyncio
 import sys
-import random
 import json
 import re
+import time
 
 from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from typing import Optional, List, Set, Dict, Any
+from typing import Optional, List, Set, Dict, Any, Tuple
 from datetime import datetime, timedelta
 from fastapi import HTTPException
 
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import playwright
-from playwright.async_api import async_playwright
 import tracemalloc
 
 from core.database import session_scope
 from core.config import settings
-from core.parsersConfig import BREEDARCHIVE_API, BREEDARCHIVE_DOG_PATH, DELAY_RANGE, HEADERS, MAX_RETRIES
-from utils.parser_utils import  get_photo_url, parse_coi, parse_datetime, parse_float, parse_int, parse_date
+from core.parsersConfig import BREEDARCHIVE_API, BREEDARCHIVE_DOG_PATH, HEADERS, MAX_RETRIES
+from utils.browser_pool import browser_pool
+from utils.crawl_frontier import rate_limiter
+from utils.http_cache import http_cache
+from utils.http_client import http_client
+from utils.parser_utils import  extract_js_json, get_photo_url, parse_coi, parse_datetime, parse_float, parse_int, parse_date
 from models import Dog, Breeder, Owner, Title, Litter, DogBreederLink, DogOwnerLink, DogSiblingLink
-from utils.dog_matcher import find_existing_dog, detect_conflicts, merge_dog_data
+from utils.dog_matcher import find_existing_dog, find_existing_dogs, detect_conflicts, merge_dog_data
+from services.bulk_ingest import BulkIngestor
 
 tracemalloc.start()
 logger = logging.getLogger(__name__)
@@ -73,17 +77,24 @@ async def fetch_recent_updates_dogs(session, isFullSync: bool = True, pagesCount
                     logger.info(f'Start page: {startPage} \nPages to parse: {pagesCount} \nAvailable pages: {available_pages}')
 
                 while True:
-                    await asyncio.sleep(random.uniform(*DELAY_RANGE))
                     # Данный запрос только для новых данных / возвращает максимум 250 собак (самых новых по дате), с меткой is_new если новая запись, и без если просто обновились данные, т.е. макс start=225
                     url = f"{BREEDARCHIVE_API}/ng_animal/get_entries?operation=all&start={start}"
+                    await rate_limiter.acquire(url)
                     response = await client.get(url, headers=HEADERS)
                     data = response.json()
                     logger.info(f"response.json(): {data}")
+                    # Сопоставляем всю страницу с базой сразу; по данным списка надежны только имя и uuid,
+                    # остальные собаки ищутся заново уже по детальным данным
+                    matches = await find_existing_dogs(session, data["animals"], "breedarchive")
+
                     # Обрабатываем каждое животное из списка
-                    for animal in data["animals"]:
+                    for animal, match in zip(data["animals"], matches):
                         try:
                             # Используем данные из списка как основу
-                            dog = await process_animal(client, session, animal, isRefresh)
+                            dog = await process_animal(
+                                client, session, animal, isRefresh,
+                                match=match if match[1] in ("exact_name", "uuid") else None
+                            )
                             logger.info(f"process_animal return: {dog}")
                             parsed_dog_ids.append(dog.id)
                         except Exception as e:
@@ -116,7 +127,7 @@ async def process_animal_with_new_session(client: httpx.AsyncClient, animal_data
             logger.error(f"Failed to process {animal_data['uuid']}: {str(e)}")
             raise
 
-async def process_animal(client: httpx.AsyncClient, session: AsyncSession, animal_data: Dict, maxDeep = 3, isRefresh: bool = False):
+async def process_animal(client: httpx.AsyncClient, session: AsyncSession, animal_data: Dict, maxDeep = 3, isRefresh: bool = False, match: Optional[Tuple[Optional[Dog], str, float]] = None):
     try:
         uuid = animal_data.get("uuid")
         link_name = animal_data.get('link_name', 'unknown')  # значение по умолчанию
@@ -127,7 +138,7 @@ async def process_animal(client: httpx.AsyncClient, session: AsyncSession, anima
 
         # Запрашиваем детальные данные (предки + доп. поля)
         detailed_url = f"{BREEDARCHIVE_API}/animal/get_ancestors/{uuid}?generations=5"
-        response = await client.get(detailed_url, headers=HEADERS)
+        response = await http_cache.get(client, detailed_url, "breedarchive", HEADERS)
         detailed_data = response.json()
 
         # Объединяем данные: приоритет у детальных данных, но сохраняем специфичные поля из списка
@@ -141,7 +152,9 @@ async def process_animal(client: httpx.AsyncClient, session: AsyncSession, anima
         # Создаем множество для отслеживания уже обработанных собак
         processed_uuids = set()
 
-        dog = await process_dog_data(merged_data, session, processed_uuids, maxDeep)
+        # Сначала параллельно загружаем страницы всей родословной, затем пишем собак от предков к потомку
+        pages = await prefetch_dog_pages(collect_pedigree_nodes(merged_data, maxDeep))
+        dog = await process_dog_data(merged_data, session, processed_uuids, maxDeep, match, pages)
         logger.info(f"Processed dog: {dog.registered_name}")
 
         # await session.refresh(dog, ["dam", "sire", "titles"])
@@ -166,7 +179,7 @@ async def process_animal_by_uuid(uuid: str, maxDeep: int = 5) -> Dict:
                 detailed_url = f"{BREEDARCHIVE_API}/animal/get_ancestors/{uuid}?generations=5"
                 logger.info(f"Fetching data from: {detailed_url}")
 
-                response = await client.get(detailed_url, headers=HEADERS)
+                response = await http_cache.get(client, detailed_url, "breedarchive", HEADERS)
 
                 # Проверяем статус ответа
                 if response.status_code != 200:
@@ -192,7 +205,8 @@ async def process_animal_by_uuid(uuid: str, maxDeep: int = 5) -> Dict:
                 logger.info(f"Successfully fetched data for UUID {uuid}")
 
                 processed_uuids = set()
-                dog = await process_dog_data(detailed_data, session, processed_uuids, maxDeep)
+                pages = await prefetch_dog_pages(collect_pedigree_nodes(detailed_data, maxDeep))
+                dog = await process_dog_data(detailed_data, session, processed_uuids, maxDeep, pages=pages)
 
                 await session.refresh(dog, ["dam", "sire", "titles"])
                 logger.info(f"process_animal_by_uuid() after refresh: {dog}")
@@ -208,6 +222,61 @@ async def process_animal_by_uuid(uuid: str, maxDeep: int = 5) -> Dict:
                 await session.rollback()
                 raise HTTPException(status_code=500, detail=f"Error processing dog: {str(e)}")
 
+PAGE_HEADERS = {
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "accept": "text/html,application/xhtml+xml"
+}
+
+def extract_page_data(source: str) -> Optional[Dict[str, Any]]:
+    # Данные собаки из встроенных скриптов страницы; None, если var animal на странице нет
+    animal = extract_js_json(source, "animal")
+    if animal is None:
+        return None
+
+    litters = extract_js_json(source, "litters")
+    return {
+        "animal": animal,
+        "health": {
+            "breed_relevant": extract_js_json(source, "health_screenings") or [],
+            "other_screenings": extract_js_json(source, "animal_healthinfos") or [],
+        },
+        "siblings": extract_js_json(source, "siblings") or [],
+        "litters": litters.get("litters", []) if isinstance(litters, dict) else [],
+    }
+
+async def fetch_page_data(url: str) -> Optional[Dict[str, Any]]:
+    # Быстрый путь: встроенные скрипты есть уже в HTML ответа, браузер для них не нужен
+    response = await http_cache.get(http_client(), url, "breedarchive", PAGE_HEADERS)
+    response.raise_for_status()
+    return extract_page_data(response.text)
+
+async def render_page_data(url: str) -> Dict[str, Any]:
+    # Браузер из общего пула, а не запуск на каждую собаку
+    async with browser_pool.page(viewport={"width": 1920, "height": 1080}) as page:
+        # Переход на страницу и ожидание загрузки
+        await page.goto(url, wait_until="networkidle", timeout=60000)
+
+        scripts = await page.evaluate("""() => {
+            return Array.from(document.scripts)
+                .filter(s => s.innerHTML.includes('var animal ='))
+                .map(s => s.innerHTML)
+        }""")
+
+    for script in scripts:
+        page_data = extract_page_data(script)
+        if page_data is not None:
+            return page_data
+
+    return {
+        "animal": {},
+        "health": {
+            "breed_relevant": [],
+            "other_screenings": [],
+        },
+        "siblings": [],
+        "litters": [],
+    }
+
 @retry(
     stop=stop_after_attempt(MAX_RETRIES),
     wait=wait_exponential(multiplier=1, min=2, max=10),
@@ -215,73 +284,52 @@ async def process_animal_by_uuid(uuid: str, maxDeep: int = 5) -> Dict:
     reraise=True
 )
 async def parse_data_from_page_scripts(url):
-    async with async_playwright() as pw:
-        # Выбор браузера (chromium, firefox, webkit)
-        browser =  await pw.chromium.launch(
-            headless=True,
-            args=[
-                "--disable-dev-shm-usage",
-                "--no-sandbox",
-                "--disable-gpu"
-            ]
-        )
-        context = await browser.new_context(
-            viewport={"width": 1920, "height": 1080}
-        )
-        page = await context.new_page()
-
-        try:
-            # Переход на страницу и ожидание загрузки
-            await page.goto(url, wait_until="networkidle", timeout=60000)
-
-            scripts = await page.evaluate("""() => {
-                return Array.from(document.scripts)
-                    .filter(s => s.innerHTML.includes('var animal ='))
-                    .map(s => s.innerHTML)
-            }""")
-
-            animal_data = {
-                "animal": {},
-                "health": {
-                    "breed_relevant": [],
-                    "other_screenings": [],
-                },
-                "siblings": [],
-                "litters": [],
-            }
-
-            for script in scripts:
-                script_content = script.replace('\n', ' ')
-
-                if "var animal =" in script_content:
-                    matchAnimal = re.search(r"var animal\s*=\s*({.*?});", script, re.DOTALL)
-                    if matchAnimal:
-                        animal_data["animal"] = json.loads(matchAnimal.group(1))
-
-                    matchHealthScreenings = re.search(r"var health_screenings\s*=\s*(\[.*?\]);", script, re.DOTALL)
-                    if matchHealthScreenings:
-                        animal_data["health"]["breed_relevant"] = json.loads(matchHealthScreenings.group(1))
-
-                    matchAnimalHealthInfos = re.search(r"var animal_healthinfos\s*=\s*(\[.*?\]);", script, re.DOTALL)
-                    if matchAnimalHealthInfos:
-                        animal_data["health"]["other_screenings"] = json.loads(matchAnimalHealthInfos.group(1))
-
-                    matchSiblings = re.search(r"var siblings\s*=\s*(\[.*?\]);", script, re.DOTALL)
-                    if matchSiblings:
-                        animal_data["siblings"] = json.loads(matchSiblings.group(1))
-
-                    matchLitters = re.search(r"var litters\s*=\s*({.*?});", script, re.DOTALL)
-                    if matchLitters:
-                        animal_data["litters"] = json.loads(matchLitters.group(1))["litters"]
-
-                    break
+    try:
+        page_data = await fetch_page_data(url)
+        if page_data is not None:
+            return page_data
+        logger.info(f"Inline animal data not found in HTML, rendering {url}")
+    except (httpx.HTTPStatusError, httpx.RequestError) as e:
+        logger.warning(f"Fast page fetch failed for {url}: {str(e)}, rendering in browser")
+
+    # Запасной путь: полный рендер страницы в Playwright
+    return await render_page_data(url)
+
+def dog_page_url(dog_data: Dict[str, Any]) -> str:
+    return f"{BREEDARCHIVE_API}{BREEDARCHIVE_DOG_PATH}/{dog_data.get('link_name')}-{dog_data.get('uuid')}"
+
+def collect_pedigree_nodes(dog_data: Optional[Dict[str, Any]], max_depth: int, nodes: Optional[Dict[str, Dict]] = None) -> Dict[str, Dict]:
+    # Все собаки из вложенного ответа get_ancestors, до которых дойдет обработка с этой глубиной
+    if nodes is None:
+        nodes = {}
+    if not dog_data or not dog_data.get("uuid") or max_depth <= 0:
+        return nodes
+    nodes.setdefault(dog_data["uuid"], dog_data)
+    collect_pedigree_nodes(dog_data.get("dam"), max_depth - 1, nodes)
+    collect_pedigree_nodes(dog_data.get("sire"), max_depth - 1, nodes)
+    return nodes
+
+async def prefetch_dog_pages(nodes: Dict[str, Dict]) -> Dict[str, Dict]:
+    # Первая фаза: страницы всей родословной загружаются параллельно, а не по одной в рекурсии.
+    # Не загрузившиеся страницы пропускаются, их еще раз запросит обработка собаки
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(settings.BREEDARCHIVE_PAGE_CONCURRENCY)
+
+    async def fetch(uuid: str, dog_data: Dict) -> Tuple[str, Optional[Dict]]:
+        async with semaphore:
+            try:
+                return uuid, await parse_data_from_page_scripts(dog_page_url(dog_data))
+            except Exception as e:
+                logger.warning(f"Prefetch of dog page {uuid} failed: {str(e)}")
+                return uuid, None
 
-            return animal_data
-        finally:
-            await browser.close()
+    results = await asyncio.gather(*(fetch(uuid, dog_data) for uuid, dog_data in nodes.items()))
+    pages = {uuid: page_data for uuid, page_data in results if page_data is not None}
+    logger.info(f"Prefetched {len(pages)}/{len(nodes)} dog pages in {time.perf_counter() - started:.1f}s")
+    return pages
 
 # Вспомогательная функция для обработки связанных собак
-async def process_related_dog(related_data: Optional[Dict], session: AsyncSession, processed_uuids: Set[str], max_depth: int) -> Optional[Dog]:
+async def process_related_dog(related_data: Optional[Dict], session: AsyncSession, processed_uuids: Set[str], max_depth: int, pages: Optional[Dict[str, Dict]] = None) -> Optional[Dog]:
     if not related_data or not related_data.get("uuid"):
         return None
 
@@ -306,7 +354,7 @@ async def process_related_dog(related_data: Optional[Dict], session: AsyncSessio
 
     # Рекурсивно обрабатываем собаку
     processed_uuids.add(uuid) # Добавляем UUID в список обрабатываемых
-    return await process_dog_data(related_data, session, processed_uuids, max_depth)
+    return await process_dog_data(related_data, session, processed_uuids, max_depth, pages=pages)
 
 async def clear_relationships(dog: Dog, session: AsyncSession):
     await session.execute(delete(DogBreederLink).where(DogBreederLink.dog_id == dog.id))
@@ -441,7 +489,7 @@ async def update_existing_dog(dog: Dog, new_data: Dict, dam: Optional[Dog], sire
 
     return dog
 
-async def process_dog_data(dog_data: Dict[str, Any], session: AsyncSession, processed_uuids: Set[str], max_depth: int = 6) -> Optional[Dog]:
+async def process_dog_data(dog_data: Dict[str, Any], session: AsyncSession, processed_uuids: Set[str], max_depth: int = 6, match: Optional[Tuple[Optional[Dog], str, float]] = None, pages: Optional[Dict[str, Dict]] = None) -> Optional[Dog]:
     try:
         if max_depth <= 0:
             logger.error("Max recursion depth reached")
@@ -457,12 +505,16 @@ async def process_dog_data(dog_data: Dict[str, Any], session: AsyncSession, proc
         if not uuid:
             logger.error("Dog data missing UUID")
             return None
-        existing_dog, match_method, similarity = await find_existing_dog(
-            session, dog_data, "breedarchive"
-        )
+        # match - заранее найденная собака из find_existing_dogs для страницы
+        if match and match[0] is not None:
+            existing_dog, match_method, similarity = match
+        else:
+            existing_dog, match_method, similarity = await find_existing_dog(
+                session, dog_data, "breedarchive"
+            )
 
-        dam = await process_related_dog(dog_data.get("dam"), session, processed_uuids, max_depth - 1)
-        sire = await process_related_dog(dog_data.get("sire"), session, processed_uuids, max_depth - 1)
+        dam = await process_related_dog(dog_data.get("dam"), session, processed_uuids, max_depth - 1, pages)
+        sire = await process_related_dog(dog_data.get("sire"), session, processed_uuids, max_depth - 1, pages)
 
         # Основная обработка собаки
         dog: Optional[Dog] = None
@@ -472,8 +524,9 @@ async def process_dog_data(dog_data: Dict[str, Any], session: AsyncSession, proc
         parsed_data = {}
 
         # if max_depth > 1: # Для экономии запросов, парсим страницу только для основных собак (?)
-        url = f"{BREEDARCHIVE_API}{BREEDARCHIVE_DOG_PATH}/{dog_data.get('link_name')}-{dog_data.get('uuid')}"
-        parsed_data = await parse_data_from_page_scripts(url)
+        parsed_data = (pages or {}).get(uuid)
+        if parsed_data is None:
+            parsed_data = await parse_data_from_page_scripts(dog_page_url(dog_data))
 
                 # Объединяем данные
         full_data = {
@@ -522,6 +575,135 @@ async def process_dog_data(dog_data: Dict[str, Any], session: AsyncSession, proc
         logger.error(f"Error processing dog {dog_data.get('uuid')}: {str(e)}")
         return None
 
+# Пакетный режим: собаки страницы и их предки только собираются в BulkIngestor,
+# сопоставление с базой и запись выполняются одним flush на страницу
+async def collect_dog_data(dog_data: Optional[Dict[str, Any]], ingestor: BulkIngestor, processed_uuids: Set[str], max_depth: int, pages: Optional[Dict[str, Dict]] = None) -> Optional[str]:
+    if not dog_data or not dog_data.get("uuid"):
+        return None
+
+    uuid = dog_data.get("uuid")
+    # Глубже max_depth собаку не парсим, но ссылку на нее проставим, если она уже есть в базе
+    if max_depth <= 0 or uuid in processed_uuids:
+        return uuid
+    processed_uuids.add(uuid)
+
+    try:
+        dam_uuid = await collect_dog_data(dog_data.get("dam"), ingestor, processed_uuids, max_depth - 1, pages)
+        sire_uuid = await collect_dog_data(dog_data.get("sire"), ingestor, processed_uuids, max_depth - 1, pages)
+
+        parsed_data = (pages or {}).get(uuid)
+        if parsed_data is None:
+            parsed_data = await parse_data_from_page_scripts(dog_page_url(dog_data))
+
+        full_data = {
+            **dog_data,
+            **parsed_data.get("animal", {}),
+            "health_info_general": parsed_data["health"]["breed_relevant"],
+            "health_info_genetic": parsed_data["health"]["other_screenings"],
+            "dam": dog_data.get("dam"),
+            "sire": dog_data.get("sire"),
+        }
+
+        ingestor.add_dog(
+            parse_dog_data(full_data, None, None),
+            sire_uuid or full_data.get("sire_uuid"),
+            dam_uuid or full_data.get("dam_uuid")
+        )
+        for raw in full_data.get("breeders") or []:
+            ingestor.add_breeder(uuid, parse_breeder(raw))
+        for raw in full_data.get("owners") or []:
+            ingestor.add_owner(uuid, parse_owner(raw))
+        for raw in full_data.get("titles") or []:
+            ingestor.add_title(uuid, parse_title(raw, None))
+        # Братья/сестры и пометы связываются с собаками, которые уже есть в базе или собраны на этой странице
+        for raw in parsed_data.get("siblings") or []:
+            sibling_uuid = raw.get("uuid") if isinstance(raw, dict) else raw
+            if sibling_uuid:
+                ingestor.add_sibling(uuid, sibling_uuid)
+        for raw in parsed_data.get("litters") or []:
+            if not isinstance(raw, dict):
+                continue
+            ingestor.add_litter(
+                parse_litter(raw),
+                {role: raw[role].get("uuid") if isinstance(raw.get(role), dict) else None for role in ("dam", "sire", "mating_partner")},
+                [puppy["uuid"] for puppy in raw.get("offspring") or [] if isinstance(puppy, dict) and puppy.get("uuid")]
+            )
+
+        return uuid
+    except Exception as e:
+        logger.error(f"Error collecting dog {uuid}: {str(e)}")
+        return None
+
+async def process_animals_bulk(client: httpx.AsyncClient, session: AsyncSession, animals: List[Dict], maxDeep: int = 3) -> Dict[str, Any]:
+    ingestor = BulkIngestor(session, "breedarchive")
+    processed_uuids = set()
+    root_uuids = []
+
+    async def fetch_ancestors(animal_data: Dict) -> Optional[Dict]:
+        uuid = animal_data.get("uuid")
+        if not uuid:
+            logger.error(f"Missing required data in animal_data: {animal_data}")
+            return None
+        try:
+            detailed_url = f"{BREEDARCHIVE_API}/animal/get_ancestors/{uuid}?generations=5"
+            response = await http_cache.get(client, detailed_url, "breedarchive", HEADERS)
+            detailed_data = response.json()
+
+            return {
+                **detailed_data,
+                **{k: v for k, v in animal_data.items() if k not in detailed_data},
+                "modified_at": animal_data.get("modified_at"),
+                "is_new": animal_data.get("is_new")
+            }
+        except Exception as e:
+            logger.error(f"Failed to fetch ancestors of {uuid}: {str(e)}")
+            return None
+
+    results = await asyncio.gather(*(fetch_ancestors(animal_data) for animal_data in animals))
+    pedigrees = [merged_data for merged_data in results if merged_data]
+
+    # Страницы собак всех родословных страницы списка загружаются одним параллельным проходом
+    nodes = {}
+    for merged_data in pedigrees:
+        collect_pedigree_nodes(merged_data, maxDeep, nodes)
+    pages = await prefetch_dog_pages(nodes)
+
+    for merged_data in pedigrees:
+        uuid = merged_data["uuid"]
+        try:
+            if await collect_dog_data(merged_data, ingestor, processed_uuids, maxDeep, pages):
+                root_uuids.append(uuid)
+        except Exception as e:
+            logger.error(f"Failed to collect {uuid}: {str(e)}")
+
+    stats = await ingestor.flush()
+    stats["dog_ids"] = [ingestor.dog_id(uuid) for uuid in root_uuids if ingestor.dog_id(uuid) is not None]
+    return stats
+
+ENTRIES_PAGE_SIZE = 25
+
+async def fetch_entries(client: httpx.AsyncClient, start: int) -> Dict[str, Any]:
+    # Страница списка собак get_entries; не кэшируется, т.к. порядок меняется с каждым обновлением
+    url = f"{BREEDARCHIVE_API}/ng_animal/get_entries?operation=all&start={start}"
+    await rate_limiter.acquire(url)
+    response = await client.get(url, headers=HEADERS)
+    response.raise_for_status()
+    return response.json()
+
+async def process_entries_page(page: int, maxDeep: int = 3) -> Dict[str, Any]:
+    # Одна страница get_entries для обхода с чекпоинтами, запись пакетом через BulkIngestor
+    async with httpx.AsyncClient() as client:
+        data = await fetch_entries(client, page * ENTRIES_PAGE_SIZE)
+
+        async with session_scope() as session:
+            stats = await process_animals_bulk(client, session, data.get("animals", []), maxDeep)
+
+    return {
+        "parsed_dog_ids": stats["dog_ids"],
+        "processed_dogs_count": len(stats["dog_ids"]),
+        "has_more": bool(data.get("has_more", False))
+    }
+
 # Обработка связей
 async def process_breeders(breeders: List[Breeder], session: AsyncSession):
     if len(breeders) == 0:
@@ -887,168 +1069,149 @@ async def parse_breedarchive_browse_page(recent_days: int = 1) -> Dict[str, Any]
     total_processed = 0
 
     try:
-        async with async_playwright() as pw:
-            # Запускаем браузер
-            browser = await pw.chromium.launch(
-                headless=True,
-                args=[
-                    "--disable-dev-shm-usage",
-                    "--no-sandbox",
-                    "--disable-gpu"
-                ]
-            )
-
-            context = await browser.new_context(
-                viewport={"width": 1920, "height": 1080},
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            )
-
-            page = await context.new_page()
-
+        # Страница из общего пула браузеров; контекст с user agent переиспользуется между вызовами
+        async with browser_pool.page(
+            viewport={"width": 1920, "height": 1080},
+            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        ) as page:
             # Переходим на страницу списка собак
             browse_url = "https://siberianhusky.breedarchive.com/animal/browse"
 
-            try:
-                logger.info(f"Navigating to: {browse_url}")
-                await page.goto(browse_url, wait_until='networkidle', timeout=60000)
+            logger.info(f"Navigating to: {browse_url}")
+            await page.goto(browse_url, wait_until='networkidle', timeout=60000)
 
-                # Ждем загрузки контейнера со списком собак
-                await page.wait_for_selector('[data-bind="foreach: animals, visible: animals().length > 0"]', timeout=10000)
+            # Ждем загрузки контейнера со списком собак
+            await page.wait_for_selector('[data-bind="foreach: animals, visible: animals().length > 0"]', timeout=10000)
 
-                # Получаем текущую дату для сравнения
-                current_date = datetime.now()
-                cutoff_date = current_date - timedelta(days=recent_days)
+            # Получаем текущую дату для сравнения
+            current_date = datetime.now()
+            cutoff_date = current_date - timedelta(days=recent_days)
 
-                logger.info(f"Filtering dogs modified after: {cutoff_date}")
+            logger.info(f"Filtering dogs modified after: {cutoff_date}")
 
-                has_more_data = True
-                page_count = 0
+            has_more_data = True
+            page_count = 0
 
-                while has_more_data:
-                    page_count += 1
-                    logger.info(f"Processing page {page_count}")
+            while has_more_data:
+                page_count += 1
+                logger.info(f"Processing page {page_count}")
 
-                    # Ждем загрузки элементов списка
-                    await page.wait_for_selector('.itemBox.fullProfile.resultProfile.profileDetails', timeout=10000)
+                # Ждем загрузки элементов списка
+                await page.wait_for_selector('.itemBox.fullProfile.resultProfile.profileDetails', timeout=10000)
 
-                    # Получаем все элементы списка собак
-                    dog_elements = await page.query_selector_all('.itemBox.fullProfile.resultProfile.profileDetails')
+                # Получаем все элементы списка собак
+                dog_elements = await page.query_selector_all('.itemBox.fullProfile.resultProfile.profileDetails')
 
-                    logger.info(f"Found {len(dog_elements)} dogs on current page")
+                logger.info(f"Found {len(dog_elements)} dogs on current page")
 
-                    should_stop = False
+                should_stop = False
 
-                    for i, dog_element in enumerate(dog_elements):
-                        try:
-                            # Извлекаем данные о собаке
-                            dog_data = await extract_dog_data_from_element(page, dog_element)
+                for i, dog_element in enumerate(dog_elements):
+                    try:
+                        # Извлекаем данные о собаке
+                        dog_data = await extract_dog_data_from_element(page, dog_element)
 
-                            if not dog_data:
-                                continue
+                        if not dog_data:
+                            continue
 
-                            # Проверяем дату модификации
-                            modified_date_str = dog_data.get('modified_at', '')
-                            if modified_date_str:
-                                try:
-                                    # Парсим дату в формате "22/6/2025, 20:24"
-                                    modified_date = datetime.strptime(modified_date_str, "%d/%m/%Y, %H:%M")
+                        # Проверяем дату модификации
+                        modified_date_str = dog_data.get('modified_at', '')
+                        if modified_date_str:
+                            try:
+                                # Парсим дату в формате "22/6/2025, 20:24"
+                                modified_date = datetime.strptime(modified_date_str, "%d/%m/%Y, %H:%M")
 
-                                    if modified_date < cutoff_date:
-                                        logger.info(f"Stopping at dog {dog_data.get('registered_name', 'Unknown')} - modified date {modified_date} is older than cutoff {cutoff_date}")
-                                        should_stop = True
-                                        break
+                                if modified_date < cutoff_date:
+                                    logger.info(f"Stopping at dog {dog_data.get('registered_name', 'Unknown')} - modified date {modified_date} is older than cutoff {cutoff_date}")
+                                    should_stop = True
+                                    break
 
-                                except ValueError as e:
-                                    logger.warning(f"Could not parse date '{modified_date_str}': {e}")
+                            except ValueError as e:
+                                logger.warning(f"Could not parse date '{modified_date_str}': {e}")
 
-                            # Обрабатываем собаку
-                            logger.info(f"Processing dog: {dog_data.get('registered_name', 'Unknown')}")
+                        # Обрабатываем собаку
+                        logger.info(f"Processing dog: {dog_data.get('registered_name', 'Unknown')}")
 
-                            try:
-                                # Создаем HTTP клиент для API запросов
-                                async with httpx.AsyncClient() as client:
-                                    # Получаем детальные данные через API
-                                    uuid = dog_data.get('uuid')
-                                    if uuid:
-                                        detailed_url = f"{BREEDARCHIVE_API}/animal/get_ancestors/{uuid}?generations=5"
-                                        response = await client.get(detailed_url, headers=HEADERS)
-                                        detailed_data = response.json()
-
-                                        # Объединяем данные
-                                        merged_data = {
-                                            **detailed_data,
-                                            **{k: v for k, v in dog_data.items() if k not in detailed_data},
-                                            "modified_at": dog_data.get("modified_at"),
-                                            "is_new": dog_data.get("is_new")
-                                        }
-
-                                        # Обрабатываем собаку
-                                        dog_id = await process_animal_with_new_session(client, merged_data, False)
-                                        if dog_id:
-                                            parsed_dog_ids.append(dog_id)
-                                            logger.info(f"Successfully processed dog {dog_data.get('registered_name', 'Unknown')} with ID: {dog_id}")
-                                        else:
-                                            failed_dogs.append({
-                                                'name': dog_data.get('registered_name', 'Unknown'),
-                                                'uuid': uuid,
-                                                'error': 'Failed to save dog'
-                                            })
-                                            logger.warning(f"Failed to save dog {dog_data.get('registered_name', 'Unknown')}")
+                        try:
+                            # Создаем HTTP клиент для API запросов
+                            async with httpx.AsyncClient() as client:
+                                # Получаем детальные данные через API
+                                uuid = dog_data.get('uuid')
+                                if uuid:
+                                    detailed_url = f"{BREEDARCHIVE_API}/animal/get_ancestors/{uuid}?generations=5"
+                                    response = await http_cache.get(client, detailed_url, "breedarchive", HEADERS)
+                                    detailed_data = response.json()
+
+                                    # Объединяем данные
+                                    merged_data = {
+                                        **detailed_data,
+                                        **{k: v for k, v in dog_data.items() if k not in detailed_data},
+                                        "modified_at": dog_data.get("modified_at"),
+                                        "is_new": dog_data.get("is_new")
+                                    }
+
+                                    # Обрабатываем собаку
+                                    dog_id = await process_animal_with_new_session(client, merged_data, False)
+                                    if dog_id:
+                                        parsed_dog_ids.append(dog_id)
+                                        logger.info(f"Successfully processed dog {dog_data.get('registered_name', 'Unknown')} with ID: {dog_id}")
                                     else:
                                         failed_dogs.append({
                                             'name': dog_data.get('registered_name', 'Unknown'),
-                                            'error': 'No UUID found'
+                                            'uuid': uuid,
+                                            'error': 'Failed to save dog'
                                         })
-                                        logger.warning(f"No UUID found for dog {dog_data.get('registered_name', 'Unknown')}")
-
-                            except Exception as e:
-                                failed_dogs.append({
-                                    'name': dog_data.get('registered_name', 'Unknown'),
-                                    'uuid': dog_data.get('uuid'),
-                                    'error': str(e)
-                                })
-                                logger.error(f"Error processing dog {dog_data.get('registered_name', 'Unknown')}: {str(e)}")
+                                        logger.warning(f"Failed to save dog {dog_data.get('registered_name', 'Unknown')}")
+                                else:
+                                    failed_dogs.append({
+                                        'name': dog_data.get('registered_name', 'Unknown'),
+                                        'error': 'No UUID found'
+                                    })
+                                    logger.warning(f"No UUID found for dog {dog_data.get('registered_name', 'Unknown')}")
 
-                            total_processed += 1
+                        except Exception as e:
+                            failed_dogs.append({
+                                'name': dog_data.get('registered_name', 'Unknown'),
+                                'uuid': dog_data.get('uuid'),
+                                'error': str(e)
+                            })
+                            logger.error(f"Error processing dog {dog_data.get('registered_name', 'Unknown')}: {str(e)}")
 
-                            # Небольшая задержка между обработкой собак
-                            await asyncio.sleep(random.uniform(0.5, 1.5))
+                        total_processed += 1
 
-                        except Exception as e:
-                            logger.error(f"Error extracting data from dog element {i}: {str(e)}")
-                            continue
+                    except Exception as e:
+                        logger.error(f"Error extracting data from dog element {i}: {str(e)}")
+                        continue
 
-                    if should_stop:
-                        logger.info("Reached cutoff date, stopping processing")
-                        break
+                if should_stop:
+                    logger.info("Reached cutoff date, stopping processing")
+                    break
 
-                    # Проверяем наличие кнопки "Show more"
-                    show_more_button = await page.query_selector('[data-bind="visible: showLoadMore() && !loading(), click: loadMore"].standardButton.alternative.showMore')
+                # Проверяем наличие кнопки "Show more"
+                show_more_button = await page.query_selector('[data-bind="visible: showLoadMore() && !loading(), click: loadMore"].standardButton.alternative.showMore')
 
-                    if show_more_button:
-                        # Проверяем, видима ли кнопка
-                        is_visible = await show_more_button.is_visible()
+                if show_more_button:
+                    # Проверяем, видима ли кнопка
+                    is_visible = await show_more_button.is_visible()
 
-                        if is_visible:
-                            logger.info("Clicking 'Show more' button")
-                            await show_more_button.click()
+                    if is_visible:
+                        logger.info("Clicking 'Show more' button")
+                        await show_more_button.click()
 
-                            # Ждем загрузки новых данных
-                            await page.wait_for_timeout(2000)
+                        # Ждем загрузки новых данных
+                        await page.wait_for_timeout(2000)
 
-                            # Ждем исчезновения индикатора загрузки (если есть)
-                            try:
-                                await page.wait_for_selector('[data-bind="visible: loading()"]', state='hidden', timeout=10000)
-                            except:
-                                pass  # Игнорируем, если индикатора загрузки нет
-                        else:
-                            logger.info("'Show more' button is not visible, no more data")
-                            has_more_data = False
+                        # Ждем исчезновения индикатора загрузки (если есть)
+                        try:
+                            await page.wait_for_selector('[data-bind="visible: loading()"]', state='hidden', timeout=10000)
+                        except:
+                            pass  # Игнорируем, если индикатора загрузки нет
                     else:
-                        logger.info("'Show more' button not found, no more data")
+                        logger.info("'Show more' button is not visible, no more data")
                         has_more_data = False
-            finally:
-                await browser.close()
+                else:
+                    logger.info("'Show more' button not found, no more data")
+                    has_more_data = False
 
             logger.info(f"Parsing completed. Total processed: {total_processed}, Successfully saved: {len(parsed_dog_ids)}, Failed: {len(failed_dogs)}")
 
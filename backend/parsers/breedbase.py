@@ -1,5 +1,5 @@
 from bs4 import BeautifulSoup
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 from httpx import AsyncClient
 from sqlalchemy import delete, select
@@ -17,7 +17,9 @@ from models.litters import Litter
 from models.associations import DogBreederLink, DogOwnerLink
 from core.parsersConfig import BREEDBASE_API, BREEDBASE_DOG_PATH
 from core.database import session_scope
-from utils.dog_matcher import find_existing_dog, detect_conflicts, merge_dog_data
+from utils.crawl_frontier import CrawlFrontier, PRIORITY_DOG, PRIORITY_LIST, rate_limiter
+from utils.http_cache import http_cache
+from utils.dog_matcher import find_existing_dog, find_existing_dogs, detect_conflicts, merge_dog_data
 
 root_path = Path(__file__).parent.parent
 sys.path.append(str(root_path))
@@ -26,15 +28,16 @@ logger = logging.getLogger(__name__)
 
 dog_page_url = f"{BREEDBASE_API}{BREEDBASE_DOG_PATH}/"
 ROWS_PER_PAGE = 50
+search_results_url = f"{BREEDBASE_API}{BREEDBASE_DOG_PATH}/results.php?mode=advanced&name=&nickname=&sex=&byear=&landofbirth=&landofstanding=&color=&kennel=&photos=photos&action=search&start="
 
 async def fetch_dog_page(session: AsyncClient, dog_name: str) -> str:
     url = f"{dog_page_url}details.php?name={dog_name}&gens=6"
-    response = await session.get(url)
+    response = await http_cache.get(session, url, "breedbase")
     response.raise_for_status()
     return response.text
 
 async def fetch_dog_page_by_url(session: AsyncClient, url: str) -> str:
-    response = await session.get(url)
+    response = await http_cache.get(session, url, "breedbase")
     response.raise_for_status()
     
     return response.text
@@ -87,11 +90,16 @@ def parse_dog_page(html: str, processed_urls: set = None) -> Dict:
         'dog_info': dog_info
     }
 
-async def save_to_database(dog_data: Dict, session: AsyncSession) -> Optional[int]:
+async def save_to_database(dog_data: Dict, session: AsyncSession, match: Optional[Tuple[Optional[Dog], str, float]] = None) -> Optional[int]:
     try:
-        existing_dog, match_method, similarity = await find_existing_dog(
-            session, dog_data, "breedbase.ru"
-        )
+        # match - результат find_existing_dogs для страницы; если собака не найдена, ищем заново,
+        # т.к. она могла появиться при сохранении предыдущих собак страницы
+        if match and match[0] is not None:
+            existing_dog, match_method, similarity = match
+        else:
+            existing_dog, match_method, similarity = await find_existing_dog(
+                session, dog_data, "breedbase.ru"
+            )
         
         if existing_dog:
             logger.info(f"Found existing dog by {match_method} (similarity: {similarity:.2f}): {existing_dog.registered_name}")
@@ -450,19 +458,23 @@ async def parse_dog_page_recursive(session: AsyncClient, html: str, dog_link_nam
     }
     return map_to_dog_model(parsed_data, max_depth=pedigree_depth)
 
-async def parse_search_results(session: AsyncClient, url: str, processed_urls: set = None, recursive: bool = False, pedigree_depth: int = 5, max_pages: int = 10, start_page: int = 0) -> List[Dict]:
-    if processed_urls is None:
-        processed_urls = set()
-    
-    result_data = []
+async def parse_search_page(session: AsyncClient, url: str, processed_urls: set, max_pages: int, listing: Optional[Dict] = None) -> Tuple[List[str], Optional[str]]:
+    # Ссылки на собак со страницы результатов поиска и URL следующей страницы (если она есть).
+    # В listing записывается, сколько строк было в списке и есть ли на сайте следующая страница -
+    # независимо от max_pages и от того, удалось ли потом сохранить собак
+    await rate_limiter.acquire(url)
     response = await session.get(url)
     response.raise_for_status()
     soup = BeautifulSoup(response.text, 'html.parser')
     
+    dog_links = []
     table = soup.find('table', id='doglist')
     if not table:
         logging.warning(f"No doglist table found on page: {url}")
-        return result_data
+        if listing is not None:
+            listing["rows"] = 0
+            listing["has_next"] = False
+        return dog_links, None
     
     rows = table.find_all('tr')[1:]
     for row in rows:
@@ -492,36 +504,65 @@ async def parse_search_results(session: AsyncClient, url: str, processed_urls: s
         
         if dog_link not in processed_urls:
             processed_urls.add(dog_link)
-            logging.info(f"Processing dog from search results: {name_text} - {dog_link}")
-            dog_html = await fetch_dog_page_by_url(session, dog_link)
-            dog_data = await parse_dog_page_recursive(session, dog_html, dog_link, processed_urls, recursive, pedigree_depth)
-            if dog_data:
-                result_data.append(dog_data)
+            logging.info(f"Queued dog from search results: {name_text} - {dog_link}")
+            dog_links.append(dog_link)
     
     parsed_url = urlparse(url)
     query_params = parse_qs(parsed_url.query)
     start_value = int(query_params.get('start', ['0'])[-1])
-    print(f"Start value: {start_value}")
     next_start = start_value + ROWS_PER_PAGE
     next_page = int(next_start / ROWS_PER_PAGE)
-    print(f"next_start: {next_start}")
     query_params['start'] = [str(next_start)]
-    print(f"query_params['start']: {query_params['start']}")
     next_url = urlunparse(parsed_url._replace(query=urlencode(query_params, doseq=True)))
-    print(f"next_start / {ROWS_PER_PAGE}: {next_start / ROWS_PER_PAGE}")
-    print(f"max_pages >= next_start / {ROWS_PER_PAGE}: {max_pages >= (next_start / ROWS_PER_PAGE)}")
+
+    total_dogs = None
+    page_info = soup.find(text=re.compile(r'Найдено \*\*[0-9]+ собак\*\*'))
+    if page_info:
+        total_dogs = int(re.search(r'Найдено \*\*([0-9]+) собак\*\*', page_info).group(1))
+    if listing is not None:
+        listing["rows"] = len(rows)
+        listing["has_next"] = bool(rows) and (total_dogs is None or next_start < total_dogs)
     
-    if next_url not in processed_urls and max_pages >= next_page:
-        page_info = soup.find(text=re.compile(r'Найдено \*\*[0-9]+ собак\*\*'))
-        if page_info:
-            total_dogs = int(re.search(r'Найдено \*\*([0-9]+) собак\*\*', page_info).group(1))
-            if next_start >= total_dogs:
-                logging.info(f"Reached or exceeded total dogs ({total_dogs}), stopping pagination.")
-                return result_data
-        processed_urls.add(next_url)
-        logging.info(f"Constructed next search results page URL: {next_url}")
-        next_page_data = await parse_search_results(session, next_url, processed_urls, recursive, pedigree_depth, max_pages)
-        result_data.extend(next_page_data)
+    if next_url in processed_urls or max_pages < next_page:
+        return dog_links, None
+
+    if total_dogs is not None and next_start >= total_dogs:
+        logging.info(f"Reached or exceeded total dogs ({total_dogs}), stopping pagination.")
+        return dog_links, None
+    processed_urls.add(next_url)
+    logging.info(f"Constructed next search results page URL: {next_url}")
+    return dog_links, next_url
+
+async def parse_search_results(session: AsyncClient, url: str, processed_urls: set = None, recursive: bool = False, pedigree_depth: int = 5, max_pages: int = 10, start_page: int = 0, listing: Optional[Dict] = None) -> List[Dict]:
+    if processed_urls is None:
+        processed_urls = set()
+    
+    result_data = []
+
+    # Страницы поиска и собаки разбираются пулом воркеров; следующая страница списка
+    # встает в очередь раньше необработанных собак, лимит запросов к сайту общий для всех воркеров
+    async def handle(frontier: CrawlFrontier, item_url: str, kind: str):
+        if kind == "list":
+            dog_links, next_url = await parse_search_page(session, item_url, processed_urls, max_pages, listing)
+            for dog_link in dog_links:
+                frontier.add(dog_link, PRIORITY_DOG, "dog")
+            if next_url:
+                frontier.add(next_url, PRIORITY_LIST, "list")
+            return
+
+        dog_html = await fetch_dog_page_by_url(session, item_url)
+        dog_data = await parse_dog_page_recursive(session, dog_html, item_url, processed_urls, recursive, pedigree_depth)
+        if dog_data:
+            result_data.append(dog_data)
+
+    frontier = CrawlFrontier(handle)
+    frontier.add(url, PRIORITY_LIST, "list")
+    await frontier.run()
+
+    # Недоступная стартовая страница поиска - ошибка вызова, а не пустой результат
+    for failure in frontier.failures:
+        if failure["url"] == url:
+            raise RuntimeError(f"Error parsing search results page {url}: {failure['error']}")
     
     return result_data
 
@@ -545,12 +586,31 @@ async def process_single_breedbase_dog(dog_link_name: str, recursive: bool = Tru
 
 async def process_breedbase_pages(pages_count: int = 1, start_page: int = 0, recursive: bool = True, pedigree_depth: int = 5):
     parsed_dog_ids = []
-    search_url = f"{BREEDBASE_API}{BREEDBASE_DOG_PATH}/results.php?mode=advanced&name=&nickname=&sex=&byear=&landofbirth=&landofstanding=&color=&kennel=&photos=photos&action=search&start={start_page * ROWS_PER_PAGE}"
+    # Сведения о последней разобранной странице списка
+    listing = {"rows": 0, "has_next": False}
+    search_url = f"{search_results_url}{start_page * ROWS_PER_PAGE}"
     async with AsyncClient() as http_session:
-        search_data = await parse_search_results(http_session, search_url, recursive=recursive, pedigree_depth=pedigree_depth, max_pages=pages_count)
+        search_data = await parse_search_results(http_session, search_url, recursive=recursive, pedigree_depth=pedigree_depth, max_pages=pages_count, listing=listing)
         async with session_scope() as db_session:
-            for dog_data in search_data:
-                saved_dog = await save_to_database(dog_data, db_session)
+            # Сопоставление всей страницы с базой за постоянное число запросов
+            matches = await find_existing_dogs(db_session, search_data, "breedbase.ru")
+            for idx, dog_data in enumerate(search_data):
+                saved_dog = await save_to_database(dog_data, db_session, matches[idx])
                 if saved_dog and hasattr(saved_dog, 'id'):
                     parsed_dog_ids.append(saved_dog.id)
-    return {"parsed_dog_ids": parsed_dog_ids, "processed_dogs_count": len(parsed_dog_ids)}
+                elif saved_dog is None and idx + 1 < len(search_data):
+                    # save_to_database откатил сессию, и все найденные собаки в ней истекли: сопоставляем остаток страницы заново
+                    matches[idx + 1:] = await find_existing_dogs(db_session, search_data[idx + 1:], "breedbase.ru")
+    return {
+        "parsed_dog_ids": parsed_dog_ids,
+        "processed_dogs_count": len(parsed_dog_ids),
+        "listed_dogs_count": listing["rows"],
+        "has_next_page": listing["has_next"]
+    }
+
+async def process_breedbase_page(page: int, recursive: bool = True, pedigree_depth: int = 5) -> Dict:
+    # Одна страница поиска для обхода с чекпоинтами.
+    # max_pages в parse_search_results - номер последней страницы, поэтому передаем номер текущей
+    # Конец обхода определяется по самой странице списка: страница, где ни одну собаку не удалось сохранить, его не обрывает
+    result = await process_breedbase_pages(pages_count=page, start_page=page, recursive=recursive, pedigree_depth=pedigree_depth)
+    return {**result, "has_more": result["has_next_page"]}
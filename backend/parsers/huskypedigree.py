@@ -1,5 +1,5 @@
 from bs4 import BeautifulSoup
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 from httpx import AsyncClient
 from sqlalchemy import delete, select
@@ -17,7 +17,10 @@ from models.litters import Litter
 from models.associations import DogBreederLink, DogOwnerLink
 from core.parsersConfig import HUSKY_PEDIGREE_NET_API, HUSKY_PEDIGREE_NET_DOG_PATH
 from core.database import session_scope
-from utils.dog_matcher import find_existing_dog, detect_conflicts, merge_dog_data
+from utils.crawl_frontier import CrawlFrontier, PRIORITY_DOG, PRIORITY_LIST, rate_limiter
+from utils.http_cache import http_cache
+from utils.dog_matcher import find_existing_dog, find_existing_dogs, detect_conflicts, merge_dog_data
+from utils.browser_pool import browser_pool
 
 root_path = Path(__file__).parent.parent
 sys.path.append(str(root_path))
@@ -26,15 +29,18 @@ logger = logging.getLogger(__name__)
 
 dog_page_url = f"{HUSKY_PEDIGREE_NET_API}{HUSKY_PEDIGREE_NET_DOG_PATH}"
 gen_param = 3
+# Собак на странице списка (x=50 в URL); столько же сохраняется за одну сессию
+LIST_PAGE_SIZE = 50
+dog_list_url = f"{HUSKY_PEDIGREE_NET_API}/lista.php?pasmina=&adv=1&ime=&otac=&majka=&regbr=&god1=&god2=&hruzg=1&uvoz=1&stranci=1&sl=1&x={LIST_PAGE_SIZE}&y=12&str="
 
 async def fetch_dog_page(session: AsyncClient, dog_id: str) -> str:
     url = f"{dog_page_url}{dog_id}&gen={gen_param}"
-    response = await session.get(url)
+    response = await http_cache.get(session, url, "huskypedigree")
     response.raise_for_status()
     return response.text
 
 async def fetch_dog_page_by_url(session: AsyncClient, url: str) -> str:
-    response = await session.get(url)
+    response = await http_cache.get(session, url, "huskypedigree")
     response.raise_for_status()
     return response.text
 
@@ -48,22 +54,15 @@ def generate_uuid_from_name(name: str) -> str:
 
 async def parse_coi(session: AsyncClient, dog_id: str) -> Optional[float]:
     try:
-        from playwright.async_api import async_playwright
-        
         analysis_url = f"{HUSKY_PEDIGREE_NET_API}/analiza.php?id={dog_id}&gen=12"
         
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
-            
+        async with browser_pool.page() as page:
             await page.goto(analysis_url, wait_until='networkidle')
             
             await page.wait_for_selector('h3.result span#result', timeout=10000)
             
             coi_text = await page.text_content('h3.result span#result')
             
-            await browser.close()
-            
             if coi_text:
                 print(f"COI text found: {coi_text}")
                 match = re.search(r'F\s*=\s*([\d.]+)%', coi_text)
@@ -326,11 +325,16 @@ def parse_offspring_table(soup: BeautifulSoup) -> List[Dict]:
     
     return litters
 
-async def save_to_database(dog_data: Dict, session: AsyncSession) -> Optional[Dog]:
+async def save_to_database(dog_data: Dict, session: AsyncSession, match: Optional[Tuple[Optional[Dog], str, float]] = None) -> Optional[Dog]:
     try:
-        existing_dog, match_method, similarity = await find_existing_dog(
-            session, dog_data, "husky.pedigre.net"
-        )
+        # match - результат find_existing_dogs для страницы; если собака не найдена, ищем заново,
+        # т.к. она могла появиться при сохранении предыдущих собак страницы
+        if match and match[0] is not None:
+            existing_dog, match_method, similarity = match
+        else:
+            existing_dog, match_method, similarity = await find_existing_dog(
+                session, dog_data, "husky.pedigre.net"
+            )
         
         if existing_dog:
             logger.info(f"Found existing dog by {match_method} (similarity: {similarity:.2f}): {existing_dog.registered_name}")
@@ -648,7 +652,7 @@ async def parse_dog_page_recursive(session: AsyncClient, html: str, dog_id: str,
     }
     return map_to_dog_model(parsed_data, max_depth=pedigree_depth)
 
-async def process_single_huskypedigree_dog(dog_id: str, recursive: bool = True, pedigree_depth: int = 3):
+async def parse_single_huskypedigree_dog(dog_id: str, recursive: bool = True, pedigree_depth: int = 3):
     class DateTimeEncoder(json.JSONEncoder):
         from datetime import datetime, date
         def default(self, obj):
@@ -662,9 +666,13 @@ async def process_single_huskypedigree_dog(dog_id: str, recursive: bool = True,
         json_path = f"huskypedigree_{dog_id}.json"
         with open(json_path, 'w', encoding='utf-8') as f:
             json.dump(result, f, ensure_ascii=False, indent=2, cls=DateTimeEncoder)
-        async with session_scope() as session:
-            saved_dog = await save_to_database(result, session)
-        return saved_dog, json_path
+        return result, json_path
+
+async def process_single_huskypedigree_dog(dog_id: str, recursive: bool = True, pedigree_depth: int = 3):
+    result, json_path = await parse_single_huskypedigree_dog(dog_id, recursive, pedigree_depth)
+    async with session_scope() as session:
+        saved_dog = await save_to_database(result, session)
+    return saved_dog, json_path
 
 async def process_huskypedigree_dogs(dog_ids: List[str], recursive: bool = True, pedigree_depth: int = 3):
     parsed_dog_ids = []
@@ -683,63 +691,132 @@ async def process_huskypedigree_dogs(dog_ids: List[str], recursive: bool = True,
     
     return {"parsed_dog_ids": parsed_dog_ids, "processed_dogs_count": len(parsed_dog_ids)}
 
+async def parse_list_page(session: AsyncClient, url: str) -> Tuple[List[Tuple[str, str]], Optional[str]]:
+    # (id, имя) собак со страницы списка и URL следующей страницы
+    await rate_limiter.acquire(url)
+    response = await session.get(url)
+    response.raise_for_status()
+    soup = BeautifulSoup(response.text, 'lxml')
+    
+    dogs = []
+    rows = soup.find_all('tr')
+    if not rows:
+        logger.warning(f"No table rows found on page: {url}")
+        return dogs, None
+    
+    data_rows = [row for row in rows if 'legenda' not in row.get('class', [])]
+    
+    for row in data_rows:
+        cells = row.find_all('td')
+        if len(cells) < 11:
+            continue
+        
+        # Извлекаем ссылку на собаку из третьей колонки (name)
+        name_cell = cells[2] if len(cells) > 2 else None
+        if not name_cell:
+            continue
+        
+        name_link = name_cell.find('a', href=True)
+        if not name_link:
+            continue
+        
+        # Извлекаем ID собаки из href
+        href = name_link['href']
+        match = re.search(r'id=(\d+)', href)
+        if not match:
+            continue
+        
+        dog_id = match.group(1)
+        dog_name = name_link.get_text(strip=True)
+        
+        # Фильтруем записи без достаточной информации
+        if not dog_name or dog_name == "":
+            continue
+        
+        dogs.append((dog_id, dog_name))
+    
+    # Проверяем наличие следующей страницы
+    next_url = None
+    next_page_link = soup.find('a', string='next')
+    if next_page_link and 'href' in next_page_link.attrs:
+        next_url = f"{HUSKY_PEDIGREE_NET_API}/{next_page_link['href']}"
+    
+    return dogs, next_url
+
 async def parse_dog_list_page(session: AsyncClient, url: str, processed_urls: set = None, recursive: bool = False, pedigree_depth: int = 3, start_page: int = 1, max_pages: int = 10) -> List[Dict]:
     if processed_urls is None:
         processed_urls = set()
     
     result_data = []
-    
+    parsed_dogs = []
+
+    # Страницы списка и собаки разбираются пулом воркеров; следующая страница списка
+    # встает в очередь раньше необработанных собак, лимит запросов к сайту общий для всех воркеров
+    async def handle(frontier: CrawlFrontier, item_url: str, payload: Tuple):
+        kind, value = payload
+        if kind == "list":
+            pages_left = value
+            dogs, next_url = await parse_list_page(session, item_url)
+            for dog_id, dog_name in dogs:
+                if dog_id not in processed_urls:
+                    processed_urls.add(dog_id)
+                    logger.info(f"Queued dog from list: {dog_name} (ID: {dog_id})")
+                    frontier.add(f"{dog_page_url}{dog_id}", PRIORITY_DOG, ("dog", (dog_id, dog_name)))
+            if next_url and pages_left > 1 and next_url not in processed_urls:
+                processed_urls.add(next_url)
+                logger.info(f"Moving to next page: {next_url}")
+                frontier.add(next_url, PRIORITY_LIST, ("list", pages_left - 1))
+            return
+
+        dog_id, dog_name = value
+        try:
+            parsed, json_path = await parse_single_huskypedigree_dog(
+                dog_id=dog_id,
+                recursive=recursive,
+                pedigree_depth=pedigree_depth
+            )
+            parsed_dogs.append((dog_id, dog_name, parsed, json_path))
+        except Exception as e:
+            result_data.append({
+                'dog_id': dog_id,
+                'dog_name': dog_name,
+                'status': 'error',
+                'error': str(e)
+            })
+            logger.error(f"Error processing dog {dog_id}: {str(e)}")
+
+    frontier = CrawlFrontier(handle)
+    frontier.add(url, PRIORITY_LIST, ("list", max_pages))
+    await frontier.run()
+
+    # Недоступная стартовая страница списка - ошибка вызова, а не пустой результат
+    for failure in frontier.failures:
+        if failure["url"] == url:
+            raise RuntimeError(f"Error parsing dog list page {url}: {failure['error']}")
+
     try:
-        response = await session.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'lxml')
-        
-        rows = soup.find_all('tr')
-        if not rows:
-            logger.warning(f"No table rows found on page: {url}")
-            return result_data
-        
-        data_rows = [row for row in rows if 'legenda' not in row.get('class', [])]
-        
-        for row in data_rows:
-            cells = row.find_all('td')
-            if len(cells) < 11:
-                continue
-            
-            # Извлекаем ссылку на собаку из третьей колонки (name)
-            name_cell = cells[2] if len(cells) > 2 else None
-            if not name_cell:
-                continue
-            
-            name_link = name_cell.find('a', href=True)
-            if not name_link:
-                continue
-            
-            # Извлекаем ID собаки из href
-            href = name_link['href']
-            match = re.search(r'id=(\d+)', href)
-            if not match:
-                continue
-            
-            dog_id = match.group(1)
-            dog_name = name_link.get_text(strip=True)
-            
-            # Фильтруем записи без достаточной информации
-            if not dog_name or dog_name == "":
-                continue
-            
-            if dog_id not in processed_urls:
-                processed_urls.add(dog_id)
-                logger.info(f"Processing dog from list: {dog_name} (ID: {dog_id})")
-                
-                try:
-                    # Используем process_single_huskypedigree_dog для полной обработки собаки
-                    saved_dog, json_path = await process_single_huskypedigree_dog(
-                        dog_id=dog_id,
-                        recursive=recursive,
-                        pedigree_depth=pedigree_depth
-                    )
-                    
+        # Сохраняем собранных собак пачками: сопоставление с базой за постоянное число запросов на пачку
+        for start in range(0, len(parsed_dogs), LIST_PAGE_SIZE):
+            batch = parsed_dogs[start:start + LIST_PAGE_SIZE]
+            async with session_scope() as db_session:
+                batch_data = [parsed for _, _, parsed, _ in batch]
+                matches = await find_existing_dogs(db_session, batch_data, "husky.pedigre.net")
+                for idx, (dog_id, dog_name, parsed, json_path) in enumerate(batch):
+                    try:
+                        saved_dog = await save_to_database(parsed, db_session, matches[idx])
+                        if saved_dog is None and idx + 1 < len(batch):
+                            # save_to_database откатил сессию, и все найденные собаки в ней истекли: сопоставляем остаток пачки заново
+                            matches[idx + 1:] = await find_existing_dogs(db_session, batch_data[idx + 1:], "husky.pedigre.net")
+                    except Exception as e:
+                        result_data.append({
+                            'dog_id': dog_id,
+                            'dog_name': dog_name,
+                            'status': 'error',
+                            'error': str(e)
+                        })
+                        logger.error(f"Error processing dog {dog_id}: {str(e)}")
+                        continue
+
                     if saved_dog:
                         # Добавляем информацию о сохраненной собаке
                         result_data.append({
@@ -758,26 +835,6 @@ async def parse_dog_list_page(session: AsyncClient, url: str, processed_urls: se
                             'error': 'Failed to save dog'
                         })
                         logger.warning(f"Failed to save dog {dog_name} (ID: {dog_id})")
-                        
-                except Exception as e:
-                    result_data.append({
-                        'dog_id': dog_id,
-                        'dog_name': dog_name,
-                        'status': 'error',
-                        'error': str(e)
-                    })
-                    logger.error(f"Error processing dog {dog_id}: {str(e)}")
-                    continue
-        
-        # Проверяем наличие следующей страницы
-        next_page_link = soup.find('a', string='next')
-        if next_page_link and 'href' in next_page_link.attrs and max_pages > 1:
-            next_url = f"{HUSKY_PEDIGREE_NET_API}/{next_page_link['href']}"
-            if next_url not in processed_urls:
-                processed_urls.add(next_url)
-                logger.info(f"Moving to next page: {next_url}")
-                next_page_data = await parse_dog_list_page(session, next_url, processed_urls, recursive, pedigree_depth, start_page, max_pages - 1)
-                result_data.extend(next_page_data)
         
     except Exception as e:
         logger.error(f"Error parsing dog list page {url}: {str(e)}")
@@ -789,7 +846,7 @@ async def process_huskypedigree_list(start_page: int = 1, max_pages: int = 5, re
     failed_dogs = []
     
     # URL для списка собак
-    list_url = f"{HUSKY_PEDIGREE_NET_API}/lista.php?pasmina=&adv=1&ime=&otac=&majka=&regbr=&god1=&god2=&hruzg=1&uvoz=1&stranci=1&sl=1&x=50&y=12&str={start_page}"
+    list_url = f"{dog_list_url}{start_page}"
     
     async with AsyncClient() as http_session:
         try:
@@ -817,3 +874,17 @@ async def process_huskypedigree_list(start_page: int = 1, max_pages: int = 5, re
         "failed_dogs": failed_dogs,
         "total_attempted": len(parsed_dog_ids) + len(failed_dogs)
     }
+
+async def process_huskypedigree_page(page: int, recursive: bool = True, pedigree_depth: int = 3) -> Dict:
+    # Одна страница списка для обхода с чекпоинтами; ошибка загрузки самой страницы пробрасывается
+    async with AsyncClient() as http_session:
+        search_data = await parse_dog_list_page(http_session, f"{dog_list_url}{page}", recursive=recursive, pedigree_depth=pedigree_depth, start_page=page, max_pages=1)
+
+    return {
+        "parsed_dog_ids": [r['saved_dog_id'] for r in search_data if r['status'] == 'success'],
+        "failed_dogs": [
+            {'dog_id': r['dog_id'], 'dog_name': r['dog_name'], 'error': r.get('error', 'Unknown error')}
+            for r in search_data if r['status'] != 'success'
+        ],
+        "has_more": len(search_data) > 0
+    }
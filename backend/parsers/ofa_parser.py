@@ -4,7 +4,7 @@ from datetime import datetime
 from httpx import AsyncClient
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from playwright.async_api import async_playwright, Page, Browser
+from playwright.async_api import Page
 import re
 import logging
 import json
@@ -15,6 +15,7 @@ from models.dog import Dog
 from models.medicalRecord import MedicalRecord, MedicalRecordCreate
 from core.database import session_scope
 from utils.dog_matcher import find_existing_dog
+from utils.browser_pool import browser_pool
 
 root_path = Path(__file__).parent.parent
 sys.path.append(str(root_path))
@@ -28,20 +29,17 @@ OFA_DETAIL_URL = f"{OFA_BASE_URL}/advanced-search/"
 class OFAParser:
 
     def __init__(self):
-        self.browser: Optional[Browser] = None
         self.page: Optional[Page] = None
 
     async def __aenter__(self):
-        playwright = await async_playwright().start()
-        self.browser = await playwright.chromium.launch(headless=True)
-        self.page = await self.browser.new_page()
+        # Страница из общего пула браузеров на все время работы парсера
+        self.page = await browser_pool.acquire()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         if self.page:
-            await self.page.close()
-        if self.browser:
-            await self.browser.close()
+            await browser_pool.release(self.page, healthy=exc_type is None)
+            self.page = None
 
     async def search_dog_by_registration_number(self, registration_number: str) -> Optional[str]:
         try:
@@ -0,0 +1,398 @@
+import copy
+import logging
+import time
+from datetime import date, datetime
+from typing import Optional, Dict, Any, Iterable, List, Set, Tuple
+
+from sqlalchemy import Boolean, Integer, cast, column, delete, func, select, update, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Dog, DogSiblingLink, Breeder, Litter, Owner, Title
+from models.associations import DogBreederLink, DogOwnerLink
+from utils.dog_matcher import find_existing_dogs, merge_dog_data
+
+logger = logging.getLogger(__name__)
+
+# asyncpg ограничивает запрос 32767 параметрами: размер чанка считаем от числа колонок
+MAX_PARAMS = 30000
+LITTER_COUNTS = ["litter_male_count", "litter_female_count", "litter_undef_count"]
+LITTER_PARENTS = ["dam", "sire", "mating_partner"]
+
+dog_table = Dog.__table__
+# Генерируемые колонки поиска заполняет сам Postgres
+DOG_COLUMNS = [c.name for c in dog_table.columns if c.name != "id" and c.computed is None]
+
+def _chunks(rows: List, columns_count: int):
+    size = max(1, MAX_PARAMS // max(columns_count, 1))
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+def _day(value: Optional[Any]) -> Optional[date]:
+    # Дата помета приходит то датой, то datetime: сравниваем по дню
+    return value.date() if isinstance(value, datetime) else value
+
+class BulkIngestor:
+    # Буфер распарсенных собак и связанных строк, который пишется в базу пачками:
+    # INSERT ... ON CONFLICT (uuid) DO UPDATE ... RETURNING id по чанкам,
+    # родители проставляются вторым проходом, когда id всех собак уже известны
+    def __init__(self, session: AsyncSession, source: str):
+        self.session = session
+        self.source = source
+        self.dogs: Dict[str, Dog] = {}
+        self.parents: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        self.breeders: Dict[str, Dict[str, Any]] = {}
+        self.owners: Dict[str, Dict[str, Any]] = {}
+        self.breeder_links: Dict[str, Set[str]] = {}
+        self.owner_links: Dict[str, Set[str]] = {}
+        self.titles: Dict[str, List[Dict[str, Any]]] = {}
+        self.sibling_links: Dict[str, Set[str]] = {}
+        # Пометы: поля помета, uuid родителей по ролям, uuid щенков
+        self.litters: List[Tuple[Dict[str, Any], Dict[str, Optional[str]], List[str]]] = []
+        # uuid из источника -> uuid записи, с которой собака сопоставлена
+        self.aliases: Dict[str, str] = {}
+        self.ids: Dict[str, int] = {}
+        self.rows_written = 0
+
+    def add_dog(self, dog: Dog, sire_uuid: Optional[str] = None, dam_uuid: Optional[str] = None):
+        self.dogs[dog.uuid] = dog
+        self.parents[dog.uuid] = (sire_uuid, dam_uuid)
+
+    def add_breeder(self, dog_uuid: str, breeder: Breeder):
+        self.breeders[breeder.uuid] = {"uuid": breeder.uuid, "name": breeder.name, "is_breeder": breeder.is_breeder}
+        self.breeder_links.setdefault(dog_uuid, set()).add(breeder.uuid)
+
+    def add_owner(self, dog_uuid: str, owner: Owner):
+        self.owners[owner.uuid] = {"uuid": owner.uuid, "name": owner.name, "is_main_owner": owner.is_main_owner}
+        self.owner_links.setdefault(dog_uuid, set()).add(owner.uuid)
+
+    def add_title(self, dog_uuid: str, title: Title):
+        self.titles.setdefault(dog_uuid, []).append({
+            "short_name": title.short_name,
+            "long_name": title.long_name,
+            "is_prefix": title.is_prefix,
+            "has_winner_year": title.has_winner_year,
+            "winner_year": title.winner_year,
+        })
+
+    def add_sibling(self, dog_uuid: str, sibling_uuid: str):
+        self.sibling_links.setdefault(dog_uuid, set()).add(sibling_uuid)
+
+    def add_litter(self, litter: Dict[str, Any], parent_uuids: Dict[str, Optional[str]], puppy_uuids: List[str]):
+        attrs = {"date_of_birth": litter.get("date_of_birth"), **{c: litter.get(c) or 0 for c in LITTER_COUNTS}}
+        self.litters.append((attrs, parent_uuids, puppy_uuids))
+
+    def dog_id(self, uuid: Optional[str]) -> Optional[int]:
+        if not uuid:
+            return None
+        return self.ids.get(self.aliases.get(uuid, uuid))
+
+    async def _dog_rows(self) -> Tuple[List[Dict[str, Any]], Dict[str, Dog]]:
+        # Существующие собаки ищутся так же, как в find_existing_dog, и сливаются через merge_dog_data
+        # на копии записи: итоговые значения всех колонок уходят в один upsert
+        buffered = list(self.dogs.values())
+        matches = await find_existing_dogs(
+            self.session, [dog.model_dump() for dog in buffered], self.source
+        )
+
+        merged: Dict[str, Dog] = {}
+        existing: Dict[str, Dog] = {}
+        for dog, (existing_dog, _, _) in zip(buffered, matches):
+            if existing_dog is None:
+                merged[dog.uuid] = dog
+                continue
+
+            self.aliases[dog.uuid] = existing_dog.uuid
+            existing[existing_dog.uuid] = existing_dog
+            target = merged.get(existing_dog.uuid)
+            if target is None:
+                target = Dog(**copy.deepcopy({c: getattr(existing_dog, c) for c in DOG_COLUMNS}))
+                target.id = existing_dog.id
+                merged[existing_dog.uuid] = target
+            merge_dog_data(target, dog.model_dump(), self.source)
+
+        rows = [{c: getattr(dog, c) for c in DOG_COLUMNS} for dog in merged.values()]
+        return rows, existing
+
+    async def _upsert_dogs(self, rows: List[Dict[str, Any]]):
+        for chunk in _chunks(rows, len(DOG_COLUMNS)):
+            stmt = insert(dog_table).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[dog_table.c.uuid],
+                set_={c: stmt.excluded[c] for c in DOG_COLUMNS if c != "uuid"}
+            ).returning(dog_table.c.id, dog_table.c.uuid)
+            result = await self.session.execute(stmt)
+            self.ids.update({uuid: dog_id for dog_id, uuid in result.all()})
+            self.rows_written += len(chunk)
+
+    async def _resolve_uuids(self, uuids: Iterable[Optional[str]]):
+        # id собак не из буфера (уже сохраненных раньше) ищем по uuid
+        missing = list({self.aliases.get(uuid, uuid) for uuid in uuids if uuid and self.dog_id(uuid) is None})
+        for chunk in _chunks(missing, 1):
+            result = await self.session.execute(select(Dog.id, Dog.uuid).where(Dog.uuid.in_(chunk)))
+            self.ids.update({uuid: dog_id for dog_id, uuid in result.all()})
+
+    async def _resolve_parents(self, existing: Dict[str, Dog]):
+        # Второй проход: родители из буфера уже имеют id, остальных ищем по uuid одним запросом
+        await self._resolve_uuids(uuid for pair in self.parents.values() for uuid in pair)
+
+        rows = []
+        for uuid, (sire_uuid, dam_uuid) in self.parents.items():
+            dog_id = self.dog_id(uuid)
+            sire_id, dam_id = self.dog_id(sire_uuid), self.dog_id(dam_uuid)
+            if dog_id is not None and (sire_id is not None or dam_id is not None):
+                rows.append((dog_id, sire_id, dam_id))
+
+        # Как и при слиянии записей, родители проставляются только там, где их еще нет
+        pedigree_changes = self.session.info.setdefault("pedigree_changes", {})
+        coi_dirty = self.session.info.setdefault("coi_dirty", set())
+        old_parents = {dog.id: (dog.sire_id, dog.dam_id) for dog in existing.values()}
+        changed = set()
+
+        for chunk in _chunks(rows, 3):
+            parent_values = values(
+                column("id", Integer), column("sire_id", Integer), column("dam_id", Integer), name="parent_values"
+            ).data(chunk)
+            result = await self.session.execute(
+                update(dog_table)
+                .where(dog_table.c.id == parent_values.c.id)
+                .values(
+                    # NULL в VALUES Postgres типизирует как text, поэтому приводим явно
+                    sire_id=func.coalesce(dog_table.c.sire_id, cast(parent_values.c.sire_id, Integer)),
+                    dam_id=func.coalesce(dog_table.c.dam_id, cast(parent_values.c.dam_id, Integer))
+                )
+                .returning(dog_table.c.id, dog_table.c.sire_id, dog_table.c.dam_id)
+            )
+            for dog_id, sire_id, dam_id in result.all():
+                if old_parents.get(dog_id, (None, None)) != (sire_id, dam_id):
+                    changed.add(dog_id)
+            self.rows_written += len(chunk)
+
+        # Прямые UPDATE не вызывают события ORM: передаем изменения в граф родословной и трекер COI сами
+        if changed or self.ids:
+            result = await self.session.execute(
+                select(Dog.id, Dog.sire_id, Dog.dam_id, Dog.sex, Dog.date_of_birth)
+                .where(Dog.id.in_(set(self.ids.values())))
+            )
+            new_ids = set(self.ids.values()) - {dog.id for dog in existing.values()}
+            for row in result.all():
+                if row[0] in changed or row[0] in new_ids:
+                    pedigree_changes[row[0]] = tuple(row)
+            coi_dirty.update(changed | new_ids)
+
+    async def _upsert_people(self, model, rows: Dict[str, Dict[str, Any]], update_columns: List[str]) -> Dict[str, int]:
+        table = model.__table__
+        ids = {}
+        for chunk in _chunks(list(rows.values()), len(update_columns) + 1):
+            stmt = insert(table).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.uuid],
+                set_={c: stmt.excluded[c] for c in update_columns}
+            ).returning(table.c.id, table.c.uuid)
+            result = await self.session.execute(stmt)
+            ids.update({uuid: row_id for row_id, uuid in result.all()})
+            self.rows_written += len(chunk)
+        return ids
+
+    async def _write_links(self, link_model, link_column: str, links: Dict[str, Set[str]], people_ids: Dict[str, int]):
+        dog_ids = {self.dog_id(uuid) for uuid in links} - {None}
+        if not dog_ids:
+            return
+        # Связи собаки перезаписываются целиком, как в clear_relationships
+        await self.session.execute(delete(link_model).where(link_model.dog_id.in_(dog_ids)))
+        rows = [
+            {"dog_id": self.dog_id(dog_uuid), link_column: people_ids[person_uuid]}
+            for dog_uuid, person_uuids in links.items() if self.dog_id(dog_uuid) is not None
+            for person_uuid in person_uuids if person_uuid in people_ids
+        ]
+        for chunk in _chunks(rows, 2):
+            await self.session.execute(insert(link_model.__table__).values(chunk).on_conflict_do_nothing())
+            self.rows_written += len(chunk)
+
+    async def _write_titles(self):
+        titles = {self.dog_id(uuid): rows for uuid, rows in self.titles.items() if self.dog_id(uuid) is not None}
+        if not titles:
+            return
+
+        # Титул определяется тройкой (dog_id, short_name, long_name), как в process_titles
+        result = await self.session.execute(
+            select(Title.id, Title.dog_id, Title.short_name, Title.long_name).where(Title.dog_id.in_(titles.keys()))
+        )
+        existing = {(dog_id, short_name, long_name): title_id for title_id, dog_id, short_name, long_name in result.all()}
+
+        updates, inserts = [], []
+        for dog_id, rows in titles.items():
+            for row in rows:
+                title_id = existing.get((dog_id, row["short_name"], row["long_name"]))
+                if title_id is not None:
+                    updates.append((title_id, row["winner_year"], row["has_winner_year"]))
+                else:
+                    inserts.append({**row, "dog_id": dog_id})
+
+        title_table = Title.__table__
+        for chunk in _chunks(updates, 3):
+            title_values = values(
+                column("id", Integer), column("winner_year", Integer), column("has_winner_year", Boolean), name="title_values"
+            ).data(chunk)
+            await self.session.execute(
+                update(title_table)
+                .where(title_table.c.id == title_values.c.id)
+                .values(
+                    winner_year=cast(title_values.c.winner_year, Integer),
+                    has_winner_year=cast(title_values.c.has_winner_year, Boolean)
+                )
+            )
+            self.rows_written += len(chunk)
+        for chunk in _chunks(inserts, 6):
+            await self.session.execute(insert(title_table).values(chunk))
+            self.rows_written += len(chunk)
+
+    async def _write_siblings(self):
+        # Связываются только братья/сестры, которые уже есть в базе или в буфере: отдельных собак для них не создаем
+        await self._resolve_uuids(uuid for uuids in self.sibling_links.values() for uuid in uuids)
+        dog_ids = {self.dog_id(uuid) for uuid in self.sibling_links} - {None}
+        if not dog_ids:
+            return
+        # Как в clear_relationships: список братьев/сестер собаки перезаписывается целиком
+        await self.session.execute(delete(DogSiblingLink).where(DogSiblingLink.dog_id.in_(dog_ids)))
+        rows = {
+            (self.dog_id(dog_uuid), self.dog_id(sibling_uuid))
+            for dog_uuid, sibling_uuids in self.sibling_links.items() if self.dog_id(dog_uuid) is not None
+            for sibling_uuid in sibling_uuids
+            if self.dog_id(sibling_uuid) is not None and self.dog_id(sibling_uuid) != self.dog_id(dog_uuid)
+        }
+        for chunk in _chunks([{"dog_id": dog_id, "sibling_id": sibling_id} for dog_id, sibling_id in rows], 2):
+            await self.session.execute(insert(DogSiblingLink.__table__).values(chunk).on_conflict_do_nothing())
+            self.rows_written += len(chunk)
+
+    async def _write_litters(self):
+        await self._resolve_uuids(
+            uuid for _, parents, puppies in self.litters for uuid in [*parents.values(), *puppies]
+        )
+        # Помет определяется тройкой (dam_id, sire_id, date_of_birth), как в get_existing_litter;
+        # один помет приходит со страниц обоих родителей и всех щенков
+        litters: Dict[Tuple, Tuple[Dict[str, Any], Set[int]]] = {}
+        for attrs, parents, puppies in self.litters:
+            parent_ids = {f"{role}_id": self.dog_id(parents.get(role)) for role in LITTER_PARENTS}
+            if parent_ids["dam_id"] is None and parent_ids["sire_id"] is None:
+                continue
+            key = (parent_ids["dam_id"], parent_ids["sire_id"], _day(attrs["date_of_birth"]))
+            row, puppy_ids = litters.setdefault(key, ({**attrs, **parent_ids}, set()))
+            if row["mating_partner_id"] is None:
+                row["mating_partner_id"] = parent_ids["mating_partner_id"]
+            puppy_ids.update(self.dog_id(uuid) for uuid in puppies if self.dog_id(uuid) is not None)
+        if not litters:
+            return
+
+        existing = {}
+        dates = list({date for _, _, date in litters})
+        for chunk in _chunks(dates, 1):
+            result = await self.session.execute(
+                select(Litter.id, Litter.dam_id, Litter.sire_id, Litter.date_of_birth).where(Litter.date_of_birth.in_(chunk))
+            )
+            existing.update({(dam_id, sire_id, _day(date)): litter_id for litter_id, dam_id, sire_id, date in result.all()})
+
+        litter_table = Litter.__table__
+        updates, inserts = [], []
+        for key, (row, _) in litters.items():
+            if key in existing:
+                updates.append((existing[key], *[row[c] for c in LITTER_COUNTS], row["mating_partner_id"]))
+            else:
+                inserts.append((key, row))
+
+        for chunk in _chunks(updates, 5):
+            litter_values = values(
+                column("id", Integer), *[column(c, Integer) for c in LITTER_COUNTS], column("mating_partner_id", Integer),
+                name="litter_values"
+            ).data(chunk)
+            await self.session.execute(
+                update(litter_table)
+                .where(litter_table.c.id == litter_values.c.id)
+                .values(
+                    **{c: cast(litter_values.c[c], Integer) for c in LITTER_COUNTS},
+                    mating_partner_id=func.coalesce(cast(litter_values.c.mating_partner_id, Integer), litter_table.c.mating_partner_id)
+                )
+            )
+            self.rows_written += len(chunk)
+        for chunk in _chunks(inserts, 7):
+            result = await self.session.execute(
+                insert(litter_table).values([row for _, row in chunk]).returning(litter_table.c.id)
+            )
+            existing.update({key: litter_id for (key, _), litter_id in zip(chunk, result.scalars().all())})
+            self.rows_written += len(chunk)
+
+        # Щенкам проставляется помет рождения
+        assignments = [
+            (puppy_id, existing[key]) for key, (_, puppy_ids) in litters.items() for puppy_id in puppy_ids
+        ]
+        for chunk in _chunks(assignments, 2):
+            birth_values = values(column("id", Integer), column("birth_litter_id", Integer), name="birth_values").data(chunk)
+            await self.session.execute(
+                update(dog_table)
+                .where(dog_table.c.id == birth_values.c.id)
+                .values(birth_litter_id=cast(birth_values.c.birth_litter_id, Integer))
+            )
+            self.rows_written += len(chunk)
+
+        # Помет показывается в карточках родителей и щенков
+        self.session.info.setdefault("cache_dirty", set()).update(
+            dog_id for key, (row, puppy_ids) in litters.items()
+            for dog_id in [*(row[f"{role}_id"] for role in LITTER_PARENTS), *puppy_ids] if dog_id is not None
+        )
+
+    async def flush(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        self.rows_written = 0
+
+        if self.dogs:
+            rows, existing = await self._dog_rows()
+            await self._upsert_dogs(rows)
+            await self._resolve_parents(existing)
+            # Загруженные в сессию записи устарели после прямых UPDATE
+            for dog in existing.values():
+                self.session.expire(dog)
+            # Кэш ответов (services/read_cache.py): владельцы, заводчики и титулы ниже тоже относятся к этим собакам
+            cache_dirty = self.session.info.setdefault("cache_dirty", set())
+            cache_dirty.update(self.ids.values())
+            # ...а имена и даты этих собак показываются в карточках их братьев/сестер
+            for ids in _chunks(list(self.ids.values()), 2):
+                result = await self.session.execute(
+                    select(DogSiblingLink.dog_id).where(DogSiblingLink.sibling_id.in_(ids))
+                    .union(select(DogSiblingLink.sibling_id).where(DogSiblingLink.dog_id.in_(ids)))
+                )
+                cache_dirty.update(result.scalars().all())
+
+        if self.breeders:
+            breeder_ids = await self._upsert_people(Breeder, self.breeders, ["name", "is_breeder"])
+            await self._write_links(DogBreederLink, "breeder_id", self.breeder_links, breeder_ids)
+        if self.owners:
+            owner_ids = await self._upsert_people(Owner, self.owners, ["name", "is_main_owner"])
+            await self._write_links(DogOwnerLink, "owner_id", self.owner_links, owner_ids)
+        await self._write_titles()
+        if self.sibling_links:
+            await self._write_siblings()
+        if self.litters:
+            await self._write_litters()
+
+        seconds = time.perf_counter() - started
+        stats = {
+            "dogs": len(self.dogs),
+            "rows_written": self.rows_written,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(self.rows_written / seconds, 1) if seconds > 0 else None,
+        }
+        logger.info(
+            f"Bulk ingest ({self.source}): {stats['dogs']} dogs, {stats['rows_written']} rows "
+            f"in {stats['seconds']}s ({stats['rows_per_second']} rows/s)"
+        )
+
+        self.dogs.clear()
+        self.parents.clear()
+        self.breeders.clear()
+        self.owners.clear()
+        self.breeder_links.clear()
+        self.owner_links.clear()
+        self.titles.clear()
+        self.sibling_links.clear()
+        self.litters.clear()
+        return stats
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+from sqlalchemy import Float, Integer, column, event, inspect, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models import Dog
+from services.pedigree_graph import PedigreeGraph, pedigree_graph
+from services.read_cache import ALL_DOGS, bump_dogs
+from utils.background import spawn
+from utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+# Собаки, у которых сменились родители: их COI и COI всех потомков устарели
+DIRTY_KEY = "coi:dirty"
+
+# Расчет по графу - чистый NumPy на секунды: идет в отдельном потоке, чтобы не держать цикл событий API
+def _compute(graph: PedigreeGraph, target_ids: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    if target_ids is None:
+        return graph.ids[:graph.size].astype(np.int64), graph.inbreeding()
+    positions = np.array([graph.position(dog_id) for dog_id in target_ids.tolist()], dtype=np.int64)
+    positions = positions[positions != -1]
+    dog_ids = graph.ids[positions].astype(np.int64)
+    return dog_ids, graph.inbreeding(positions) if len(positions) else np.zeros(0)
+
+def _compute_dirty(graph: PedigreeGraph, dirty_ids: List[int]) -> Tuple[List[int], np.ndarray, np.ndarray]:
+    roots = np.array([graph.position(dog_id) for dog_id in dirty_ids], dtype=np.int64)
+    unresolved = [dog_id for dog_id, pos in zip(dirty_ids, roots.tolist()) if pos == -1]
+    roots = roots[roots != -1]
+    positions = np.array(sorted(graph.descendant_positions(roots)), dtype=np.int64) if len(roots) else np.zeros(0, dtype=np.int64)
+    dog_ids = graph.ids[positions].astype(np.int64)
+    # meuwissen_luo обходит подродословную по слоям поколений, т.е. в топологическом порядке
+    return unresolved, dog_ids, graph.inbreeding(positions) if len(positions) else np.zeros(0)
+
+class CoiService:
+    # Пересчет COI сразу для всей популяции (или подмножества) по полной родословной
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def _graph(self) -> PedigreeGraph:
+        # Считаем по копии: общий граф меняется в цикле событий, пока расчет идет в потоке
+        if pedigree_graph.loaded:
+            return pedigree_graph.snapshot()
+        graph = PedigreeGraph()
+        await graph.load()
+        return graph
+
+    async def _target_ids(self, modified_since: Optional[datetime]) -> Optional[np.ndarray]:
+        if modified_since is None:
+            return None
+        result = await self.session.execute(select(Dog.id).where(Dog.modified_at >= modified_since))
+        return np.array(result.scalars().all(), dtype=np.int64)
+
+    async def _store(self, dog_ids: np.ndarray, coi: np.ndarray, updated_on: datetime, chunk_size: int):
+        # Один UPDATE ... FROM (VALUES ...) на чанк
+        for start in range(0, len(dog_ids), chunk_size):
+            rows = list(zip(
+                dog_ids[start:start + chunk_size].tolist(),
+                coi[start:start + chunk_size].tolist()
+            ))
+            coi_values = values(column("id", Integer), column("coi", Float), name="coi_values").data(rows)
+            await self.session.execute(
+                update(Dog)
+                .where(Dog.id == coi_values.c.id)
+                .values(coi=coi_values.c.coi, coi_updated_on=updated_on)
+                .execution_options(synchronize_session=False)
+            )
+            await self.session.commit()
+
+    async def _load_missing(self, graph: PedigreeGraph, dog_ids: List[int]):
+        # Собака могла быть создана воркером раньше, чем изменение графа дошло до этого процесса по pub/sub
+        missing = [dog_id for dog_id in dog_ids if graph.position(dog_id) == -1]
+        if not missing:
+            return
+        result = await self.session.execute(
+            select(Dog.id, Dog.sire_id, Dog.dam_id, Dog.sex, Dog.date_of_birth).where(Dog.id.in_(missing))
+        )
+        graph.apply_changes(tuple(row) for row in result.all())
+
+    async def _pop_dirty(self) -> List[int]:
+        async with cache.redis.pipeline(transaction=True) as pipe:
+            pipe.smembers(DIRTY_KEY)
+            pipe.delete(DIRTY_KEY)
+            members, _ = await pipe.execute()
+        return sorted(int(member) for member in members)
+
+    async def recalculate_dirty(self, chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+        # Пересчет только затронутого подграфа: измененные собаки и все их потомки
+        started = time.perf_counter()
+        dirty_ids = await self._pop_dirty()
+        try:
+            graph = await self._graph()
+            await self._load_missing(graph, dirty_ids)
+            unresolved, dog_ids, coi = await asyncio.to_thread(_compute_dirty, graph, dirty_ids)
+            # Собак, которых нет ни в графе, ни в базе (транзакция еще не закоммичена), оставляем до следующего запуска
+            if unresolved:
+                await cache.redis.sadd(DIRTY_KEY, *unresolved)
+            await self._store(dog_ids, coi, datetime.now(), chunk_size)
+            await bump_dogs(dog_ids.tolist())
+        except Exception:
+            # Не теряем отметки: следующий запуск попробует снова
+            if dirty_ids:
+                await cache.redis.sadd(DIRTY_KEY, *dirty_ids)
+            raise
+
+        total = time.perf_counter() - started
+        stats = {
+            "dirty_dogs": len(dirty_ids),
+            "dogs_updated": len(dog_ids),
+            "total_seconds": round(total, 3),
+        }
+        logger.info(f"COI refreshed for {stats['dogs_updated']} dogs from {stats['dirty_dogs']} changed parent links in {stats['total_seconds']}s")
+        return stats
+
+    async def recalculate(self, modified_since: Optional[datetime] = None, chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+        started = time.perf_counter()
+        graph = await self._graph()
+        target_ids = await self._target_ids(modified_since)
+        loaded = time.perf_counter()
+
+        dog_ids, coi = await asyncio.to_thread(_compute, graph, target_ids)
+        computed = time.perf_counter()
+
+        await self._store(dog_ids, coi, datetime.now(), chunk_size)
+        # COI всей популяции меняет почти каждый закэшированный ответ: одна общая версия вместо версии каждой собаки
+        await bump_dogs([ALL_DOGS] if target_ids is None else dog_ids.tolist())
+        finished = time.perf_counter()
+
+        total = finished - started
+        stats = {
+            "dogs_updated": len(dog_ids),
+            "modified_since": modified_since,
+            "load_seconds": round(loaded - started, 3),
+            "compute_seconds": round(computed - loaded, 3),
+            "write_seconds": round(finished - computed, 3),
+            "total_seconds": round(total, 3),
+            "dogs_per_second": round(len(dog_ids) / total, 1) if total > 0 else None,
+        }
+        logger.info(
+            f"COI recalculated for {stats['dogs_updated']} dogs in {stats['total_seconds']}s "
+            f"({stats['dogs_per_second']} dogs/s; compute {stats['compute_seconds']}s, write {stats['write_seconds']}s)"
+        )
+        return stats
+
+async def mark_dirty(dog_ids: List[int]):
+    try:
+        await cache.redis.sadd(DIRTY_KEY, *dog_ids)
+    except Exception as e:
+        logger.warning(f"Could not mark COI as stale: {str(e)}")
+
+# Трекер изменений родителей: новые собаки и смена sire_id/dam_id помечают COI устаревшим
+def _track_new_dog(mapper, connection, dog: Dog):
+    session = Session.object_session(dog)
+    if session is not None:
+        session.info.setdefault("coi_dirty", set()).add(dog.id)
+
+def _track_parent_change(mapper, connection, dog: Dog):
+    session = Session.object_session(dog)
+    if session is None:
+        return
+    state = inspect(dog)
+    if state.attrs.sire_id.history.has_changes() or state.attrs.dam_id.history.has_changes():
+        session.info.setdefault("coi_dirty", set()).add(dog.id)
+
+@event.listens_for(Session, "after_commit")
+def _flush_coi_dirty(session: Session):
+    dirty = session.info.pop("coi_dirty", None)
+    if not dirty:
+        return
+    spawn(mark_dirty(sorted(dirty)))
+
+@event.listens_for(Session, "after_rollback")
+def _discard_coi_dirty(session: Session):
+    session.info.pop("coi_dirty", None)
+
+event.listen(Dog, "after_insert", _track_new_dog)
+event.listen(Dog, "after_update", _track_parent_change)
@@ -0,0 +1,112 @@
+import re
+from typing import Any, List, Optional
+
+from sqlalchemy import func, literal_column, or_, select
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Dog, DogReadSimple
+
+# Генерируемые колонки таблицы dog (models/dog.py), в маппинг модели не входят,
+# чтобы ORM и пакетная запись не пытались их заполнять:
+#   search_vector - tsvector по именам, номеру регистрации и кличкам родителей, с весами A/B/C
+#   search_text - те же поля одной строкой в нижнем регистре через разделитель 0x1F, под триграммный индекс для поиска подстроки
+search_vector = Dog.__table__.c.search_vector
+search_text = Dog.__table__.c.search_text
+
+SEARCH_SEPARATOR = chr(31)
+
+# Словарь simple: без стемминга, клички и номера не меняются
+TS_CONFIG = literal_column("'simple'", REGCONFIG)
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def prefix_tsquery(term: str) -> Optional[Any]:
+    # "snow sto" -> snow:* & sto:* - каждое слово как префикс, для поиска по мере ввода
+    tokens = re.findall(r"\w+", term.lower())
+    if not tokens:
+        return None
+    return func.to_tsquery(TS_CONFIG, " & ".join(f"{token}:*" for token in tokens))
+
+def search_condition(term: str):
+    # Совпадение по префиксам слов (GIN по search_vector) или подстрока в любом из полей (GIN-триграммы по search_text)
+    # Разделитель полей из запроса убираем, иначе подстрока могла бы захватить два поля
+    substring = search_text.like(f"%{escape_like(term.replace(SEARCH_SEPARATOR, '').lower().strip())}%")
+    tsquery = prefix_tsquery(term)
+    if tsquery is None:
+        return substring
+    return or_(search_vector.op("@@")(tsquery), substring)
+
+def search_rank(term: str):
+    tsquery = prefix_tsquery(term)
+    if tsquery is None:
+        return None
+    return func.ts_rank(search_vector, tsquery)
+
+def name_contains(column, term: str):
+    # Для owner.name / breeder.name: выражение совпадает с индексами lower(name) gin_trgm_ops
+    return func.lower(column).like(f"%{escape_like(term.lower().strip())}%")
+
+async def suggest_dogs(session: AsyncSession, term: str, limit: int = 10) -> List[DogReadSimple]:
+    # Подсказки для поля поиска: только префиксы слов, лучшие по рангу
+    tsquery = prefix_tsquery(term)
+    if tsquery is None:
+        return []
+    columns = [getattr(Dog, name) for name in DogReadSimple.model_fields]
+    query = (
+        select(*columns)
+        .where(search_vector.op("@@")(tsquery))
+        .order_by(func.ts_rank(search_vector, tsquery).desc(), Dog.registered_name, Dog.id)
+        .limit(limit)
+    )
+    result = await session.execute(query)
+    return [DogReadSimple.model_validate(dict(row)) for row in result.mappings().all()]
+
+if __name__ == "__main__":
+    # Бенчмарк поиска на данных из настроенной базы: python -m services.dog_search snow "kolyma silver" rkf
+    import asyncio
+    import sys
+    import time
+
+    from core.database import async_session
+
+    def ilike_condition(term: str):
+        # Прежний фильтр search: пять ILIKE '%term%'
+        pattern = f"%{term}%"
+        return or_(
+            Dog.registered_name.ilike(pattern),
+            Dog.registration_number.ilike(pattern),
+            Dog.call_name.ilike(pattern),
+            Dog.sire_name.ilike(pattern),
+            Dog.dam_name.ilike(pattern)
+        )
+
+    async def measure(session: AsyncSession, query, repeat: int = 5) -> float:
+        await session.execute(query)  # прогрев кэша страниц
+        started = time.perf_counter()
+        for _ in range(repeat):
+            await session.execute(query)
+        return (time.perf_counter() - started) / repeat * 1000
+
+    async def main(terms: List[str]):
+        async with async_session() as session:
+            total = (await session.execute(select(func.count(Dog.id)))).scalar_one()
+            print(f"dogs: {total}")
+            print(f"{'term':20s} {'ilike count':>12s} {'index count':>12s} {'ilike page':>11s} {'index page':>11s} {'suggest':>9s}")
+            for term in terms:
+                results = []
+                for condition in (ilike_condition(term), search_condition(term)):
+                    count_query = select(func.count(Dog.id)).where(condition)
+                    page_query = select(Dog.id).where(condition).order_by(Dog.registered_name).limit(20)
+                    results.append((await measure(session, count_query), await measure(session, page_query)))
+                started = time.perf_counter()
+                await suggest_dogs(session, term)
+                suggest_ms = (time.perf_counter() - started) * 1000
+                (ilike_count, ilike_page), (index_count, index_page) = results
+                print(
+                    f"{term:20s} {ilike_count:10.1f}ms {index_count:10.1f}ms "
+                    f"{ilike_page:9.1f}ms {index_page:9.1f}ms {suggest_ms:7.1f}ms"
+                )
+
+    asyncio.run(main(sys.argv[1:] or ["snow", "kolyma silver", "rkf", "storm"]))
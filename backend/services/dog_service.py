@@ -1,21 +1,53 @@
 from datetime import datetime
 from http.client import HTTPException
+import base64
+import hashlib
+import json
 import logging
-from sqlalchemy import func
+from sqlalchemy import func, text, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select, and_, or_
 from sqlalchemy.orm import selectinload
-from typing import Optional, Dict, Any, Set, Tuple
+from typing import List, Optional, Dict, Any, Set, Tuple
 from collections import defaultdict
 import tempfile
 import os
 from graphviz import Digraph
 
-from models import Dog, Breeder, Owner, Title, Litter
+from models import Dog, DogListItem, Breeder, Owner, Title, Litter
 from models.associations import DogBreederLink, DogOwnerLink
+from services.dog_search import name_contains, search_condition, search_rank
+from services.pedigree_service import PedigreeService
+from utils.inbreeding import inbreeding_coefficients
+from utils.cache import cache
 
 logger = logging.getLogger(__name__)
 
+# Колонки, по которым список собак можно листать курсором
+KEYSET_SORT_COLUMNS = {
+    'registered_name', 'call_name', 'year_of_birth', 'date_of_birth',
+    'land_of_birth', 'land_of_standing', 'modified_at'
+}
+COUNT_CACHE_TTL = 300
+
+def encode_list_cursor(sort_by: str, sort_order: str, value: Any, dog_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort_by, sort_order, value, dog_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_list_cursor(cursor: str, sort_by: str, sort_order: str) -> Tuple[Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort_by, cursor_sort_order, value, dog_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if (cursor_sort_by, cursor_sort_order) != (sort_by, sort_order):
+        raise ValueError("Cursor does not match the requested sort")
+    if value is not None and sort_by in ("date_of_birth", "modified_at"):
+        value = datetime.fromisoformat(value)
+    return value, int(dog_id)
+
 def collect_pedigree(dog, max_depth=5, current_depth=0, collected=None):
     if collected is None:
         collected = {}
@@ -68,20 +100,21 @@ class DogService:
 
     async def calculate_coi(self, dog_id: int, max_generations: int = 10) -> Dict[str, Any]:
         try:
-            dog = await self.get_dog_by_id(dog_id)
-            
+            result = await self.session.execute(select(Dog).where(Dog.id == dog_id))
+            dog = result.scalars().first()
+
             if not dog:
                 raise HTTPException(status_code=404, detail="Dog not found")
-            
-            pedigree_tree = await self._build_pedigree_tree(dog, max_generations)
-            
+
+            links = await PedigreeService(self.session).load_parent_links(dog_id, max_generations)
+
             # Calculate COI
-            coi_result = self._calculate_coi_from_tree(pedigree_tree)
-            
+            coi_result = await self._calculate_coi_from_links(dog_id, links)
+
             dog.coi = coi_result['coi']
             dog.coi_updated_on = datetime.now()
             await self.session.commit()
-            
+
             return {
                 "dog_id": dog_id,
                 "dog_name": dog.registered_name,
@@ -92,167 +125,80 @@ class DogService:
                 "calculation_details": coi_result['details'],
                 "updated_at": dog.coi_updated_on
             }
-            
+
         except Exception as e:
             logger.error(f"Error calculating COI for dog {dog_id}: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error calculating COI: {str(e)}")
 
-    async def _build_pedigree_tree(self, dog: Dog, max_generations: int) -> Dict:
-        pedigree = {}
-        await self._add_ancestors_to_tree(dog, pedigree, max_generations, 0)
-        return pedigree
-
-    async def _add_ancestors_to_tree(self, dog: Dog, tree: Dict, max_generations: int, current_generation: int):
-        if not dog or current_generation >= max_generations:
-            return
-        
-        tree[dog.id] = {
-            'id': dog.id,
-            'name': dog.registered_name,
-            'generation': current_generation,
-            'sire_id': dog.sire_id,
-            'dam_id': dog.dam_id,
-            'coi': dog.coi or 0.0
-        }
-        
-        # Add sire
-        if dog.sire_id and dog.sire:
-            await self.session.refresh(dog, ['sire'])
-            await self._add_ancestors_to_tree(dog.sire, tree, max_generations, current_generation + 1)
-        
-        # Add dam
-        if dog.dam_id and dog.dam:
-            await self.session.refresh(dog, ['dam'])
-            await self._add_ancestors_to_tree(dog.dam, tree, max_generations, current_generation + 1)
-
-    def _calculate_coi_from_tree(self, pedigree_tree: Dict) -> Dict[str, Any]:
-        if not pedigree_tree:
+    async def _calculate_coi_from_links(self, dog_id: int, links: Dict[int, Tuple[Optional[int], Optional[int], int]]) -> Dict[str, Any]:
+        if dog_id not in links:
             return {
                 'coi': 0.0,
                 'generations_analyzed': 0,
                 'common_ancestors': [],
                 'details': []
             }
-        main_dog_id = None
-        for dog_id, dog_data in pedigree_tree.items():
-            if dog_data['generation'] == 0:
-                main_dog_id = dog_id
-                break
-        
-        if not main_dog_id:
-            return {
-                'coi': 0.0,
-                'generations_analyzed': 0,
-                'common_ancestors': [],
-                'details': []
-            }
-        
-        main_dog = pedigree_tree[main_dog_id]
-        sire_id = main_dog.get('sire_id')
-        dam_id = main_dog.get('dam_id')
-        
-        if not sire_id or not dam_id:
-            return {
-                'coi': 0.0,
-                'generations_analyzed': 0,
-                'common_ancestors': [],
-                'details': []
+
+        coefficients = inbreeding_coefficients({
+            ancestor_id: (sire_id, dam_id) for ancestor_id, (sire_id, dam_id, _) in links.items()
+        })
+
+        sire_id, dam_id, _ = links[dog_id]
+        sire_depths = self._get_ancestor_depths(links, sire_id)
+        dam_depths = self._get_ancestor_depths(links, dam_id)
+        common_ancestors = set(sire_depths).intersection(dam_depths)
+
+        names = {}
+        if common_ancestors:
+            result = await self.session.execute(
+                select(Dog.id, Dog.registered_name).where(Dog.id.in_(common_ancestors))
+            )
+            names = dict(result.all())
+
+        details = [
+            {
+                'ancestor_id': ancestor_id,
+                'ancestor_name': names.get(ancestor_id),
+                'generations_to_sire': sire_depths[ancestor_id],
+                'generations_to_dam': dam_depths[ancestor_id],
+                'ancestor_coi': coefficients[ancestor_id],
             }
-        sire_ancestors = self._get_ancestors(pedigree_tree, sire_id)
-        dam_ancestors = self._get_ancestors(pedigree_tree, dam_id)
-        common_ancestors = sire_ancestors.intersection(dam_ancestors)
-        
-        coi = 0.0
-        details = []
-        generations_analyzed = max(
-            max((pedigree_tree[dog_id]['generation'] for dog_id in pedigree_tree), default=0)
-        )
-        
-        for ancestor_id in common_ancestors:
-            ancestor = pedigree_tree[ancestor_id]
-            sire_path = self._find_path_to_ancestor(pedigree_tree, sire_id, ancestor_id)
-            dam_path = self._find_path_to_ancestor(pedigree_tree, dam_id, ancestor_id)
-            
-            if sire_path and dam_path:
-                n1 = len(sire_path) - 1
-                n2 = len(dam_path) - 1
-                
-                fa = ancestor.get('coi', 0.0)  # Inbreeding coefficient of the ancestor
-                contribution = (0.5 ** (n1 + n2 + 1)) * (1 + fa)
-                coi += contribution
-                
-                details.append({
-                    'ancestor_id': ancestor_id,
-                    'ancestor_name': ancestor['name'],
-                    'generations_to_sire': n1,
-                    'generations_to_dam': n2,
-                    'ancestor_coi': fa,
-                    'contribution': contribution,
-                    'sire_path': sire_path,
-                    'dam_path': dam_path
-                })
-        
+            for ancestor_id in common_ancestors
+        ]
+
         return {
-            'coi': coi,
-            'generations_analyzed': generations_analyzed,
+            'coi': coefficients[dog_id],
+            'generations_analyzed': max(depth for _, _, depth in links.values()),
             'common_ancestors': [
                 {
-                    'id': pedigree_tree[ancestor_id]['id'],
-                    'name': pedigree_tree[ancestor_id]['name'],
-                    'generation': pedigree_tree[ancestor_id]['generation']
+                    'id': ancestor_id,
+                    'name': names.get(ancestor_id),
+                    'generation': links[ancestor_id][2]
                 }
                 for ancestor_id in common_ancestors
             ],
             'details': details
         }
 
-    def _get_ancestors(self, pedigree_tree: Dict, dog_id: int) -> Set[int]:
-        ancestors = set()
-        
-        def collect_ancestors(current_id: int):
-            if current_id not in pedigree_tree:
-                return
-            
-            dog_data = pedigree_tree[current_id]
-            ancestors.add(current_id)
-            
-            if dog_data.get('sire_id'):
-                collect_ancestors(dog_data['sire_id'])
-            if dog_data.get('dam_id'):
-                collect_ancestors(dog_data['dam_id'])
-        
-        collect_ancestors(dog_id)
-        return ancestors
-
-    def _find_path_to_ancestor(self, pedigree_tree: Dict, start_id: int, target_id: int) -> Optional[list]:
-        if start_id not in pedigree_tree or target_id not in pedigree_tree:
-            return None
-        
-        def find_path(current_id: int, path: list) -> Optional[list]:
-            if current_id == target_id:
-                return path + [current_id]
-            
-            if current_id not in pedigree_tree:
-                return None
-            
-            dog_data = pedigree_tree[current_id]
-            if dog_data.get('sire_id'):
-                sire_path = find_path(dog_data['sire_id'], path + [current_id])
-                if sire_path:
-                    return sire_path
-            if dog_data.get('dam_id'):
-                dam_path = find_path(dog_data['dam_id'], path + [current_id])
-                if dam_path:
-                    return dam_path
-            
-            return None
-        
-        return find_path(start_id, [])
+    def _get_ancestor_depths(self, links: Dict[int, Tuple[Optional[int], Optional[int], int]], dog_id: Optional[int]) -> Dict[int, int]:
+        # Кратчайшее расстояние (в поколениях) от dog_id до каждого его предка в links
+        depths = {}
+        frontier = [dog_id] if dog_id in links else []
+        depth = 0
+        while frontier:
+            next_frontier = []
+            for current_id in frontier:
+                if current_id in depths:
+                    continue
+                depths[current_id] = depth
+                sire_id, dam_id, _ = links[current_id]
+                next_frontier.extend(parent_id for parent_id in (sire_id, dam_id) if parent_id in links)
+            frontier = next_frontier
+            depth += 1
+        return depths
 
-    async def get_dogs_paginated(
+    def _list_conditions(
         self,
-        page: int = 0,
-        per_page: int = 15,
         date_of_birth_start: Optional[datetime] = None,
         date_of_birth_end: Optional[datetime] = None,
         date_of_death_start: Optional[datetime] = None,
@@ -260,34 +206,12 @@ class DogService:
         modified_at_start: Optional[datetime] = None,
         modified_at_end: Optional[datetime] = None,
         **filters: Dict[str, Any]
-    ) -> Dict[str, Any]:
-        # Build query with filters
-        query = select(Dog).options(
-            selectinload(Dog.titles),
-            selectinload(Dog.owners),
-            selectinload(Dog.breeders),
-            selectinload(Dog.dam),
-            selectinload(Dog.sire),
-            selectinload(Dog.litters_as_dam),
-            selectinload(Dog.litters_as_sire),
-            selectinload(Dog.litters_as_mating_partner),
-            selectinload(Dog.birth_litter),
-            selectinload(Dog.siblings),
-            selectinload(Dog.medical_records),
-            selectinload(Dog.merge_logs),
-        )
-        
+    ) -> List[Any]:
         conditions = []
         
         if filters.get("search"):
-            search_term = f"%{filters['search']}%"
-            conditions.append(or_(
-                Dog.registered_name.ilike(search_term),
-                Dog.registration_number.ilike(search_term),
-                Dog.call_name.ilike(search_term),
-                Dog.sire_name.ilike(search_term),
-                Dog.dam_name.ilike(search_term)
-            ))
+            # Префиксы слов по search_vector или подстрока по search_text, оба через GIN-индексы
+            conditions.append(search_condition(filters['search']))
                         
         if filters.get("color"):
             conditions.append(Dog.color.ilike(f"%{filters['color']}%"))
@@ -295,6 +219,8 @@ class DogService:
             conditions.append(Dog.land_of_birth == filters['land_of_birth'])
         if filters.get("land_of_standing"):
             conditions.append(Dog.land_of_standing == filters['land_of_standing'])
+        if filters.get("sex") is not None:
+            conditions.append(Dog.sex == filters['sex'])
 
         # Булевы фильтры
         if filters.get("neutered") is not None:
@@ -307,6 +233,8 @@ class DogService:
             conditions.append(Dog.artificial_insemination == filters['artificial_insemination'])
         if filters.get("is_new") is not None:
             conditions.append(Dog.is_new == filters['is_new'])
+        if filters.get("has_conflicts") is not None:
+            conditions.append(Dog.has_conflicts == filters['has_conflicts'])
         
         # Фильтр по наличию фото
         if filters.get("has_photo"):
@@ -315,13 +243,13 @@ class DogService:
         # Фильтры по связанным сущностям
         if filters.get("owner_name"):
             subquery = select(DogOwnerLink.dog_id).join(Owner).where(
-                Owner.name.ilike(f"%{filters['owner_name']}%")
+                name_contains(Owner.name, filters['owner_name'])
             ).subquery()
             conditions.append(Dog.id.in_(subquery))
         
         if filters.get("breeder_name"):
             subquery = select(DogBreederLink.dog_id).join(Breeder).where(
-                Breeder.name.ilike(f"%{filters['breeder_name']}%")
+                name_contains(Breeder.name, filters['breeder_name'])
             ).subquery()
             conditions.append(Dog.id.in_(subquery))
             
@@ -352,7 +280,46 @@ class DogService:
                 date_conditions.append(Dog.modified_at <= modified_at_end)
             conditions.append(and_(*date_conditions))
 
+        return conditions
+
+    async def get_dogs_paginated(
+        self,
+        page: int = 0,
+        per_page: int = 15,
+        date_of_birth_start: Optional[datetime] = None,
+        date_of_birth_end: Optional[datetime] = None,
+        date_of_death_start: Optional[datetime] = None,
+        date_of_death_end: Optional[datetime] = None,
+        modified_at_start: Optional[datetime] = None,
+        modified_at_end: Optional[datetime] = None,
+        **filters: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        # Build query with filters
+        query = select(Dog).options(
+            selectinload(Dog.titles),
+            selectinload(Dog.owners),
+            selectinload(Dog.breeders),
+            selectinload(Dog.dam),
+            selectinload(Dog.sire),
+            selectinload(Dog.litters_as_dam),
+            selectinload(Dog.litters_as_sire),
+            selectinload(Dog.litters_as_mating_partner),
+            selectinload(Dog.birth_litter),
+            selectinload(Dog.siblings),
+            selectinload(Dog.medical_records),
+            selectinload(Dog.merge_logs),
+        )
         
+        conditions = self._list_conditions(
+            date_of_birth_start=date_of_birth_start,
+            date_of_birth_end=date_of_birth_end,
+            date_of_death_start=date_of_death_start,
+            date_of_death_end=date_of_death_end,
+            modified_at_start=modified_at_start,
+            modified_at_end=modified_at_end,
+            **filters
+        )
+
         logger.info(f"Filters: {conditions}")
         
         if conditions:
@@ -362,7 +329,15 @@ class DogService:
         sort_column = filters.get('sort_by', 'id')
         sort_order = filters.get('sort_order', 'asc')
         
-        column = getattr(Dog, sort_column, None)
+        # По релевантности сортируем, только когда есть что ранжировать
+        rank = search_rank(filters['search']) if sort_column == 'relevance' and filters.get("search") else None
+        if rank is not None:
+            query = query.order_by(rank.desc(), Dog.id)
+            sort_column = None
+        elif sort_column == 'relevance':
+            sort_column = 'registered_name'
+
+        column = getattr(Dog, sort_column, None) if sort_column else None
         if column is not None:
             if sort_order.lower() == 'desc':
                 query = query.order_by(column.desc())
@@ -399,6 +374,109 @@ class DogService:
             }
         }
 
+    async def get_dogs_keyset(
+        self,
+        per_page: int = 20,
+        cursor: Optional[str] = None,
+        count: str = "none",
+        **filters: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        # Список для таблицы: только нужные колонки и keyset-пагинация по (колонка сортировки, id),
+        # поэтому дальние страницы стоят столько же, сколько первая
+        sort_by = filters.pop("sort_by", None) or "registered_name"
+        sort_order = (filters.pop("sort_order", None) or "asc").lower()
+        if sort_by not in KEYSET_SORT_COLUMNS:
+            raise ValueError(f"Unsupported sort column: {sort_by}")
+        column = getattr(Dog, sort_by)
+        descending = sort_order == "desc"
+
+        conditions = self._list_conditions(**filters)
+        columns = [getattr(Dog, name) for name in DogListItem.model_fields]
+        value, last_id = decode_list_cursor(cursor, sort_by, sort_order) if cursor else (None, None)
+
+        def segment(*where):
+            query = select(*columns).where(*where)
+            if conditions:
+                query = query.where(and_(*conditions))
+            return query
+
+        # Строки без значения в колонке сортировки идут после остальных в обоих направлениях.
+        # Два сегмента вместо одного OR: каждый - диапазон по индексу (колонка, id)
+        limit = per_page + 1
+        rows = []
+        if last_id is None or value is not None:
+            query = segment(column.is_not(None))
+            if last_id is not None:
+                after = tuple_(column, Dog.id) < tuple_(value, last_id) if descending else tuple_(column, Dog.id) > tuple_(value, last_id)
+                query = query.where(after)
+            order = (column.desc(), Dog.id.desc()) if descending else (column.asc(), Dog.id.asc())
+            rows = (await self.session.execute(query.order_by(*order).limit(limit))).mappings().all()
+
+        if len(rows) < limit:
+            query = segment(column.is_(None))
+            if last_id is not None and value is None:
+                query = query.where(Dog.id < last_id if descending else Dog.id > last_id)
+            order = Dog.id.desc() if descending else Dog.id.asc()
+            rows += (await self.session.execute(query.order_by(order).limit(limit - len(rows)))).mappings().all()
+
+        # Лишняя строка показывает, есть ли следующая страница, без отдельного count(*)
+        has_more = len(rows) > per_page
+        items = [DogListItem.model_validate(dict(row)) for row in rows[:per_page]]
+
+        next_cursor = None
+        if has_more:
+            last = items[-1]
+            next_cursor = encode_list_cursor(sort_by, sort_order, getattr(last, sort_by), last.id)
+
+        total, total_is_estimate = None, False
+        if count == "exact":
+            total = await self._count(conditions)
+        elif count == "estimate":
+            total, total_is_estimate = await self._estimate_count(conditions)
+
+        return {
+            "data": items,
+            "meta": {
+                "per_page": per_page,
+                "next_cursor": next_cursor,
+                "has_more": has_more,
+                "total": total,
+                "total_is_estimate": total_is_estimate
+            }
+        }
+
+    async def _count(self, conditions: List[Any]) -> int:
+        query = select(func.count(Dog.id))
+        if conditions:
+            query = query.where(and_(*conditions))
+        return (await self.session.execute(query)).scalar_one()
+
+    async def _estimate_count(self, conditions: List[Any]) -> Tuple[int, bool]:
+        # Без фильтров - оценка планировщика из pg_class, с фильтрами - точный count, закэшированный в Redis
+        if not conditions:
+            result = await self.session.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'dog'::regclass")
+            )
+            estimate = result.scalar_one()
+            # reltuples = -1, пока таблица ни разу не анализировалась
+            if estimate >= 0:
+                return estimate, True
+
+        query = select(func.count(Dog.id))
+        if conditions:
+            query = query.where(and_(*conditions))
+        compiled = query.compile()
+        signature = str(compiled) + json.dumps(compiled.params, default=str, sort_keys=True)
+        # Версия списка увеличивается при записи собак и после обхода источника, старые счетчики истекают по TTL
+        list_version, = await cache.versions("dogs", ["list"])
+        cache_key = f"dogs:count:{list_version}:{hashlib.sha1(signature.encode()).hexdigest()}"
+
+        total = await cache.get(cache_key)
+        if total is None:
+            total = (await self.session.execute(query)).scalar_one()
+            await cache.set(cache_key, total, ttl=COUNT_CACHE_TTL)
+        return total, True
+
     async def get_pedigree(self, dog_id: int, generations: int) -> Dict:
         async def get_ancestors(dog: Dog, depth: int) -> Optional[Dict]:
             if depth == 0 or not dog:
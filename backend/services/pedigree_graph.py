@@ -0,0 +1,385 @@
+import asyncio
+import json
+import logging
+import uuid as uuid_lib
+from datetime import datetime
+from typing import Optional, Dict, List, Iterable, Tuple
+
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from core.database import async_session
+from models import Dog
+from utils.background import spawn
+from utils.cache import cache
+from utils.inbreeding import meuwissen_luo
+
+logger = logging.getLogger(__name__)
+
+CHANGES_CHANNEL = "pedigree:changes"
+NO_PARENT = -1
+NO_DATE = np.datetime64("NaT", "D")
+
+# Строка изменения: (id, sire_id, dam_id, sex, date_of_birth)
+ChangeRow = Tuple[int, Optional[int], Optional[int], Optional[int], Optional[datetime]]
+
+class PedigreeGraph:
+    # Компактный индекс родословной в памяти: колонки NumPy по плотному индексу собаки
+    def __init__(self):
+        self.worker_id = uuid_lib.uuid4().hex
+        self.loaded = False
+        self.size = 0
+        self.ids = np.empty(0, dtype=np.int32)
+        self.sire = np.empty(0, dtype=np.int32)
+        self.dam = np.empty(0, dtype=np.int32)
+        self.sex = np.empty(0, dtype=np.int8)
+        self.date_of_birth = np.empty(0, dtype="datetime64[D]")
+        # dog.id -> плотный индекс (-1 если собаки нет в графе)
+        self.positions = np.empty(0, dtype=np.int32)
+        self._children_ptr: Optional[np.ndarray] = None
+        self._children: Optional[np.ndarray] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _grow(self, capacity: int):
+        if capacity <= len(self.ids):
+            return
+        capacity = max(capacity, len(self.ids) * 2, 1024)
+        extra = capacity - len(self.ids)
+        self.ids = np.concatenate([self.ids, np.zeros(extra, dtype=np.int32)])
+        self.sire = np.concatenate([self.sire, np.full(extra, NO_PARENT, dtype=np.int32)])
+        self.dam = np.concatenate([self.dam, np.full(extra, NO_PARENT, dtype=np.int32)])
+        self.sex = np.concatenate([self.sex, np.zeros(extra, dtype=np.int8)])
+        self.date_of_birth = np.concatenate([self.date_of_birth, np.full(extra, NO_DATE)])
+
+    def _grow_positions(self, max_id: int):
+        if max_id < len(self.positions):
+            return
+        capacity = max(max_id + 1, len(self.positions) * 2, 1024)
+        extra = capacity - len(self.positions)
+        self.positions = np.concatenate([self.positions, np.full(extra, NO_PARENT, dtype=np.int32)])
+
+    def position(self, dog_id: Optional[int]) -> int:
+        if dog_id is None or dog_id < 0 or dog_id >= len(self.positions):
+            return NO_PARENT
+        return int(self.positions[dog_id])
+
+    def _ensure_node(self, dog_id: int) -> int:
+        pos = self.position(dog_id)
+        if pos != NO_PARENT:
+            return pos
+        self._grow(self.size + 1)
+        self._grow_positions(dog_id)
+        pos = self.size
+        self.ids[pos] = dog_id
+        self.positions[dog_id] = pos
+        self.size += 1
+        return pos
+
+    def load_rows(self, rows: List[ChangeRow]):
+        # Полная перезагрузка колонок одним проходом
+        count = len(rows)
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int32, count=count)
+        self.size = 0
+        self.ids = np.empty(0, dtype=np.int32)
+        self.sire = np.empty(0, dtype=np.int32)
+        self.dam = np.empty(0, dtype=np.int32)
+        self.sex = np.empty(0, dtype=np.int8)
+        self.date_of_birth = np.empty(0, dtype="datetime64[D]")
+        self.positions = np.empty(0, dtype=np.int32)
+        self._grow(count)
+        self._grow_positions(int(ids.max()) if count else 0)
+
+        self.ids[:count] = ids
+        self.positions[ids] = np.arange(count, dtype=np.int32)
+        self.size = count
+
+        sire_ids = np.fromiter((row[1] if row[1] is not None else -1 for row in rows), dtype=np.int64, count=count)
+        dam_ids = np.fromiter((row[2] if row[2] is not None else -1 for row in rows), dtype=np.int64, count=count)
+        self.sire[:count] = self._lookup(sire_ids)
+        self.dam[:count] = self._lookup(dam_ids)
+        self.sex[:count] = np.fromiter((row[3] or 0 for row in rows), dtype=np.int8, count=count)
+        self.date_of_birth[:count] = np.array(
+            [np.datetime64(row[4].date()) if row[4] else NO_DATE for row in rows],
+            dtype="datetime64[D]"
+        )
+        self._invalidate_children()
+        self.loaded = True
+
+    def _lookup(self, dog_ids: np.ndarray) -> np.ndarray:
+        result = np.full(len(dog_ids), NO_PARENT, dtype=np.int32)
+        valid = (dog_ids >= 0) & (dog_ids < len(self.positions))
+        result[valid] = self.positions[dog_ids[valid]]
+        return result
+
+    def upsert(self, dog_id: int, sire_id: Optional[int], dam_id: Optional[int], sex: Optional[int] = None, date_of_birth: Optional[datetime] = None):
+        pos = self._ensure_node(dog_id)
+        sire_pos = self._ensure_node(sire_id) if sire_id is not None else NO_PARENT
+        dam_pos = self._ensure_node(dam_id) if dam_id is not None else NO_PARENT
+
+        if self.sire[pos] != sire_pos or self.dam[pos] != dam_pos:
+            self._invalidate_children()
+        self.sire[pos] = sire_pos
+        self.dam[pos] = dam_pos
+        if sex is not None:
+            self.sex[pos] = sex
+        if date_of_birth is not None:
+            self.date_of_birth[pos] = np.datetime64(date_of_birth.date())
+
+    def remove(self, dog_id: int):
+        # Плотные индексы не сдвигаем: узел отвязывается от детей и исчезает из positions
+        pos = self.position(dog_id)
+        if pos == NO_PARENT:
+            return
+        n = self.size
+        self.sire[:n][self.sire[:n] == pos] = NO_PARENT
+        self.dam[:n][self.dam[:n] == pos] = NO_PARENT
+        self.sire[pos] = NO_PARENT
+        self.dam[pos] = NO_PARENT
+        self.positions[dog_id] = NO_PARENT
+        self._invalidate_children()
+
+    def apply_changes(self, rows: Iterable[ChangeRow], deleted: Iterable[int] = ()):
+        for dog_id, sire_id, dam_id, sex, date_of_birth in rows:
+            self.upsert(dog_id, sire_id, dam_id, sex, date_of_birth)
+        for dog_id in deleted:
+            self.remove(dog_id)
+
+    def _invalidate_children(self):
+        self._children_ptr = None
+        self._children = None
+
+    def _build_children(self):
+        # CSR-список детей: дети узла i лежат в children[ptr[i]:ptr[i + 1]]
+        n = self.size
+        child = np.concatenate([np.arange(n, dtype=np.int32), np.arange(n, dtype=np.int32)])
+        parent = np.concatenate([self.sire[:n], self.dam[:n]])
+        mask = parent != NO_PARENT
+        child, parent = child[mask], parent[mask]
+        order = np.argsort(parent, kind="stable")
+        self._children = child[order]
+        self._children_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(parent, minlength=n), out=self._children_ptr[1:])
+
+    def parents(self, dog_id: int) -> Tuple[Optional[int], Optional[int]]:
+        pos = self.position(dog_id)
+        if pos == NO_PARENT:
+            return None, None
+        sire_pos, dam_pos = self.sire[pos], self.dam[pos]
+        return (
+            int(self.ids[sire_pos]) if sire_pos != NO_PARENT else None,
+            int(self.ids[dam_pos]) if dam_pos != NO_PARENT else None,
+        )
+
+    def ancestor_positions(self, positions: np.ndarray, generations: Optional[int] = None) -> Dict[int, int]:
+        # Обход по поколениям: {плотный индекс: минимальная глубина}
+        depths = {int(pos): 0 for pos in positions}
+        frontier = np.unique(positions.astype(np.int32))
+        depth = 0
+        while len(frontier) and (generations is None or depth < generations - 1):
+            depth += 1
+            parents = np.concatenate([self.sire[frontier], self.dam[frontier]])
+            parents = np.unique(parents[parents != NO_PARENT])
+            frontier = np.array([pos for pos in parents.tolist() if pos not in depths], dtype=np.int32)
+            for pos in frontier.tolist():
+                depths[pos] = depth
+        return depths
+
+    def ancestors(self, dog_id: int, generations: Optional[int] = None) -> Dict[int, int]:
+        pos = self.position(dog_id)
+        if pos == NO_PARENT:
+            return {}
+        depths = self.ancestor_positions(np.array([pos], dtype=np.int32), generations)
+        return {int(self.ids[p]): depth for p, depth in depths.items()}
+
+    def descendant_positions(self, positions: np.ndarray, generations: Optional[int] = None) -> Dict[int, int]:
+        if self._children is None:
+            self._build_children()
+        depths = {int(pos): 0 for pos in positions}
+        frontier = np.unique(positions.astype(np.int32))
+        depth = 0
+        while len(frontier) and (generations is None or depth < generations - 1):
+            depth += 1
+            starts, ends = self._children_ptr[frontier], self._children_ptr[frontier + 1]
+            if not (ends - starts).any():
+                break
+            children = np.unique(np.concatenate([self._children[s:e] for s, e in zip(starts, ends)]))
+            frontier = np.array([pos for pos in children.tolist() if pos not in depths], dtype=np.int32)
+            for pos in frontier.tolist():
+                depths[pos] = depth
+        return depths
+
+    def descendants(self, dog_id: int, generations: Optional[int] = None) -> Dict[int, int]:
+        pos = self.position(dog_id)
+        if pos == NO_PARENT:
+            return {}
+        depths = self.descendant_positions(np.array([pos], dtype=np.int32), generations)
+        return {int(self.ids[p]): depth for p, depth in depths.items()}
+
+    def inbreeding(self, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        # F для всей популяции по плотному индексу, либо только для positions
+        if positions is None:
+            return meuwissen_luo(self.sire[:self.size], self.dam[:self.size])
+
+        # Для подмножества достаточно замкнутой по предкам подродословной
+        closure = np.fromiter(self.ancestor_positions(positions).keys(), dtype=np.int64)
+        local = np.full(self.size, NO_PARENT, dtype=np.int64)
+        local[closure] = np.arange(len(closure))
+        sire, dam = self.sire[closure], self.dam[closure]
+        f = meuwissen_luo(
+            np.where(sire != NO_PARENT, local[sire], NO_PARENT),
+            np.where(dam != NO_PARENT, local[dam], NO_PARENT)
+        )
+        return f[local[positions]]
+
+    def snapshot(self) -> "PedigreeGraph":
+        # Копия колонок для расчетов в отдельном потоке: граф процесса тем временем меняется по pub/sub
+        graph = PedigreeGraph()
+        n = self.size
+        graph.size = n
+        graph.ids = self.ids[:n].copy()
+        graph.sire = self.sire[:n].copy()
+        graph.dam = self.dam[:n].copy()
+        graph.sex = self.sex[:n].copy()
+        graph.date_of_birth = self.date_of_birth[:n].copy()
+        graph.positions = self.positions.copy()
+        graph.loaded = self.loaded
+        return graph
+
+    def memory_usage(self) -> int:
+        arrays = [self.ids, self.sire, self.dam, self.sex, self.date_of_birth, self.positions]
+        if self._children is not None:
+            arrays += [self._children, self._children_ptr]
+        return sum(array.nbytes for array in arrays)
+
+    async def load(self):
+        async with async_session() as session:
+            result = await session.execute(
+                select(Dog.id, Dog.sire_id, Dog.dam_id, Dog.sex, Dog.date_of_birth)
+            )
+            rows = [tuple(row) for row in result.all()]
+        self.load_rows(rows)
+        logger.info(f"Pedigree graph loaded: {self.size} dogs, {self.memory_usage() / 1024 / 1024:.1f} MB")
+
+    async def publish(self, rows: List[ChangeRow], deleted: List[int]):
+        payload = {
+            "worker_id": self.worker_id,
+            "rows": [
+                [dog_id, sire_id, dam_id, sex, date_of_birth.isoformat() if date_of_birth else None]
+                for dog_id, sire_id, dam_id, sex, date_of_birth in rows
+            ],
+            "deleted": deleted
+        }
+        try:
+            await cache.redis.publish(CHANGES_CHANNEL, json.dumps(payload))
+        except Exception as e:
+            logger.warning(f"Could not publish pedigree changes: {str(e)}")
+
+    async def _subscribe_and_load(self):
+        # Сначала подписка, потом снимок: изменения, закоммиченные во время загрузки,
+        # накопятся в подписке и применятся поверх снимка (upsert и remove идемпотентны)
+        pubsub = cache.redis.pubsub()
+        try:
+            await pubsub.subscribe(CHANGES_CHANNEL)
+            await self.load()
+        except BaseException:
+            await pubsub.aclose()
+            raise
+        return pubsub
+
+    async def _consume(self, pubsub):
+        async for message in pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            payload = json.loads(message["data"])
+            if payload.get("worker_id") == self.worker_id:
+                continue
+            self.apply_changes(
+                (
+                    (dog_id, sire_id, dam_id, sex, datetime.fromisoformat(dob) if dob else None)
+                    for dog_id, sire_id, dam_id, sex, dob in payload["rows"]
+                ),
+                payload.get("deleted", ())
+            )
+
+    async def _run(self, pubsub):
+        # Подписка на изменения из других воркеров. Пока подписки нет, граф может отставать,
+        # поэтому loaded сбрасывается (запросы уходят в рекурсивный CTE), а после переподключения граф перечитывается
+        delay = 1
+        while True:
+            try:
+                if pubsub is None:
+                    pubsub = await self._subscribe_and_load()
+                delay = 1
+                await self._consume(pubsub)
+                logger.warning("Pedigree changes subscription closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Pedigree changes subscription failed: {str(e)}")
+            finally:
+                self.loaded = False
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+                    pubsub = None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    async def start(self):
+        pubsub = None
+        try:
+            pubsub = await self._subscribe_and_load()
+        except Exception as e:
+            logger.warning(f"Pedigree graph loading failed, retrying in background: {str(e)}")
+        self._task = asyncio.create_task(self._run(pubsub))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+pedigree_graph = PedigreeGraph()
+
+# Лента изменений: любые записи Dog через ORM (парсеры, merge_dog_data) попадают в граф после коммита
+def _track_dog_change(mapper, connection, dog: Dog):
+    session = Session.object_session(dog)
+    if session is None:
+        return
+    session.info.setdefault("pedigree_changes", {})[dog.id] = (
+        dog.id, dog.sire_id, dog.dam_id, dog.sex, dog.date_of_birth
+    )
+
+def _track_dog_delete(mapper, connection, dog: Dog):
+    session = Session.object_session(dog)
+    if session is None:
+        return
+    session.info.get("pedigree_changes", {}).pop(dog.id, None)
+    session.info.setdefault("pedigree_deletes", set()).add(dog.id)
+
+@event.listens_for(Session, "after_commit")
+def _apply_pedigree_changes(session: Session):
+    changes = session.info.pop("pedigree_changes", None)
+    deletes = session.info.pop("pedigree_deletes", None)
+    if not changes and not deletes:
+        return
+    rows = list((changes or {}).values())
+    deleted = sorted(deletes or ())
+    if pedigree_graph.loaded:
+        pedigree_graph.apply_changes(rows, deleted)
+    spawn(pedigree_graph.publish(rows, deleted))
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pedigree_changes(session: Session):
+    session.info.pop("pedigree_changes", None)
+    session.info.pop("pedigree_deletes", None)
+
+event.listen(Dog, "after_insert", _track_dog_change)
+event.listen(Dog, "after_update", _track_dog_change)
+event.listen(Dog, "after_delete", _track_dog_delete)
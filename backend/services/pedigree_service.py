@@ -0,0 +1,140 @@
+import logging
+from typing import Optional, Dict, Any, List, Tuple
+from sqlalchemy import literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, noload, selectinload
+
+from models import Breeder, Dog, Owner, Title
+from services.pedigree_graph import pedigree_graph
+from utils.serialization import serializer
+
+logger = logging.getLogger(__name__)
+
+# Узлы дерева - колонки собаки (как model_dump), собранные заранее подготовленными сериализаторами
+dog_fields = serializer(Dog)
+title_fields = serializer(Title)
+owner_fields = serializer(Owner)
+breeder_fields = serializer(Breeder)
+
+class PedigreeService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    def _ancestors_cte(self, root_condition, generations: int):
+        # Рекурсивный CTE: корень на глубине 0, предки до generations - 1 включительно
+        base = (
+            select(Dog.id, Dog.sire_id, Dog.dam_id, literal(0).label("depth"))
+            .where(root_condition)
+            .cte("pedigree", recursive=True)
+        )
+        parent = aliased(Dog)
+        recursive = (
+            select(parent.id, parent.sire_id, parent.dam_id, (base.c.depth + 1).label("depth"))
+            .join(base, or_(parent.id == base.c.sire_id, parent.id == base.c.dam_id))
+            .where(base.c.depth < generations - 1)
+        )
+        return base.union_all(recursive)
+
+    def _ancestor_ids(self, root_condition, generations: int, dog_id: Optional[int] = None):
+        # Если граф в памяти загружен, набор предков берем из него без обращения к БД
+        if dog_id is not None and pedigree_graph.loaded and pedigree_graph.position(dog_id) != -1:
+            return list(pedigree_graph.ancestors(dog_id, generations))
+        cte = self._ancestors_cte(root_condition, generations)
+        return select(cte.c.id).distinct()
+
+    async def load_ancestors(self, root_condition, generations: int, detailed: bool = False, dog_id: Optional[int] = None) -> Dict[int, Dog]:
+        ids = self._ancestor_ids(root_condition, generations, dog_id)
+
+        if detailed:
+            # Одним батчем на каждую связь, без каскадной загрузки обратных связей
+            options = (
+                selectinload(Dog.titles).noload("*"),
+                selectinload(Dog.owners).noload("*"),
+                selectinload(Dog.breeders).noload("*"),
+                noload("*"),
+            )
+        else:
+            options = (noload("*"),)
+
+        result = await self.session.execute(
+            select(Dog).where(Dog.id.in_(ids)).options(*options)
+        )
+        return {dog.id: dog for dog in result.scalars().all()}
+
+    async def load_parent_links(self, dog_id: int, generations: int) -> Dict[int, Tuple[Optional[int], Optional[int], int]]:
+        # {dog_id: (sire_id, dam_id, глубина)} для всех предков до generations поколений
+        if pedigree_graph.loaded and pedigree_graph.position(dog_id) != -1:
+            depths = pedigree_graph.ancestors(dog_id, generations)
+            return {
+                ancestor_id: (*pedigree_graph.parents(ancestor_id), depth)
+                for ancestor_id, depth in depths.items()
+            }
+
+        cte = self._ancestors_cte(Dog.id == dog_id, generations)
+        result = await self.session.execute(select(cte.c.id, cte.c.sire_id, cte.c.dam_id, cte.c.depth))
+        links = {}
+        for ancestor_id, sire_id, dam_id, depth in result.all():
+            if ancestor_id not in links or depth < links[ancestor_id][2]:
+                links[ancestor_id] = (sire_id, dam_id, depth)
+        return links
+
+    def build_tree(self, dogs: Dict[int, Dog], dog_id: Optional[int], depth: int, detailed: bool = False) -> Optional[Dict[str, Any]]:
+        if depth == 0 or dog_id is None:
+            return None
+
+        dog = dogs.get(dog_id)
+        if not dog:
+            return None
+
+        node = dog_fields(dog)
+        if detailed:
+            node["titles"] = [title_fields(title) for title in dog.titles]
+            node["owners"] = [owner_fields(owner) for owner in dog.owners]
+            node["breeders"] = [breeder_fields(breeder) for breeder in dog.breeders]
+
+        node["dam"] = self.build_tree(dogs, dog.dam_id, depth - 1, detailed)
+        node["sire"] = self.build_tree(dogs, dog.sire_id, depth - 1, detailed)
+        return node
+
+    def flatten_ancestors(self, dogs: Dict[int, Dog], dog_id: int, generations: int) -> List[Dict[str, Any]]:
+        ancestors = []
+
+        def collect(current_id: Optional[int], depth: int, position: str = ""):
+            dog = dogs.get(current_id) if current_id is not None else None
+            if depth == generations or not dog:
+                return
+
+            ancestors.append({
+                "id": dog.id,
+                "uuid": dog.uuid,
+                "registered_name": dog.registered_name,
+                "call_name": dog.call_name,
+                "sex": dog.sex,
+                "date_of_birth": dog.date_of_birth,
+                "generation": depth,
+                "position": position,
+                "source": dog.source
+            })
+
+            collect(dog.dam_id, depth + 1, f"{position}.dam" if position else "dam")
+            collect(dog.sire_id, depth + 1, f"{position}.sire" if position else "sire")
+
+        collect(dog_id, 0)
+        return ancestors
+
+    async def get_pedigree(self, dog_id: int, generations: int, detailed: bool = False) -> Optional[Dict[str, Any]]:
+        dogs = await self.load_ancestors(Dog.id == dog_id, generations, detailed, dog_id=dog_id)
+        return self.build_tree(dogs, dog_id, generations, detailed)
+
+    async def get_pedigree_by_uuid(self, uuid: str, generations: int) -> Optional[Dict[str, Any]]:
+        dogs = await self.load_ancestors(Dog.uuid == uuid, generations)
+        root = next((dog for dog in dogs.values() if dog.uuid == uuid), None)
+        if not root:
+            return None
+        return self.build_tree(dogs, root.id, generations)
+
+    async def get_ancestors(self, dog_id: int, generations: int) -> Optional[List[Dict[str, Any]]]:
+        dogs = await self.load_ancestors(Dog.id == dog_id, generations, dog_id=dog_id)
+        if dog_id not in dogs:
+            return None
+        return self.flatten_ancestors(dogs, dog_id, generations)
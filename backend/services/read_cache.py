@@ -0,0 +1,261 @@
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+from sqlalchemy import event, inspect, or_, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+
+from models import (
+    Breeder, Dog, DogBreederLink, DogOwnerLink, DogReadSimple, DogSiblingLink, Litter, MedicalRecord, MergeLog,
+    Owner, Title
+)
+from services.pedigree_graph import pedigree_graph
+from utils.background import spawn
+from utils.cache import cache
+from utils.serialization import dumps
+from utils.single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+# Кэш ответов чтения собак и родословных в Redis.
+# Ключ содержит хэш версий всех собак, из которых собран ответ: запись собаки увеличивает
+# ее версию, и все ответы с ее участием перестают находиться без удаления ключей и SCAN
+DOG_TTL = 3600
+PEDIGREE_TTL = 6 * 3600
+# Общая версия для массовых изменений (пересчет COI всей популяции)
+ALL_DOGS = "all"
+
+async def dogs_token(dog_ids: Iterable[int]) -> str:
+    ids = [ALL_DOGS] + sorted(set(dog_ids))
+    versions = await cache.versions("dog", ids)
+    raw = ",".join(f"{dog_id}:{version}" for dog_id, version in zip(ids, versions))
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+def dog_dependencies(dog_id: int) -> List[int]:
+    # Карточка собаки показывает и родителей
+    ids = [dog_id]
+    pos = pedigree_graph.position(dog_id) if pedigree_graph.loaded else -1
+    if pos != -1:
+        for parent in (pedigree_graph.sire[pos], pedigree_graph.dam[pos]):
+            if parent != -1:
+                ids.append(int(pedigree_graph.ids[parent]))
+    return ids
+
+def pedigree_dependencies(dog_id: int, generations: int) -> Optional[List[int]]:
+    # Все предки в пределах запрошенных поколений; без графа состав родословной неизвестен - не кэшируем
+    if not pedigree_graph.loaded or pedigree_graph.position(dog_id) == -1:
+        return None
+    return list(pedigree_graph.ancestors(dog_id, generations + 1).keys())
+
+# Условные запросы: ETag строится из ключа с версиями всех собак ответа, поэтому проверка
+# If-None-Match не требует ни базы, ни сборки ответа. Где версий нет (Redis недоступен,
+# родословная вне графа), ETag - хэш самих байтов ответа
+def make_etag(key: str) -> str:
+    return f'"{hashlib.sha1(key.encode()).hexdigest()[:32]}"'
+
+def body_etag(data: bytes) -> str:
+    return f'"{hashlib.sha1(data).hexdigest()}"'
+
+def etag_matches(request: Optional[Request], etag: Optional[str]) -> bool:
+    if request is None or etag is None:
+        return False
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match сравнивается слабо: W/ не учитывается
+    return etag in {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+def not_modified(etag: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(status_code=304, headers={**(headers or {}), "ETag": etag})
+
+async def list_etag(request: Request) -> Optional[str]:
+    # Списки зависят от всех собак: общая версия списка увеличивается при любой записи собаки и ее дочерних строк
+    try:
+        list_version, = await cache.versions("dogs", ["list"])
+        all_version, = await cache.versions("dog", [ALL_DOGS])
+    except Exception as e:
+        logger.warning(f"Could not read list version: {str(e)}")
+        return None
+    query = urlencode(sorted(request.query_params.multi_items()))
+    return make_etag(f"{request.url.path}?{query}:{list_version}:{all_version}")
+
+def json_response(
+    data: bytes,
+    request: Optional[Request] = None,
+    headers: Optional[Dict[str, str]] = None,
+    etag: Optional[str] = None
+) -> Response:
+    etag = etag or body_etag(data)
+    if etag_matches(request, etag):
+        return not_modified(etag, headers)
+    return Response(content=data, media_type="application/json", headers={**(headers or {}), "ETag": etag})
+
+async def read_through(
+    key: Optional[str],
+    dependencies: Optional[List[int]],
+    loader: Callable[[], Awaitable[Any]],
+    ttl: int,
+    request: Optional[Request] = None
+) -> Optional[Response]:
+    # JSON ответа хранится готовыми байтами: попадание в кэш не трогает ни базу, ни сериализацию.
+    # loader выполняется общим для одновременных запросов и должен открывать свою сессию, а не брать сессию запроса.
+    # None от loader (нет собаки) не кэшируется. Недоступный Redis не ломает чтение
+    cache_key = None
+    etag = None
+    if key is not None and dependencies is not None:
+        try:
+            cache_key = f"{key}:{await dogs_token(dependencies)}"
+            etag = make_etag(cache_key)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            data = await cache.get_bytes(cache_key)
+            if data is not None:
+                return json_response(data, request, {"X-Cache": "HIT"}, etag)
+        except Exception as e:
+            logger.warning(f"Response cache read failed for {key}: {str(e)}")
+            cache_key = None
+            etag = None
+
+    async def load() -> Optional[bytes]:
+        value = await loader()
+        if value is None:
+            return None
+        data = dumps(value)
+        if cache_key is not None:
+            try:
+                await cache.set_bytes(cache_key, data, ttl)
+            except Exception as e:
+                logger.warning(f"Response cache write failed for {cache_key}: {str(e)}")
+        return data
+
+    # Одновременные промахи по одному ответу (после изменения версии или истечения TTL) считает один запрос
+    data = await single_flight.do(cache_key or key, load) if key is not None else await load()
+    if data is None:
+        return None
+    return json_response(data, request, {"X-Cache": "MISS"}, etag)
+
+async def bump_dogs(dog_ids: Iterable[int]):
+    try:
+        await cache.bump_versions("dog", dog_ids)
+        await cache.bump_versions("dogs", ["list"])
+    except Exception as e:
+        logger.warning(f"Could not bump dog cache versions: {str(e)}")
+
+def schedule_bump(dog_ids: Iterable[Any]):
+    spawn(bump_dogs(list(dog_ids)))
+
+# Любая запись Dog через ORM (парсеры, resolve_conflicts, undo_merge, заметки, удаление) после коммита
+# увеличивает версию собаки и версию списков. Пакетные записи без ORM кладут id в session.info["cache_dirty"] сами
+def _mark_dirty(session: Optional[Session], dog_ids: Iterable[Optional[int]]):
+    if session is not None:
+        session.info.setdefault("cache_dirty", set()).update(dog_id for dog_id in dog_ids if dog_id is not None)
+
+def _sibling_ids(connection, dog_id: int) -> List[int]:
+    rows = connection.execute(
+        select(DogSiblingLink.dog_id, DogSiblingLink.sibling_id)
+        .where(or_(DogSiblingLink.dog_id == dog_id, DogSiblingLink.sibling_id == dog_id))
+    )
+    return [other for row in rows for other in row if other != dog_id]
+
+def _track_dog_insert(mapper, connection, dog: Dog):
+    _mark_dirty(Session.object_session(dog), [dog.id])
+
+def _track_dog_update(mapper, connection, dog: Dog):
+    ids = [dog.id]
+    state = inspect(dog)
+    # Собака видна в карточках братьев/сестер (DogReadSimple): при смене этих полей устарели и они
+    if any(state.attrs[name].history.has_changes() for name in SIBLING_FIELDS):
+        ids.extend(_sibling_ids(connection, dog.id))
+    added, _, deleted = state.attrs.siblings.history
+    ids.extend(sibling.id for sibling in list(added or ()) + list(deleted or ()))
+    _mark_dirty(Session.object_session(dog), ids)
+
+def _track_dog_delete(mapper, connection, dog: Dog):
+    _mark_dirty(Session.object_session(dog), [dog.id, *_sibling_ids(connection, dog.id)])
+
+# Дочерние записи из DogRead (титулы, медзаписи, логи слияния, связи) устаревают карточку своей собаки,
+# в том числе прежней, если запись перенесли на другую собаку
+def _track_child(*columns: str):
+    def track(mapper, connection, target):
+        state = inspect(target)
+        ids = [getattr(target, column) for column in columns]
+        for column in columns:
+            ids.extend(state.attrs[column].history.deleted or ())
+        _mark_dirty(Session.object_session(target), ids)
+    return track
+
+def _track_litter(mapper, connection, litter: Litter):
+    ids = [litter.dam_id, litter.sire_id, litter.mating_partner_id]
+    ids.extend(connection.execute(select(Dog.id).where(Dog.birth_litter_id == litter.id)).scalars())
+    _mark_dirty(Session.object_session(litter), ids)
+
+def _track_person(link_model):
+    # Имя владельца/заводчика показывается у всех его собак
+    def track(mapper, connection, person):
+        dog_ids = connection.execute(
+            select(link_model.dog_id).where(getattr(link_model, PERSON_COLUMNS[link_model]) == person.id)
+        ).scalars()
+        _mark_dirty(Session.object_session(person), dog_ids)
+    return track
+
+PERSON_COLUMNS = {DogOwnerLink: "owner_id", DogBreederLink: "breeder_id"}
+SIBLING_FIELDS = list(DogReadSimple.model_fields)
+# DELETE/UPDATE выражением (delete(DogOwnerLink).where(DogOwnerLink.dog_id == ...)) события маппера не вызывают
+BULK_TRACKED = {DogOwnerLink, DogBreederLink, DogSiblingLink, Title, MedicalRecord, MergeLog}
+
+def _criteria_dog_ids(statement) -> Optional[List[int]]:
+    # id собак из условий вида dog_id = :x / dog_id IN (...); None - если затронутые собаки неизвестны
+    ids = []
+    for node in visitors.iterate(statement.whereclause) if statement.whereclause is not None else ():
+        if not isinstance(node, BinaryExpression) or not isinstance(node.right, BindParameter):
+            continue
+        if getattr(node.left, "key", None) not in ("dog_id", "sibling_id"):
+            continue
+        value = node.right.effective_value
+        ids.extend(value if isinstance(value, (list, tuple, set)) else [value])
+    return ids or None
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_write(orm_execute_state):
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in BULK_TRACKED:
+        return
+    dog_ids = _criteria_dog_ids(orm_execute_state.statement)
+    _mark_dirty(orm_execute_state.session, dog_ids if dog_ids is not None else [ALL_DOGS])
+
+@event.listens_for(Session, "after_commit")
+def _flush_cache_dirty(session: Session):
+    dirty = session.info.pop("cache_dirty", None)
+    if dirty:
+        schedule_bump(sorted(dirty, key=str))
+
+@event.listens_for(Session, "after_rollback")
+def _discard_cache_dirty(session: Session):
+    session.info.pop("cache_dirty", None)
+
+event.listen(Dog, "after_insert", _track_dog_insert)
+event.listen(Dog, "after_update", _track_dog_update)
+event.listen(Dog, "after_delete", _track_dog_delete)
+for model, columns in (
+    (Title, ("dog_id",)),
+    (MedicalRecord, ("dog_id",)),
+    (MergeLog, ("dog_id",)),
+    (DogOwnerLink, ("dog_id",)),
+    (DogBreederLink, ("dog_id",)),
+    (DogSiblingLink, ("dog_id", "sibling_id")),
+):
+    for name in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, name, _track_child(*columns))
+event.listen(Litter, "after_insert", _track_litter)
+event.listen(Litter, "after_update", _track_litter)
+event.listen(Litter, "after_delete", _track_litter)
+for person_model, link_model in ((Owner, DogOwnerLink), (Breeder, DogBreederLink)):
+    event.listen(person_model, "after_update", _track_person(link_model))
@@ -0,0 +1,239 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database import session_scope
+from models import ScrapeJob, ScrapeJobPage
+from parsers.breedarchive import process_entries_page
+from parsers.breedbase import process_breedbase_page
+from parsers.huskypedigree import process_huskypedigree_page
+
+logger = logging.getLogger(__name__)
+
+PageRunner = Callable[[int], Awaitable[Dict[str, Any]]]
+
+# Источник: (обработчик одной страницы списка, первая страница, страниц в полном обходе)
+SOURCES: Dict[str, tuple] = {
+    "breedarchive": (process_entries_page, 0, 4000),  # 25 собак на странице, до 100k
+    "breedbase": (process_breedbase_page, 0, 1000),  # 50 собак на странице, до 50k
+    "huskypedigree": (process_huskypedigree_page, 1, 60),  # 50 собак на странице, ~2.6k
+}
+# Сколько раз повторяем упавшую страницу, прежде чем оставить ее в ошибках
+MAX_ATTEMPTS = 3
+# Запущенный обход без чекпоинтов дольше этого считается упавшим и может быть продолжен
+HEARTBEAT_TIMEOUT = timedelta(minutes=30)
+
+class ScrapeJobService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get(self, job_id: int) -> Optional[ScrapeJob]:
+        return await self.session.get(ScrapeJob, job_id)
+
+    async def list(self, source: Optional[str] = None, limit: int = 20) -> List[ScrapeJob]:
+        query = select(ScrapeJob).order_by(ScrapeJob.id.desc()).limit(limit)
+        if source:
+            query = query.where(ScrapeJob.source == source)
+        result = await self.session.execute(query)
+        return result.scalars().all()
+
+    async def status(self, job_id: int) -> Optional[Dict[str, Any]]:
+        job = await self.get(job_id)
+        if not job:
+            return None
+        result = await self.session.execute(
+            select(ScrapeJobPage.page, ScrapeJobPage.attempts, ScrapeJobPage.error)
+            .where(ScrapeJobPage.job_id == job_id, ScrapeJobPage.status == "failed")
+            .order_by(ScrapeJobPage.page)
+        )
+        return {
+            **job.model_dump(),
+            "progress": round(job.pages_done / job.max_pages, 3) if job.max_pages else None,
+            "failed_pages": [
+                {"page": page, "attempts": attempts, "error": error}
+                for page, attempts, error in result.all()
+            ],
+        }
+
+    async def start(self, source: str, max_pages: Optional[int] = None) -> ScrapeJob:
+        # Продолжаем последний незавершенный обход источника или начинаем новый.
+        # Обход, который еще пишет чекпоинты, второй раз не запускается.
+        if source not in SOURCES:
+            raise ValueError(f"Unknown scrape source: {source}")
+        _, first_page, default_pages = SOURCES[source]
+
+        result = await self.session.execute(
+            select(ScrapeJob)
+            .where(ScrapeJob.source == source, ScrapeJob.status != "completed")
+            .order_by(ScrapeJob.id.desc())
+            .limit(1)
+            .with_for_update()
+        )
+        job = result.scalars().first()
+
+        if job and job.status == "running" and datetime.utcnow() - job.updated_at < HEARTBEAT_TIMEOUT:
+            raise RuntimeError(f"Scrape job {job.id} for {source} is already running")
+
+        if job is None:
+            job = ScrapeJob(
+                source=source,
+                start_page=first_page,
+                cursor=first_page,
+                max_pages=max_pages or default_pages
+            )
+            self.session.add(job)
+        elif job.status == "running":
+            logger.warning(f"Scrape job {job.id} for {source} stopped sending checkpoints, resuming from page {job.cursor}")
+
+        job.status = "running"
+        job.updated_at = datetime.utcnow()
+        await self.session.commit()
+        return job
+
+async def _checkpoint(job_id: int, page: int, result: Optional[Dict[str, Any]], error: Optional[str], advance: bool):
+    # Результат страницы и курсор фиксируются одной транзакцией: после падения обход продолжается со следующей страницы
+    async with session_scope() as session:
+        job = await session.get(ScrapeJob, job_id, with_for_update=True)
+        existing = (await session.execute(
+            select(ScrapeJobPage).where(ScrapeJobPage.job_id == job_id, ScrapeJobPage.page == page)
+        )).scalars().first()
+
+        if existing is None:
+            existing = ScrapeJobPage(job_id=job_id, page=page, status="failed", attempts=0)
+            session.add(existing)
+        elif existing.status == "failed":
+            job.pages_failed -= 1
+
+        existing.attempts += 1
+        existing.updated_at = datetime.utcnow()
+        if error is None:
+            existing.status = "done"
+            existing.dog_ids = result.get("parsed_dog_ids", [])
+            existing.error = None
+            job.pages_done += 1
+            job.dogs_processed += len(existing.dog_ids)
+        else:
+            existing.status = "failed"
+            existing.error = error
+            job.pages_failed += 1
+            job.last_error = error
+
+        if advance:
+            job.cursor = page + 1
+        job.updated_at = datetime.utcnow()
+
+async def _run_page(runner: PageRunner, job_id: int, page: int, advance: bool) -> Optional[Dict[str, Any]]:
+    try:
+        result = await runner(page)
+    except Exception as e:
+        logger.error(f"Scrape job {job_id}: page {page} failed: {str(e)}")
+        await _checkpoint(job_id, page, None, str(e), advance)
+        return None
+    await _checkpoint(job_id, page, result, None, advance)
+    return result
+
+async def _mark_exhausted(job_id: int, page: int):
+    # Список кончился раньше ожидаемого: сокращаем обход, чтобы прогресс и продолжение не ждали пустых страниц
+    async with session_scope() as session:
+        job = await session.get(ScrapeJob, job_id, with_for_update=True)
+        job.max_pages = min(job.max_pages, page + 1 - job.start_page)
+
+async def _page_limit(job_id: int) -> int:
+    async with session_scope() as session:
+        job = await session.get(ScrapeJob, job_id)
+        return job.start_page + job.max_pages
+
+async def pending_pages(job_id: int) -> List[int]:
+    # Страницы от курсора до конца обхода, которые еще не обработаны успешно
+    async with session_scope() as session:
+        job = await session.get(ScrapeJob, job_id)
+        result = await session.execute(
+            select(ScrapeJobPage.page).where(ScrapeJobPage.job_id == job_id, ScrapeJobPage.status == "done")
+        )
+        done = set(result.scalars().all())
+    return [page for page in range(job.cursor, job.start_page + job.max_pages) if page not in done]
+
+async def run_pages(job_id: int, pages: List[int], advance: bool = False) -> Dict[str, Any]:
+    # Обработка части страниц обхода. Без advance курсор не двигается:
+    # так части одного обхода могут идти параллельно в разных воркерах
+    async with session_scope() as session:
+        job = await session.get(ScrapeJob, job_id)
+        runner = SOURCES[job.source][0]
+
+    stats = {"pages_done": 0, "pages_failed": 0, "dogs_processed": 0, "exhausted": False}
+    for page in pages:
+        # Другая часть обхода могла уже упереться в конец списка и сократить max_pages
+        if page >= await _page_limit(job_id):
+            stats["exhausted"] = True
+            continue
+        result = await _run_page(runner, job_id, page, advance)
+        if result is None:
+            stats["pages_failed"] += 1
+            continue
+        stats["pages_done"] += 1
+        stats["dogs_processed"] += len(result.get("parsed_dog_ids", []))
+        if not result.get("has_more", True):
+            logger.info(f"Scrape job {job_id}: no more pages after {page}")
+            await _mark_exhausted(job_id, page)
+            stats["exhausted"] = True
+            break
+    return stats
+
+async def retry_failed_pages(job_id: int) -> int:
+    # Упавшие страницы повторяются отдельно от основного прохода, не сдвигая курсор
+    async with session_scope() as session:
+        job = await session.get(ScrapeJob, job_id)
+        result = await session.execute(
+            select(ScrapeJobPage.page)
+            .where(
+                ScrapeJobPage.job_id == job_id,
+                ScrapeJobPage.status == "failed",
+                ScrapeJobPage.attempts < MAX_ATTEMPTS
+            )
+            .order_by(ScrapeJobPage.page)
+        )
+        pages = result.scalars().all()
+        runner = SOURCES[job.source][0]
+
+    recovered = 0
+    for page in pages:
+        if await _run_page(runner, job_id, page, advance=False) is not None:
+            recovered += 1
+    return recovered
+
+async def finish_scrape_job(job_id: int, status: str = "completed") -> Dict[str, Any]:
+    if status == "completed":
+        try:
+            recovered = await retry_failed_pages(job_id)
+            if recovered:
+                logger.info(f"Scrape job {job_id}: {recovered} failed pages recovered on retry")
+        except Exception as e:
+            logger.error(f"Scrape job {job_id}: retry of failed pages aborted: {str(e)}")
+            status = "failed"
+
+    async with session_scope() as session:
+        job = await session.get(ScrapeJob, job_id)
+        job.status = status
+        job.updated_at = datetime.utcnow()
+        if status == "completed":
+            job.finished_at = datetime.utcnow()
+        summary = job.model_dump()
+
+    logger.info(f"Scrape job {job_id} ({summary['source']}) {status}: {summary['pages_done']} pages, {summary['dogs_processed']} dogs, {summary['pages_failed']} failed pages")
+    return summary
+
+async def run_scrape_job(job_id: int) -> Dict[str, Any]:
+    # Последовательный обход в одном процессе: курсор двигается после каждой страницы
+    try:
+        pages = await pending_pages(job_id)
+        logger.info(f"Scrape job {job_id}: {len(pages)} pages to process")
+        await run_pages(job_id, pages, advance=True)
+        status = "completed"
+    except Exception as e:
+        # Ошибка самого обхода (например, БД недоступна): курсор остается на последнем чекпоинте
+        logger.error(f"Scrape job {job_id} aborted: {str(e)}")
+        status = "failed"
+    return await finish_scrape_job(job_id, status)
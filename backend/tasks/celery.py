@@ -1,7 +1,4 @@
-
-import asyncio
 from celery import Celery
-from tasks.update_data import update_all_sources
 from opentelemetry.instrumentation.celery import CeleryInstrumentor
 
 celery_app = Celery(
@@ -13,9 +10,11 @@ celery_app = Celery(
 CeleryInstrumentor().instrument()
 
 celery_app.conf.timezone = "Europe/Moscow"
+# Задачи парсинга долгие: воркер берет следующую, только закончив текущую,
+# а подтверждает после выполнения, чтобы упавший воркер не терял часть обхода
+celery_app.conf.worker_prefetch_multiplier = 1
+celery_app.conf.task_acks_late = True
 celery_app.conf.beat_schedule = {}  # будет заполнено ниже
 
-@celery_app.task
-def run_data_update():
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(update_all_sources())
+# Регистрация задач и расписания; импорт после создания celery_app, т.к. модули задач импортируют его
+from tasks import worker_loop, update_data  # noqa: E402,F401
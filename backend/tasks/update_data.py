@@ -1,9 +1,14 @@
-import asyncio
-from httpx import AsyncClient
-from parsers import breedarchive, breedbase, huskypedigre
-from core.database import get_async_session
+from typing import Any, Dict, List, Optional
+from celery import chord
+from core.config import settings
+from core.database import async_session
+from parsers.breedarchive import parse_breedarchive_browse_page
+from services.scrape_jobs import SOURCES, ScrapeJobService, pending_pages, run_pages, finish_scrape_job
+# Трекеры записей Dog для кэша ответов и COI должны работать и в воркере
+import services.coi_service  # noqa: F401
 from utils.cache import cache
 from .celery import celery_app
+from .worker_loop import run_async
 import requests
 import logging
 from celery.schedules import crontab
@@ -13,31 +18,72 @@ API_URL = "http://localhost:8000"
 
 tracer = trace.get_tracer(__name__)
 
-async def update_all_sources():
-    async with AsyncClient() as session:
-        await asyncio.gather(
-            update_breedarchive(session),
-            update_breedbase(session),
-            update_huskypedigre(session)
-        )
-    await cache.clear_pattern("dogs:*")
+async def _start_scrape_job(source: str, max_pages: Optional[int]):
+    async with async_session() as session:
+        job = await ScrapeJobService(session).start(source, max_pages)
+    return job.id, await pending_pages(job.id)
 
-async def update_breedarchive(session):
-    data = await breedarchive.fetch_breedarchive_data(session)
+async def _finish_scrape_job(job_id: int) -> Dict[str, Any]:
+    summary = await finish_scrape_job(job_id)
+    await cache.bump_versions("dogs", ["list"])
+    return summary
 
-async def update_breedbase(session):
-    data = await breedbase.fetch_breedbase_data(session)
+def update_all_sources():
+    for source in SOURCES:
+        scrape_source.delay(source)
 
-async def update_huskypedigre(session):
-    data = await huskypedigre.fetch_huskypedigre_data(session)
+@celery_app.task
+def run_data_update():
+    update_all_sources()
+
+@celery_app.task
+def scrape_source(source: str, max_pages: Optional[int] = None):
+    # Обход источника делится на части по SCRAPE_CHUNK_PAGES страниц, которые разбирают воркеры;
+    # итог собирает finish_scrape после выполнения всех частей
+    with tracer.start_as_current_span("celery_scrape_source"):
+        try:
+            job_id, pages = run_async(_start_scrape_job(source, max_pages))
+        except RuntimeError as e:
+            logging.info(str(e))
+            return None
+
+        if not pages:
+            return run_async(_finish_scrape_job(job_id))
+
+        size = settings.SCRAPE_CHUNK_PAGES
+        chunks = [pages[i:i + size] for i in range(0, len(pages), size)]
+        chord([scrape_pages_chunk.s(job_id, chunk) for chunk in chunks])(finish_scrape.s(job_id))
+        logging.info(f"Scrape job {job_id} ({source}): {len(pages)} pages in {len(chunks)} chunks scheduled")
+        return {"job_id": job_id, "pages": len(pages), "chunks": len(chunks)}
+
+@celery_app.task
+def scrape_pages_chunk(job_id: int, pages: List[int]):
+    with tracer.start_as_current_span("celery_scrape_pages_chunk"):
+        try:
+            return run_async(run_pages(job_id, pages))
+        except Exception as e:
+            # Ошибку части не пробрасываем: иначе chord не вызовет finish_scrape и обход не завершится
+            logging.error(f"Error in scrape_pages_chunk (job {job_id}, pages {pages[0]}-{pages[-1]}): {e}")
+            return {"pages_done": 0, "pages_failed": 0, "dogs_processed": 0, "exhausted": False, "error": str(e)}
+
+@celery_app.task
+def finish_scrape(results: List[Dict[str, Any]], job_id: int):
+    with tracer.start_as_current_span("celery_finish_scrape"):
+        totals = {
+            key: sum(result[key] for result in results)
+            for key in ("pages_done", "pages_failed", "dogs_processed")
+        }
+        totals["chunks_failed"] = sum(1 for result in results if "error" in result)
+        summary = run_async(_finish_scrape_job(job_id))
+        logging.info(f"Scrape job {job_id} finished: {totals}")
+        return {**summary, "run": totals}
 
 @celery_app.task
 def parse_breedarchive_recent_dogs():
     with tracer.start_as_current_span("celery_parse_breedarchive_recent_dogs"):
         try:
-            resp = requests.get(f"{API_URL}/api/breedarchive/dog/parseRecentPage")
-            resp.raise_for_status()
-            logging.info(f"Breedarchive recent parse: {resp.json()}")
+            result = run_async(parse_breedarchive_browse_page(1))
+            logging.info(f"Breedarchive recent parse: {result}")
         except Exception as e:
             logging.error(f"Error in parse_breedarchive_recent_dogs: {e}")
 
@@ -45,40 +91,32 @@ def parse_breedarchive_recent_dogs():
 def full_scrape_all_sites():
     with tracer.start_as_current_span("celery_full_scrape_all_sites"):
         try:
-            # breedarchive
-            count = 0
-            for page in range(0, 100_000, 100):
-                resp = requests.get(f"{API_URL}/api/breedarchive/dog/parseList", params={"page": page, "per_page": 100, "max_count": 100_000})
-                resp.raise_for_status()
-                data = resp.json()
-                count += data.get("processed_dogs_count", 0)
-                if count >= 100_000:
-                    break
-
-            # breedbase.ru
-            count = 0
-            for page in range(0, 50_000, 100):
-                resp = requests.get(f"{API_URL}/api/breedbase/parseList", params={"page": page, "per_page": 100, "max_count": 50_000})
-                resp.raise_for_status()
-                data = resp.json()
-                count += data.get("processed_dogs_count", 0)
-                if count >= 50_000:
-                    break
-
-            # husky.pedigre.net
-            count = 0
-            for page in range(1, 2600, 100):
-                resp = requests.get(f"{API_URL}/api/huskypedigree/parseList", params={"page": page, "per_page": 100, "max_count": 2600})
-                resp.raise_for_status()
-                data = resp.json()
-                count += data.get("processed_dogs_count", 0)
-                if count >= 2600:
-                    break
-
-            logging.info("Full scrape finished")
+            # Незавершенный обход источника продолжается с последних сохраненных страниц
+            update_all_sources()
+            logging.info("Full scrape scheduled")
         except Exception as e:
             logging.error(f"Error in full_scrape_all_sites: {e}")
 
+@celery_app.task
+def recalculate_population_coi():
+    with tracer.start_as_current_span("celery_recalculate_population_coi"):
+        try:
+            resp = requests.post(f"{API_URL}/api/v1/dogs/recalculate-coi", params={"background": False})
+            resp.raise_for_status()
+            logging.info(f"Population COI recalculation: {resp.json()}")
+        except Exception as e:
+            logging.error(f"Error in recalculate_population_coi: {e}")
+
+@celery_app.task
+def refresh_stale_coi():
+    with tracer.start_as_current_span("celery_refresh_stale_coi"):
+        try:
+            resp = requests.post(f"{API_URL}/api/v1/dogs/recalculate-coi/dirty")
+            resp.raise_for_status()
+            logging.info(f"Stale COI refresh: {resp.json()}")
+        except Exception as e:
+            logging.error(f"Error in refresh_stale_coi: {e}")
+
 celery_app.conf.beat_schedule = {
     'parse-breedarchive-recent-dogs-daily': {
         'task': 'tasks.update_data.parse_breedarchive_recent_dogs',
@@ -88,4 +126,12 @@ celery_app.conf.beat_schedule = {
         'task': 'tasks.update_data.full_scrape_all_sites',
         'schedule': crontab(hour=4, minute=0, day_of_week='sunday'),  # каждое воскресенье в 4:00
     },
+    'recalculate-population-coi-weekly': {
+        'task': 'tasks.update_data.recalculate_population_coi',
+        'schedule': crontab(hour=6, minute=0, day_of_week='monday'),  # каждый понедельник в 6:00
+    },
+    'refresh-stale-coi': {
+        'task': 'tasks.update_data.refresh_stale_coi',
+        'schedule': crontab(minute='*/30'),  # каждые 30 минут
+    },
 }
\ No newline at end of file
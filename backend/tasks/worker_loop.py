@@ -0,0 +1,52 @@
+import asyncio
+import logging
+from typing import Any, Coroutine, Optional
+
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from core.database import engine
+from utils.background import drain
+from utils.browser_pool import browser_pool
+from utils.http_client import close_http_client
+
+logger = logging.getLogger(__name__)
+
+# Один event loop на процесс воркера на все время его жизни: пул соединений с БД,
+# HTTP-клиент, браузеры и лимитер запросов привязаны к циклу и переиспользуются между задачами
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def run_async(coro: Coroutine) -> Any:
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    try:
+        return _loop.run_until_complete(coro)
+    finally:
+        # Задачи хуков after_commit (версии кэша, отметки COI, изменения родословной) доводим до конца сейчас:
+        # между задачами Celery цикл не крутится, и API продолжал бы отдавать устаревшие данные
+        _loop.run_until_complete(drain())
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    # Соединения пула достались от родителя через fork: забываем их, не закрывая,
+    # чтобы процесс воркера открыл собственный пул
+    engine.sync_engine.dispose(close=False)
+
+async def _close_resources():
+    await browser_pool.close()
+    await close_http_client()
+    await engine.dispose()
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    global _loop
+    if _loop is None or _loop.is_closed():
+        return
+    try:
+        _loop.run_until_complete(_close_resources())
+    except Exception as e:
+        logger.error(f"Error closing worker resources: {str(e)}")
+    finally:
+        _loop.close()
+        _loop = None
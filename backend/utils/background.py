@@ -0,0 +1,33 @@
+import asyncio
+import logging
+from typing import Coroutine, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Задачи "запустил и забыл" из хуков after_commit (версии кэша, отметки COI, изменения родословной).
+# Цикл событий держит на задачи только слабые ссылки: без этого набора задачу может собрать
+# сборщик мусора раньше, чем она выполнится
+_tasks: Set[asyncio.Task] = set()
+
+def spawn(coro: Coroutine) -> Optional[asyncio.Task]:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Синхронный код без цикла событий (скрипты, миграции): запускать некуда
+        coro.close()
+        return None
+    task = loop.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+async def drain():
+    # Дождаться запущенных задач, включая порожденные ими. Нужно воркеру Celery: его цикл простаивает
+    # между задачами, и без этого записи в кэш и pub/sub ждали бы следующей задачи или терялись при остановке
+    while True:
+        pending = [task for task in _tasks if not task.done()]
+        if not pending:
+            return
+        for result in await asyncio.gather(*pending, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.warning(f"Background task failed: {str(result)}")
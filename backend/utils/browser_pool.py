@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import os
+import signal
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from playwright.async_api import async_playwright, Browser, Page, Playwright
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LAUNCH_ARGS = [
+    "--disable-dev-shm-usage",
+    "--no-sandbox",
+    "--disable-gpu"
+]
+
+class BrowserPool:
+    # Общий на процесс пул запущенных Chromium: браузеры стартуют один раз,
+    # страницы с их контекстами переиспользуются, число одновременно открытых страниц ограничено.
+    # Упавший браузер перезапускается при следующем обращении, долгоживущий - после max_browser_pages страниц.
+    def __init__(self, size: int, max_pages: int, page_max_uses: int, max_browser_pages: int):
+        self.size = size
+        self.page_max_uses = page_max_uses
+        self.max_browser_pages = max_browser_pages
+        self._max_pages = max_pages
+        self._playwright: Optional[Playwright] = None
+        self._browsers: List[Optional[Browser]] = [None] * size
+        self._served: List[int] = [0] * size
+        self._active: List[int] = [0] * size
+        self._next = 0
+        # Свободные страницы по параметрам контекста: (индекс браузера, страница, число использований)
+        self._idle: Dict[Tuple, List[Tuple[int, Page, int]]] = {}
+        self._uses: Dict[Page, Tuple[int, int, Tuple]] = {}
+        self._lock: Optional[asyncio.Lock] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _bind_loop(self):
+        # Объекты Playwright привязаны к event loop, в котором созданы
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._playwright is not None:
+                self._abandon(self._loop, self._playwright, self._browsers)
+            self._loop = loop
+            self._playwright = None
+            self._browsers = [None] * self.size
+            self._served = [0] * self.size
+            self._active = [0] * self.size
+            self._idle.clear()
+            self._uses.clear()
+            self._lock = asyncio.Lock()
+            self._semaphore = asyncio.Semaphore(self._max_pages)
+
+    def _abandon(self, loop: asyncio.AbstractEventLoop, playwright: Playwright, browsers: List[Optional[Browser]]):
+        # Старые объекты из этого цикла уже не использовать, но Chromium и драйвер Playwright нужно остановить,
+        # иначе процессы останутся висеть до завершения воркера
+        if loop.is_running() and not loop.is_closed():
+            # Цикл жив в другом потоке - закрываем штатно в нем
+            asyncio.run_coroutine_threadsafe(self._shutdown(playwright, browsers), loop)
+            return
+        # Цикл остановлен или закрыт, дождаться закрытия в нем нельзя. SIGTERM драйверу:
+        # он сам закрывает запущенные им браузеры перед выходом
+        connection = getattr(getattr(playwright, "_impl_obj", None), "_connection", None)
+        proc = getattr(getattr(connection, "_transport", None), "_proc", None)
+        pid = getattr(proc, "pid", None)
+        if pid is None:
+            logger.warning("Could not find Playwright driver process of a previous event loop, browsers may be left running")
+            return
+        try:
+            os.kill(pid, signal.SIGTERM)
+            logger.info(f"Stopped Playwright driver {pid} left from a previous event loop")
+        except ProcessLookupError:
+            pass
+        except Exception as e:
+            logger.warning(f"Could not stop Playwright driver {pid}: {str(e)}")
+
+    @staticmethod
+    async def _shutdown(playwright: Playwright, browsers: List[Optional[Browser]]):
+        for browser in browsers:
+            if browser is not None:
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
+        try:
+            await playwright.stop()
+        except Exception:
+            pass
+
+    async def _browser(self, index: int) -> Browser:
+        async with self._lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+
+            browser = self._browsers[index]
+            if browser is not None and browser.is_connected():
+                # Плановый перезапуск только когда на браузере нет открытых страниц
+                if self._served[index] < self.max_browser_pages or self._active[index] > 0:
+                    return browser
+
+            if browser is not None:
+                logger.info(f"Restarting pooled browser {index} (connected: {browser.is_connected()}, pages served: {self._served[index]})")
+                self._drop_idle(index)
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
+
+            browser = await self._playwright.chromium.launch(headless=True, args=LAUNCH_ARGS)
+            self._browsers[index] = browser
+            self._served[index] = 0
+            return browser
+
+    def _drop_idle(self, index: int):
+        for key, pages in self._idle.items():
+            self._idle[key] = [entry for entry in pages if entry[0] != index]
+
+    async def acquire(self, **context_options: Any) -> Page:
+        self._bind_loop()
+        await self._semaphore.acquire()
+        try:
+            key = tuple(sorted((k, repr(v)) for k, v in context_options.items()))
+            idle = self._idle.get(key, [])
+            while idle:
+                index, page, uses = idle.pop()
+                browser = self._browsers[index]
+                if browser is not None and browser.is_connected() and not page.is_closed():
+                    self._uses[page] = (index, uses, key)
+                    self._active[index] += 1
+                    return page
+
+            index = self._next
+            self._next = (self._next + 1) % self.size
+            browser = await self._browser(index)
+            self._served[index] += 1
+            self._active[index] += 1
+            try:
+                context = await browser.new_context(**context_options)
+                page = await context.new_page()
+            except Exception:
+                self._active[index] -= 1
+                raise
+            self._uses[page] = (index, 0, key)
+            return page
+        except Exception:
+            self._semaphore.release()
+            raise
+
+    async def release(self, page: Page, healthy: bool = True):
+        try:
+            index, uses, key = self._uses.pop(page)
+            self._active[index] -= 1
+            uses += 1
+            browser = self._browsers[index]
+            reusable = (
+                healthy and uses < self.page_max_uses and not page.is_closed()
+                and browser is not None and browser.is_connected()
+            )
+            if reusable:
+                try:
+                    # Чистим страницу, но оставляем контекст (кэш, cookies) для следующего запроса
+                    await page.goto("about:blank")
+                    self._idle.setdefault(key, []).append((index, page, uses))
+                    return
+                except Exception:
+                    pass
+            try:
+                await page.context.close()
+            except Exception:
+                pass
+        finally:
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def page(self, **context_options: Any):
+        page = await self.acquire(**context_options)
+        healthy = False
+        try:
+            yield page
+            healthy = True
+        finally:
+            await self.release(page, healthy)
+
+    async def close(self):
+        if self._loop is None:
+            return
+        for index, browser in enumerate(self._browsers):
+            if browser is not None:
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
+            self._browsers[index] = None
+        self._idle.clear()
+        self._uses.clear()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+browser_pool = BrowserPool(
+    size=settings.BROWSER_POOL_SIZE,
+    max_pages=settings.BROWSER_MAX_PAGES,
+    page_max_uses=settings.BROWSER_PAGE_MAX_USES,
+    max_browser_pages=settings.BROWSER_MAX_BROWSER_PAGES
+)
@@ -1,42 +1,227 @@
+from collections import OrderedDict
 from redis import asyncio as aioredis
 from core.config import settings
-from functools import wraps
-import pickle
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+import orjson
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Канал, по которому воркеры API сообщают друг другу об измененных версиях
+INVALIDATION_CHANNEL = "cache:invalidate"
+# Приблизительный размер записи без байтов значения (ключ, узел OrderedDict, кортеж)
+ENTRY_OVERHEAD = 200
+
+class LocalCache:
+    # L1: ограниченный LRU в памяти процесса с TTL на запись.
+    # Ограничение по числу записей и по суммарному размеру значений
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self.bytes = 0
+        # Увеличивается на каждую инвалидацию: значение, прочитанное из Redis до нее, не кладем в L1
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, size, expires_at = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, size: int, ttl: float):
+        size += ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (value, size, time.monotonic() + ttl)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, keys: Iterable[str]):
+        self.generation += 1
+        for key in keys:
+            self._remove(key)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+        self.bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+        }
 
 class CacheService:
+    # Двухуровневый кэш: L1 в памяти процесса перед общим Redis (L2).
+    # L1 включается только пока процесс подписан на канал инвалидации (start),
+    # иначе он не узнал бы об изменениях из других воркеров
     def __init__(self):
         self.redis = aioredis.from_url(
-            settings.REDIS_URL, decode_responses=False
+            str(settings.REDIS_URL), decode_responses=False
         )
+        self.local = LocalCache(settings.CACHE_L1_MAX_ENTRIES, settings.CACHE_L1_MAX_BYTES)
+        self.local_enabled = False
+        self.worker_id = uuid.uuid4().hex
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self._task: Optional[asyncio.Task] = None
 
-    async def get(self, key: str):
+    def _local_get(self, key: str) -> Optional[Any]:
+        return self.local.get(key) if self.local_enabled else None
+
+    def _local_set(self, key: str, value: Any, size: int, ttl: int, generation: Optional[int] = None):
+        if not self.local_enabled:
+            return
+        if generation is not None and generation != self.local.generation:
+            return
+        self.local.set(key, value, size, min(ttl, settings.CACHE_L1_TTL))
+
+    async def get_bytes(self, key: str) -> Optional[bytes]:
+        data = self._local_get(key)
+        if data is not None:
+            return data
+        generation = self.local.generation
         data = await self.redis.get(key)
-        return pickle.loads(data) if data else None
+        if data is None:
+            self.l2_misses += 1
+            return None
+        self.l2_hits += 1
+        self._local_set(key, data, len(data), settings.CACHE_L1_TTL, generation)
+        return data
+
+    async def set_bytes(self, key: str, data: bytes, ttl: int = 3600):
+        await self.redis.set(key, data, ex=ttl)
+        self._local_set(key, data, len(data), ttl)
+
+    # Значения - JSON через orjson: компактно и, в отличие от pickle, безопасно при чтении
+    async def get(self, key: str):
+        data = await self.get_bytes(key)
+        return orjson.loads(data) if data is not None else None
 
     async def set(self, key: str, value, ttl: int = 3600):
-        await self.redis.set(
-            key, 
-            pickle.dumps(value),
-            ex=ttl
-        )
+        await self.set_bytes(key, orjson.dumps(value), ttl)
+
+    # Версии сущностей для инвалидации: версия входит в ключ закэшированного ответа,
+    # запись сущности увеличивает версию, и старые ключи просто истекают по TTL.
+    # Версии тоже держатся в L1, так что горячий ответ отдается без обращения к Redis
+    async def versions(self, entity: str, ids: Iterable) -> List[int]:
+        keys = [f"ver:{entity}:{entity_id}" for entity_id in ids]
+        result = [self._local_get(key) for key in keys]
+        missing = [i for i, value in enumerate(result) if value is None]
+        if missing:
+            generation = self.local.generation
+            values = await self.redis.mget([keys[i] for i in missing])
+            for i, value in zip(missing, values):
+                result[i] = int(value) if value else 0
+                self._local_set(keys[i], result[i], 0, settings.CACHE_L1_TTL, generation)
+        return result
+
+    async def bump_versions(self, entity: str, ids: Iterable):
+        keys = [f"ver:{entity}:{entity_id}" for entity_id in ids]
+        if not keys:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.incr(key)
+            pipe.publish(INVALIDATION_CHANNEL, orjson.dumps({"worker_id": self.worker_id, "keys": keys}))
+            await pipe.execute()
+        self.local.invalidate(keys)
 
     async def clear_pattern(self, pattern: str):
-        keys = await self.redis.keys(pattern)
+        # SCAN вместо KEYS: не блокирует Redis на время обхода ключей
+        keys = [key async for key in self.redis.scan_iter(match=pattern, count=1000)]
         if keys:
-            await self.redis.delete(*keys)
+            await self.redis.unlink(*keys)
+        self.local.clear()
 
-cache = CacheService()
+    async def _consume(self, pubsub):
+        async for message in pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            payload = orjson.loads(message["data"])
+            if payload.get("worker_id") != self.worker_id:
+                self.local.invalidate(payload["keys"])
+
+    async def _run(self):
+        # Подписка на инвалидации из других воркеров; L1 работает, пока подписка жива.
+        # После обрыва (или если Redis недоступен при старте) L1 очищается и выключается,
+        # а подписка восстанавливается с нарастающей паузой
+        delay = 1
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                self.local_enabled = True
+                delay = 1
+                await self._consume(pubsub)
+                logger.warning("Cache invalidation subscription closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache invalidation subscription failed: {str(e)}")
+            finally:
+                self.local_enabled = False
+                self.local.clear()
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
 
-def cached(ttl: int = 600, key_prefix: str = "cache"):
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            cache_key = f"{key_prefix}:{func.__name__}:{args}:{kwargs}"
-            cached_data = await cache.get(cache_key)
-            if cached_data:
-                return cached_data
-            result = await func(*args, **kwargs)
-            await cache.set(cache_key, result, ttl)
-            return result
-        return wrapper
-    return decorator
\ No newline at end of file
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        l2_total = self.l2_hits + self.l2_misses
+        return {
+            "l1_enabled": self.local_enabled,
+            "l1": self.local.stats(),
+            "l2": {
+                "hits": self.l2_hits,
+                "misses": self.l2_misses,
+                "hit_ratio": round(self.l2_hits / l2_total, 3) if l2_total else 0.0,
+            },
+        }
+
+cache = CacheService()
@@ -0,0 +1,102 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты очереди: меньше - раньше. Страницы списков идут впереди собак, чтобы воркеры не простаивали
+PRIORITY_LIST = 0
+PRIORITY_DOG = 1
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class HostRateLimiter:
+    # Ограничение частоты запросов к каждому сайту отдельно, общее для всех воркеров процесса
+    def __init__(self, rates: Dict[str, float], default_rate: float, burst: int):
+        self.rates = rates
+        self.default_rate = default_rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def acquire(self, url: str):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._buckets = {}
+        host = urlparse(url).hostname or ""
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(self.rates.get(host, self.default_rate), self.burst)
+        await bucket.acquire()
+
+rate_limiter = HostRateLimiter(settings.CRAWL_HOST_RATES, settings.CRAWL_DEFAULT_RATE, settings.CRAWL_BURST)
+
+Handler = Callable[["CrawlFrontier", str, Any], Awaitable[None]]
+
+class CrawlFrontier:
+    # Очередь URL с приоритетами и дедупликацией, которую разбирает ограниченный пул воркеров.
+    # handler(frontier, url, payload) обрабатывает URL и может добавлять новые через frontier.add
+    def __init__(self, handler: Handler, workers: int = settings.CRAWL_WORKERS):
+        self.handler = handler
+        self.workers = workers
+        self.seen = set()
+        self.failures: List[Dict[str, Any]] = []
+        self.processed = 0
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._counter = itertools.count()
+
+    def add(self, url: str, priority: int, payload: Any = None) -> bool:
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+        self._queue.put_nowait((priority, next(self._counter), url, payload))
+        return True
+
+    async def _worker(self):
+        while True:
+            _, _, url, payload = await self._queue.get()
+            try:
+                await self.handler(self, url, payload)
+                self.processed += 1
+            except Exception as e:
+                logger.error(f"Crawl failed for {url}: {str(e)}")
+                self.failures.append({"url": url, "error": str(e)})
+            finally:
+                self._queue.task_done()
+
+    async def run(self):
+        started = time.perf_counter()
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        try:
+            await self._queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        logger.info(
+            f"Crawl finished: {self.processed} urls, {len(self.failures)} failed "
+            f"in {time.perf_counter() - started:.1f}s with {self.workers} workers"
+        )
@@ -1,8 +1,10 @@
 from typing import Optional, List, Dict, Tuple
-from sqlalchemy import select
+from sqlalchemy import Integer, String, column, func, or_, select, text, true, values
 from sqlalchemy.ext.asyncio import AsyncSession
+from core.config import settings
 from models.dog import Dog
-from utils.levenshtein import is_similar_name, normalized_levenshtein_similarity
+from utils.levenshtein import is_similar_name, normalized_levenshtein_similarity, similarity_at_least
+from utils.name_index import name_index
 
 async def find_existing_dog(
     session: AsyncSession,
@@ -54,44 +56,197 @@ async def find_existing_dog(
     
     # 4. Поиск по алгоритму Левенштейна
     if registered_name:
-        # Получаем всех собак с похожими именами
-        all_dogs_query = select(Dog).where(Dog.registered_name.isnot(None))
-        result = await session.execute(all_dogs_query)
-        all_dogs = result.scalars().all()
-        
-        best_match = None
-        best_similarity = 0.0
-        
-        for dog in all_dogs:
-            if dog.registered_name:
-                similarity = normalized_levenshtein_similarity(
-                    registered_name.lower().strip(),
-                    dog.registered_name.lower().strip()
-                )
-                
-                if similarity > best_similarity and similarity >= name_similarity_threshold:
-                    # Дополнительная проверка по дате рождения и родителям
-                    if date_of_birth and dog.date_of_birth:
-                        if date_of_birth == dog.date_of_birth:
-                            similarity += 0.1  # Бонус за совпадение даты
-                    
-                    if sire_name and dog.sire_name:
-                        if is_similar_name(sire_name, dog.sire_name, 0.7):
-                            similarity += 0.05  # Бонус за совпадение отца
-                    
-                    if dam_name and dog.dam_name:
-                        if is_similar_name(dam_name, dog.dam_name, 0.7):
-                            similarity += 0.05  # Бонус за совпадение матери
-                    
-                    if similarity > best_similarity:
-                        best_similarity = similarity
-                        best_match = dog
-        
+        if settings.DOG_MATCHER == "pg_trgm":
+            candidates = await _trgm_candidates(session, registered_name)
+        else:
+            candidates = await _index_candidates(session, registered_name, name_similarity_threshold)
+
+        best_match, best_similarity = _best_candidate(candidates, dog_data, name_similarity_threshold)
+
+        if best_match and not isinstance(best_match, Dog):
+            best_match = await session.get(Dog, best_match.id)
+
         if best_match:
             return best_match, "levenshtein", best_similarity
     
     return None, "not_found", 0.0
 
+async def _index_candidates_many(session: AsyncSession, registered_names: List[str], threshold: float) -> List[List[Dog]]:
+    # Получаем только собак с похожими именами: индекс отсекает заведомо далекие имена
+    await name_index.refresh(session)
+    candidate_ids = [name_index.candidates(name, threshold) for name in registered_names]
+    all_ids = set().union(*candidate_ids)
+    if not all_ids:
+        return [[] for _ in registered_names]
+    result = await session.execute(select(Dog).where(Dog.id.in_(all_ids)).order_by(Dog.id))
+    dogs = {dog.id: dog for dog in result.scalars().all()}
+    return [[dogs[dog_id] for dog_id in ids if dog_id in dogs] for ids in candidate_ids]
+
+async def _trgm_candidates_many(session: AsyncSession, registered_names: List[str]) -> List[List]:
+    # Top-K по триграммному сходству из GIN-индекса ix_dog_registered_name_trgm, для всех имен одним запросом
+    query_names = values(column("idx", Integer), column("name", String), name="query_names").data(
+        [(idx, name.lower().strip()) for idx, name in enumerate(registered_names)]
+    )
+    lowered = func.lower(Dog.registered_name)
+    candidates = (
+        select(Dog.id, Dog.registered_name, Dog.date_of_birth, Dog.sire_name, Dog.dam_name)
+        .where(lowered.op("%")(query_names.c.name))
+        .order_by(func.similarity(lowered, query_names.c.name).desc(), Dog.id)
+        .limit(settings.DOG_MATCHER_TRGM_LIMIT)
+        .lateral("candidates")
+    )
+    await session.execute(
+        text(f"SET LOCAL pg_trgm.similarity_threshold = {float(settings.DOG_MATCHER_TRGM_THRESHOLD)}")
+    )
+    result = await session.execute(
+        select(query_names.c.idx, candidates).select_from(query_names.join(candidates, true()))
+    )
+    grouped = [[] for _ in registered_names]
+    for row in result.all():
+        grouped[row.idx].append(row)
+    return grouped
+
+async def _index_candidates(session: AsyncSession, registered_name: str, threshold: float) -> List[Dog]:
+    return (await _index_candidates_many(session, [registered_name], threshold))[0]
+
+async def _trgm_candidates(session: AsyncSession, registered_name: str) -> List:
+    return (await _trgm_candidates_many(session, [registered_name]))[0]
+
+def _best_candidate(candidates: List, dog_data: Dict, name_similarity_threshold: float) -> Tuple[Optional[object], float]:
+    registered_name = dog_data.get('registered_name')
+    date_of_birth = dog_data.get('date_of_birth')
+    sire_name = dog_data.get('sire_name')
+    dam_name = dog_data.get('dam_name')
+
+    best_match = None
+    best_similarity = 0.0
+
+    name = registered_name.lower().strip()
+
+    for dog in candidates:
+        if dog.registered_name:
+            candidate_name = dog.registered_name.lower().strip()
+            # Дальние имена отсекаются без полного расчета расстояния
+            if not similarity_at_least(name, candidate_name, name_similarity_threshold):
+                continue
+            similarity = normalized_levenshtein_similarity(name, candidate_name)
+
+            if similarity > best_similarity and similarity >= name_similarity_threshold:
+                # Дополнительная проверка по дате рождения и родителям
+                if date_of_birth and dog.date_of_birth:
+                    if date_of_birth == dog.date_of_birth:
+                        similarity += 0.1  # Бонус за совпадение даты
+
+                if sire_name and dog.sire_name:
+                    if is_similar_name(sire_name, dog.sire_name, 0.7):
+                        similarity += 0.05  # Бонус за совпадение отца
+
+                if dam_name and dog.dam_name:
+                    if is_similar_name(dam_name, dog.dam_name, 0.7):
+                        similarity += 0.05  # Бонус за совпадение матери
+
+                if similarity > best_similarity:
+                    best_similarity = similarity
+                    best_match = dog
+
+    return best_match, best_similarity
+
+async def find_existing_dogs(
+    session: AsyncSession,
+    dogs_data: List[Dict],
+    source: str,
+    name_similarity_threshold: float = 0.8
+) -> List[Tuple[Optional[Dog], str, float]]:
+    # То же, что find_existing_dog, но для целой страницы: по одному запросу на каждый шаг
+    matches: List[Tuple[Optional[Dog], str, float]] = [(None, "not_found", 0.0)] * len(dogs_data)
+    pending = []
+    for idx, dog_data in enumerate(dogs_data):
+        if dog_data.get('registered_name'):
+            pending.append(idx)
+        else:
+            matches[idx] = (None, "no_name", 0.0)
+
+    # 1. Строгое сравнение по имени
+    names = {dogs_data[idx]['registered_name'] for idx in pending}
+    if names:
+        result = await session.execute(select(Dog).where(Dog.registered_name.in_(names)).order_by(Dog.id))
+        by_name = {}
+        for dog in result.scalars().all():
+            by_name.setdefault(dog.registered_name, dog)
+        for idx in pending:
+            dog = by_name.get(dogs_data[idx]['registered_name'])
+            if dog:
+                matches[idx] = (dog, "exact_name", 1.0)
+        pending = [idx for idx in pending if matches[idx][0] is None]
+
+    # 2. Поиск по UUID
+    uuids = {dogs_data[idx]['uuid'] for idx in pending if dogs_data[idx].get('uuid')}
+    if uuids:
+        result = await session.execute(select(Dog).where(Dog.uuid.in_(uuids)).order_by(Dog.id))
+        by_uuid = {}
+        for dog in result.scalars().all():
+            by_uuid.setdefault(dog.uuid, dog)
+        for idx in pending:
+            dog = by_uuid.get(dogs_data[idx].get('uuid'))
+            if dog:
+                matches[idx] = (dog, "uuid", 1.0)
+        pending = [idx for idx in pending if matches[idx][0] is None]
+
+    # 3. Поиск по дате рождения + родители
+    with_parents = [
+        idx for idx in pending
+        if dogs_data[idx].get('date_of_birth') and (dogs_data[idx].get('sire_name') or dogs_data[idx].get('dam_name'))
+    ]
+    if with_parents:
+        dates = {dogs_data[idx]['date_of_birth'] for idx in with_parents}
+        sire_names = {dogs_data[idx]['sire_name'] for idx in with_parents if dogs_data[idx].get('sire_name')}
+        dam_names = {dogs_data[idx]['dam_name'] for idx in with_parents if dogs_data[idx].get('dam_name')}
+        result = await session.execute(
+            select(Dog)
+            .where(Dog.date_of_birth.in_(dates), or_(Dog.sire_name.in_(sire_names), Dog.dam_name.in_(dam_names)))
+            .order_by(Dog.id)
+        )
+        by_birth = result.scalars().all()
+        for idx in with_parents:
+            dog_data = dogs_data[idx]
+            for dog in by_birth:
+                if dog.date_of_birth != dog_data['date_of_birth']:
+                    continue
+                if dog_data.get('sire_name') and dog.sire_name != dog_data['sire_name']:
+                    continue
+                if dog_data.get('dam_name') and dog.dam_name != dog_data['dam_name']:
+                    continue
+                matches[idx] = (dog, "birth_parents", 1.0)
+                break
+        pending = [idx for idx in pending if matches[idx][0] is None]
+
+    # 4. Поиск по алгоритму Левенштейна, общий проход для всех оставшихся
+    if pending:
+        registered_names = [dogs_data[idx]['registered_name'] for idx in pending]
+        if settings.DOG_MATCHER == "pg_trgm":
+            candidates = await _trgm_candidates_many(session, registered_names)
+        else:
+            candidates = await _index_candidates_many(session, registered_names, name_similarity_threshold)
+
+        fuzzy = {}
+        for idx, dog_candidates in zip(pending, candidates):
+            best_match, best_similarity = _best_candidate(dog_candidates, dogs_data[idx], name_similarity_threshold)
+            if best_match:
+                fuzzy[idx] = (best_match, best_similarity)
+
+        row_ids = {match.id for match, _ in fuzzy.values() if not isinstance(match, Dog)}
+        dogs = {}
+        if row_ids:
+            result = await session.execute(select(Dog).where(Dog.id.in_(row_ids)))
+            dogs = {dog.id: dog for dog in result.scalars().all()}
+
+        for idx, (best_match, best_similarity) in fuzzy.items():
+            dog = best_match if isinstance(best_match, Dog) else dogs.get(best_match.id)
+            if dog:
+                matches[idx] = (dog, "levenshtein", best_similarity)
+
+    return matches
+
 def detect_conflicts(existing_dog: Dog, new_data: Dict, source: str) -> Tuple[bool, Dict]:
 
     conflicts = {}
@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from core.config import settings
+from utils.crawl_frontier import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+class HttpCache:
+    # Кэш ответов парсеров на диске в одном файле SQLite.
+    # Тела хранятся сжатыми и адресуются по sha256: одинаковые страницы по разным URL лежат один раз.
+    # Свежие записи (моложе TTL источника) отдаются без запроса, устаревшие перепроверяются по ETag/Last-Modified.
+    def __init__(self, path: str, ttls: Dict[str, int], default_ttl: int = 86400):
+        self.path = path
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            # WAL: кэш одновременно читают API и воркеры Celery
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    body_hash TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_type TEXT,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS bodies (hash TEXT PRIMARY KEY, data BLOB NOT NULL)")
+            # Для проверки, ссылается ли еще кто-то на тело
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_body_hash ON responses (body_hash)")
+            self._conn = conn
+        return self._conn
+
+    def _load(self, url: str) -> Optional[Tuple[bytes, Optional[str], Optional[str], Optional[str], float]]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT b.data, r.etag, r.last_modified, r.content_type, r.fetched_at "
+                "FROM responses r JOIN bodies b ON b.hash = r.body_hash WHERE r.url = ?",
+                (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]), row[1], row[2], row[3], row[4]
+
+    def _store(self, url: str, body: bytes, etag: Optional[str], last_modified: Optional[str], content_type: Optional[str]):
+        body_hash = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                previous = conn.execute("SELECT body_hash FROM responses WHERE url = ?", (url,)).fetchone()
+                conn.execute(
+                    "INSERT OR IGNORE INTO bodies (hash, data) VALUES (?, ?)",
+                    (body_hash, zlib.compress(body, 6))
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (url, body_hash, etag, last_modified, content_type, fetched_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (url, body_hash, etag, last_modified, content_type, time.time())
+                )
+                # Страница изменилась: прежнее тело удаляем, если на него больше не ссылается ни один URL
+                if previous is not None and previous[0] != body_hash:
+                    conn.execute(
+                        "DELETE FROM bodies WHERE hash = ? AND NOT EXISTS (SELECT 1 FROM responses WHERE body_hash = ?)",
+                        (previous[0], previous[0])
+                    )
+
+    def _touch(self, url: str):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("UPDATE responses SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+    def _cached_response(self, url: str, body: bytes, content_type: Optional[str]) -> httpx.Response:
+        headers = {"x-cache": "hit"}
+        if content_type:
+            headers["content-type"] = content_type
+        return httpx.Response(200, content=body, headers=headers, request=httpx.Request("GET", url))
+
+    async def get(self, client: httpx.AsyncClient, url: str, source: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        cached = await asyncio.to_thread(self._load, url)
+        request_headers = dict(headers or {})
+
+        if cached is not None:
+            body, etag, last_modified, content_type, fetched_at = cached
+            if time.time() - fetched_at < self.ttls.get(source, self.default_ttl):
+                self.hits += 1
+                return self._cached_response(url, body, content_type)
+            if etag:
+                request_headers["if-none-match"] = etag
+            if last_modified:
+                request_headers["if-modified-since"] = last_modified
+
+        await rate_limiter.acquire(url)
+        response = await client.get(url, headers=request_headers)
+
+        if response.status_code == 304 and cached is not None:
+            self.revalidated += 1
+            await asyncio.to_thread(self._touch, url)
+            return self._cached_response(url, cached[0], cached[3])
+
+        self.misses += 1
+        if response.status_code == 200:
+            await asyncio.to_thread(
+                self._store, url, response.content,
+                response.headers.get("etag"), response.headers.get("last-modified"), response.headers.get("content-type")
+            )
+        return response
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.revalidated + self.misses
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.revalidated) / total, 3) if total else 0.0,
+        }
+
+http_cache = HttpCache(settings.HTTP_CACHE_PATH, settings.HTTP_CACHE_TTL)
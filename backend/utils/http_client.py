@@ -0,0 +1,27 @@
+import asyncio
+from typing import Optional
+
+import httpx
+
+# Общий на процесс httpx-клиент: пул соединений и keep-alive переиспользуются между запросами парсеров
+_client: Optional[httpx.AsyncClient] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def http_client() -> httpx.AsyncClient:
+    global _client, _loop
+    loop = asyncio.get_running_loop()
+    # Клиент привязан к event loop, в котором создан
+    if _client is None or _client.is_closed or _loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            follow_redirects=True
+        )
+        _loop = loop
+    return _client
+
+async def close_http_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
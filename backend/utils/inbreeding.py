@@ -0,0 +1,150 @@
+import logging
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN = -1
+# Родословных глубже этого не бывает; всё, что глубже, считаем циклом в данных
+MAX_GENERATIONS = 256
+# Сколько пар родителей одного слоя обрабатывается за раз; ограничивает память на вклады предков
+BLOCK_SIZE = 2048
+
+def generation_levels(sire: np.ndarray, dam: np.ndarray) -> np.ndarray:
+    # Уровень поколения: 0 для основателей, иначе 1 + максимум уровней родителей
+    n = len(sire)
+    level = np.zeros(n, dtype=np.int32)
+    has_sire = sire != UNKNOWN
+    has_dam = dam != UNKNOWN
+
+    for _ in range(MAX_GENERATIONS):
+        new_level = np.zeros(n, dtype=np.int32)
+        new_level[has_sire] = level[sire[has_sire]] + 1
+        new_level[has_dam] = np.maximum(new_level[has_dam], level[dam[has_dam]] + 1)
+        if np.array_equal(new_level, level):
+            return level
+        level = new_level
+
+    return level
+
+def break_cycles(sire: np.ndarray, dam: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Циклы в родословной (ошибки сопоставления при парсинге) не дают уровням сойтись.
+    # Таким собакам обнуляем родителей и считаем их основателями.
+    sire, dam = sire.copy(), dam.copy()
+    level = generation_levels(sire, dam)
+    broken = level >= MAX_GENERATIONS - 1
+    if broken.any():
+        logger.warning(f"Pedigree contains cycles, treating {int(broken.sum())} dogs as founders")
+        sire[broken] = UNKNOWN
+        dam[broken] = UNKNOWN
+        level = generation_levels(sire, dam)
+    return sire, dam, level
+
+def topological_order(sire: np.ndarray, dam: np.ndarray) -> np.ndarray:
+    _, _, level = break_cycles(sire, dam)
+    return np.argsort(level, kind="stable")
+
+def _pair_inbreeding(pair_sire: np.ndarray, pair_dam: np.ndarray, pair_variance: np.ndarray,
+                     sire: np.ndarray, dam: np.ndarray, level: np.ndarray, variance: np.ndarray) -> np.ndarray:
+    # F потомка для каждой пары родителей: sum(L_j^2 * D_j) по предкам + D_i - 1.
+    # Вклады L_j спускаются от родителей к основателям сразу для всех пар блока,
+    # по одному уровню поколения за шаг.
+    count = len(pair_sire)
+    n = len(sire)
+    f = pair_variance - 1.0
+
+    # Очередь вкладов по уровням: (пара, предок, вклад)
+    pending = [[] for _ in range(int(level.max()) + 1)]
+
+    def push(pair: np.ndarray, node: np.ndarray, weight: np.ndarray):
+        node_level = level[node]
+        order = np.argsort(node_level, kind="stable")
+        levels, starts = np.unique(node_level[order], return_index=True)
+        for lvl, part in zip(levels.tolist(), np.split(order, starts[1:])):
+            pending[lvl].append((pair[part], node[part], weight[part]))
+
+    push(
+        np.concatenate([np.arange(count), np.arange(count)]),
+        np.concatenate([pair_sire, pair_dam]),
+        np.full(2 * count, 0.5)
+    )
+
+    for current in range(len(pending) - 1, -1, -1):
+        if not pending[current]:
+            continue
+        pair = np.concatenate([entry[0] for entry in pending[current]])
+        node = np.concatenate([entry[1] for entry in pending[current]])
+        weight = np.concatenate([entry[2] for entry in pending[current]])
+        pending[current] = None
+
+        # Вклады, пришедшие в предка по разным путям, суммируются до возведения в квадрат
+        keys, inverse = np.unique(pair * n + node, return_inverse=True)
+        merged = np.bincount(inverse.reshape(-1), weights=weight)
+        merged_pair, merged_node = keys // n, keys % n
+        f += np.bincount(merged_pair, weights=merged * merged * variance[merged_node], minlength=count)
+
+        parent_node = np.concatenate([sire[merged_node], dam[merged_node]])
+        known = parent_node != UNKNOWN
+        if known.any():
+            push(
+                np.concatenate([merged_pair, merged_pair])[known],
+                parent_node[known],
+                np.concatenate([merged, merged])[known] * 0.5
+            )
+
+    return f
+
+def meuwissen_luo(sire: np.ndarray, dam: np.ndarray, block_size: int = BLOCK_SIZE) -> np.ndarray:
+    # Коэффициенты инбридинга всей родословной (Meuwissen & Luo, 1992), послойно.
+    # sire/dam - индексы родителей в тех же массивах, -1 если родитель неизвестен.
+    n = len(sire)
+    if n == 0:
+        return np.zeros(0, dtype=np.float64)
+
+    sire, dam, level = break_cycles(np.asarray(sire, dtype=np.int64), np.asarray(dam, dtype=np.int64))
+    order = np.argsort(level, kind="stable")
+    bounds = np.searchsorted(level[order], np.arange(int(level.max()) + 2))
+
+    f = np.zeros(n, dtype=np.float64)
+    variance = np.zeros(n, dtype=np.float64)
+    has_sire, has_dam = sire != UNKNOWN, dam != UNKNOWN
+
+    # Родители всегда лежат в предыдущих слоях, поэтому каждый слой считается целиком
+    for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        layer = order[start:end]
+        if not len(layer):
+            continue
+
+        both = layer[has_sire[layer] & has_dam[layer]]
+        if len(both):
+            # Полные сибсы имеют одинаковый F: каждая пара родителей считается один раз
+            pairs, inverse = np.unique(
+                np.stack([np.minimum(sire[both], dam[both]), np.maximum(sire[both], dam[both])], axis=1),
+                axis=0, return_inverse=True
+            )
+            pair_variance = 0.5 - 0.25 * (f[pairs[:, 0]] + f[pairs[:, 1]])
+            pair_f = np.empty(len(pairs), dtype=np.float64)
+            for block in range(0, len(pairs), block_size):
+                chunk = slice(block, block + block_size)
+                pair_f[chunk] = _pair_inbreeding(
+                    pairs[chunk, 0], pairs[chunk, 1], pair_variance[chunk],
+                    sire, dam, level, variance
+                )
+            f[both] = pair_f[inverse.reshape(-1)]
+
+        # Дисперсия менделевской выборки; F неизвестного родителя = -1
+        sire_f = np.where(has_sire[layer], f[sire[layer]], -1.0)
+        dam_f = np.where(has_dam[layer], f[dam[layer]], -1.0)
+        variance[layer] = 0.5 - 0.25 * (sire_f + dam_f)
+
+    return f
+
+def inbreeding_coefficients(parents: Dict[int, Tuple[Optional[int], Optional[int]]]) -> Dict[int, float]:
+    # То же для словаря {dog_id: (sire_id, dam_id)}; родители вне словаря считаются неизвестными
+    ids = list(parents.keys())
+    positions = {dog_id: pos for pos, dog_id in enumerate(ids)}
+    sire = np.array([positions.get(parents[dog_id][0], UNKNOWN) for dog_id in ids], dtype=np.int64)
+    dam = np.array([positions.get(parents[dog_id][1], UNKNOWN) for dog_id in ids], dtype=np.int64)
+    f = meuwissen_luo(sire, dam)
+    return {dog_id: float(f[pos]) for pos, dog_id in enumerate(ids)}
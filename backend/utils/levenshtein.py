@@ -1,3 +1,5 @@
+import math
+
 def levenshtein_distance(str1: str, str2: str) -> int:
     if not str1:
         return len(str2)
@@ -30,13 +32,80 @@ def levenshtein_distance(str1: str, str2: str) -> int:
     
     return current_row[size2]
 
+def _pattern_masks(pattern: str) -> dict:
+    masks = {}
+    for i, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks
+
+def bounded_levenshtein_distance(str1: str, str2: str, max_distance: int) -> int:
+    # Битово-параллельный алгоритм Майерса (в формулировке Хиррё) на целых числах Python:
+    # один столбец матрицы за несколько битовых операций.
+    # Возвращает точное расстояние, если оно <= max_distance, иначе max_distance + 1.
+    if len(str1) > len(str2):
+        str1, str2 = str2, str1
+    size1, size2 = len(str1), len(str2)
+
+    if size2 - size1 > max_distance:
+        return max_distance + 1
+    if not size1:
+        return size2
+
+    masks = _pattern_masks(str1)
+    full = (1 << size1) - 1
+    last = 1 << (size1 - 1)
+    positive, negative = full, 0
+    score = size1
+
+    for j, char in enumerate(str2, 1):
+        eq = masks.get(char, 0)
+        xv = eq | negative
+        xh = (((eq & positive) + positive) ^ positive) | eq
+        h_positive = negative | ~(xh | positive)
+        h_negative = positive & xh
+
+        if h_positive & last:
+            score += 1
+        elif h_negative & last:
+            score -= 1
+
+        # Оставшиеся символы могут уменьшить расстояние не больше чем на свое количество
+        if score - (size2 - j) > max_distance:
+            return max_distance + 1
+
+        h_positive = (h_positive << 1) | 1
+        h_negative <<= 1
+        positive = (h_negative | ~(xv | h_positive)) & full
+        negative = h_positive & xv & full
+
+    return score if score <= max_distance else max_distance + 1
+
+def fast_levenshtein_distance(str1: str, str2: str) -> int:
+    # То же, что levenshtein_distance, но без построчной DP
+    return bounded_levenshtein_distance(str1, str2, max(len(str1), len(str2)))
+
+def similarity_at_least(str1: str, str2: str, threshold: float) -> bool:
+    # normalized_levenshtein_similarity(str1, str2) >= threshold, с ранним выходом
+    if not str1 and not str2:
+        return 1.0 >= threshold
+    if not str1 or not str2:
+        return 0.0 >= threshold
+
+    max_len = max(len(str1), len(str2))
+    budget = math.floor((1.0 - threshold) * max_len + 1e-9)
+    if budget < 0:
+        return False
+
+    distance = bounded_levenshtein_distance(str1, str2, budget)
+    return distance <= budget and 1.0 - (distance / max_len) >= threshold
+
 def normalized_levenshtein_similarity(str1: str, str2: str) -> float:
     if not str1 and not str2:
         return 1.0
     if not str1 or not str2:
         return 0.0
     
-    distance = levenshtein_distance(str1, str2)
+    distance = fast_levenshtein_distance(str1, str2)
     max_len = max(len(str1), len(str2))
     
     return 1.0 - (distance / max_len)
@@ -54,8 +123,7 @@ def is_similar_name(name1: str, name2: str, threshold: float = 0.8) -> bool:
         return True
     
     # Проверяем сходство
-    similarity = normalized_levenshtein_similarity(name1_norm, name2_norm)
-    return similarity >= threshold
+    return similarity_at_least(name1_norm, name2_norm, threshold)
 
 def find_best_match(target_name: str, candidates: list, threshold: float = 0.8) -> tuple:
     if not target_name or not candidates:
@@ -79,4 +147,36 @@ def find_best_match(target_name: str, candidates: list, threshold: float = 0.8)
             best_similarity = similarity
             best_match = candidate
     
-    return best_match, best_similarity 
\ No newline at end of file
+    return best_match, best_similarity 
+
+
+if __name__ == "__main__":
+    # Микро-бенчмарк на именах типичной длины: python -m utils.levenshtein
+    import random
+    import timeit
+
+    names = [
+        "snowmist's northern star", "snowmist northern star", "kolyma's silver frost of taiga",
+        "kolyma silver frost of taiga", "alaskan nanook", "alaskans nanook ii",
+        "arctic dream white fang of ice empire", "arctic dreams white fang of ice empire",
+        "sibirsky zolotoy veter", "sibirskiy zolotoi veter", "chinook's alaskan storm", "storm",
+    ]
+    random.seed(0)
+    pairs = [(random.choice(names), random.choice(names)) for _ in range(2000)]
+
+    def run(check):
+        return sum(1 for a, b in pairs if check(a, b))
+
+    checks = {
+        "levenshtein_distance (reference)": lambda a, b: 1.0 - levenshtein_distance(a, b) / max(len(a), len(b)) >= 0.8,
+        "fast_levenshtein_distance": lambda a, b: 1.0 - fast_levenshtein_distance(a, b) / max(len(a), len(b)) >= 0.8,
+        "similarity_at_least": lambda a, b: similarity_at_least(a, b, 0.8),
+    }
+    results = {name: run(check) for name, check in checks.items()}
+    assert len(set(results.values())) == 1, results
+
+    baseline = None
+    for name, check in checks.items():
+        seconds = min(timeit.repeat(lambda: run(check), number=5, repeat=3)) / 5
+        baseline = baseline or seconds
+        print(f"{name:35s} {seconds * 1e6 / len(pairs):8.2f} us/pair  x{baseline / seconds:.1f}")
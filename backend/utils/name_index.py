@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import math
+import time
+from array import array
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+from sqlalchemy import Integer, any_, bindparam, event, inspect, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models.dog import Dog
+
+logger = logging.getLogger(__name__)
+
+Q = 3
+PAD = "\x00"
+
+# id ниже водяного знака, которых еще не видно: их транзакции не закоммичены (параллельные сессии,
+# воркеры Celery, пакетная запись) или откатились. Такие id перечитываются при каждом refresh,
+# пока не появятся; откатившиеся забываются через GAP_TTL секунд
+GAP_TTL = 3600
+# Пропуски отслеживаются только среди последних id: старые транзакции давно завершены
+GAP_WINDOW = 10000
+
+def normalize_name(name: str) -> str:
+    return name.lower().strip()
+
+def qgrams(name: str) -> Set[str]:
+    padded = PAD * (Q - 1) + name + PAD * (Q - 1)
+    return {padded[i:i + Q] for i in range(len(padded) - Q + 1)}
+
+def max_distance(length: int, threshold: float) -> int:
+    # Наибольшее расстояние Левенштейна, при котором similarity >= threshold
+    return math.floor((1.0 - threshold) * length + 1e-9)
+
+class NameIndex:
+    # Блокирующий индекс по триграммам нормализованных имен.
+    # Отдает надмножество собак, у которых normalized_levenshtein_similarity >= threshold:
+    # фильтр по длине и по числу общих триграмм никогда не отбрасывает подходящее имя.
+    def __init__(self):
+        self.dog_ids = array("i")
+        self.lengths = array("i")
+        self.postings: Dict[str, array] = {}
+        self.by_length: Dict[int, array] = {}
+        self.max_id = 0
+        self.gaps: Dict[int, float] = {}
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.dog_ids)
+
+    def add(self, dog_id: int, name: Optional[str]):
+        if not name:
+            return
+        name = normalize_name(name)
+        idx = len(self.dog_ids)
+        self.dog_ids.append(dog_id)
+        self.lengths.append(len(name))
+        self.by_length.setdefault(len(name), array("i")).append(idx)
+        for gram in qgrams(name):
+            self.postings.setdefault(gram, array("i")).append(idx)
+
+    async def refresh(self, session: AsyncSession):
+        # Дочитываем собак, добавленных после последнего обращения (в том числе другими воркерами)
+        async with self._lock:
+            now = time.monotonic()
+            self.gaps = {dog_id: since for dog_id, since in self.gaps.items() if now - since < GAP_TTL}
+            condition = Dog.id > self.max_id
+            if self.gaps:
+                # Один параметр-массив вместо IN с тысячами параметров
+                condition = or_(condition, Dog.id == any_(bindparam("gaps", list(self.gaps), type_=ARRAY(Integer))))
+            result = await session.execute(
+                select(Dog.id, Dog.registered_name).where(condition).order_by(Dog.id)
+            )
+            rows = result.all()
+            for dog_id, name in rows:
+                self.add(dog_id, name)
+                self.gaps.pop(dog_id, None)
+
+            # Водяной знак - по максимальному увиденному id; все невиденные id ниже него становятся пропусками
+            new_max = max((dog_id for dog_id, _ in rows), default=self.max_id)
+            if new_max > self.max_id:
+                seen = {dog_id for dog_id, _ in rows}
+                for dog_id in range(max(self.max_id + 1, new_max - GAP_WINDOW), new_max):
+                    if dog_id not in seen:
+                        self.gaps[dog_id] = now
+                self.max_id = new_max
+            if len(rows) > 1000:
+                logger.info(f"Name index: {len(rows)} names added, {len(self)} total")
+
+    def candidates(self, name: str, threshold: float) -> List[int]:
+        name = normalize_name(name)
+        if not name or not len(self.dog_ids):
+            return []
+
+        length = len(name)
+        grams = qgrams(name)
+        lengths = np.frombuffer(self.lengths, dtype=np.int32)
+
+        # Общие триграммы с каждым именем индекса
+        lists = [np.frombuffer(self.postings[gram], dtype=np.int32) for gram in grams if gram in self.postings]
+        common = np.bincount(np.concatenate(lists), minlength=len(lengths)) if lists else np.zeros(len(lengths), dtype=np.int64)
+
+        # Каждая правка портит не больше Q триграмм, а длины отличаются не больше чем на число правок
+        k = np.floor((1.0 - threshold) * np.maximum(lengths, length) + 1e-9)
+        mask = (np.abs(lengths - length) <= k) & (common >= len(grams) - k * Q)
+
+        # Если порог по триграммам не положителен, подходят и имена без общих триграмм
+        max_len = length
+        while max_len - length <= max_distance(max_len, threshold):
+            max_len += 1
+        for other_length in range(max(1, length - max_distance(length, threshold)), max_len):
+            if len(grams) - max_distance(max(other_length, length), threshold) * Q <= 0 and other_length in self.by_length:
+                mask[np.frombuffer(self.by_length[other_length], dtype=np.int32)] = True
+
+        ids = np.frombuffer(self.dog_ids, dtype=np.int32)[mask]
+        return sorted(set(ids.tolist()))
+
+    async def find_candidates(self, session: AsyncSession, name: str, threshold: float) -> List[int]:
+        await self.refresh(session)
+        return self.candidates(name, threshold)
+
+name_index = NameIndex()
+
+# Переименования не меняют id, поэтому добавляем новое имя по событию;
+# старое имя остается в индексе, но кандидаты все равно перепроверяются по актуальной записи
+def _track_name_change(mapper, connection, dog: Dog):
+    if dog.id is not None and dog.id <= name_index.max_id and inspect(dog).attrs.registered_name.history.has_changes():
+        name_index.add(dog.id, dog.registered_name)
+
+event.listen(Dog, "after_update", _track_name_change)
@@ -1,3 +1,4 @@
+import json
 import re
 from datetime import date, datetime
 from typing import Optional, Dict, Any
@@ -84,3 +85,51 @@ def to_snake_case(text):
 
 def clean_text(text):
     return re.sub(r'\s+', ' ', text).strip()
+
+_OPENING = {"{": "}", "[": "]"}
+# Значимые для разбора символы; всё между ними пропускается одним шагом регулярки
+_JS_TOKEN = re.compile(r"""[{}\[\]"'\\]""")
+
+def extract_js_literal(source: str, name: str) -> Optional[str]:
+    # Текст объекта/массива из "var name = ...;" во встроенном скрипте.
+    # Разбор по токенам с учетом вложенности и строк, поэтому "};" внутри значений не обрывает литерал
+    match = re.search(r"\bvar\s+" + re.escape(name) + r"\s*=\s*", source)
+    if not match:
+        return None
+
+    start = match.end()
+    if start >= len(source) or source[start] not in _OPENING:
+        return None
+
+    stack = []
+    quote = None
+    escaped_until = -1
+    for token in _JS_TOKEN.finditer(source, start):
+        position = token.start()
+        if position < escaped_until:
+            continue
+        char = token.group()
+        if quote:
+            if char == "\\":
+                escaped_until = position + 2
+            elif char == quote:
+                quote = None
+        elif char in ('"', "'"):
+            quote = char
+        elif char in _OPENING:
+            stack.append(_OPENING[char])
+        elif char in "}]":
+            if not stack or stack.pop() != char:
+                return None
+            if not stack:
+                return source[start:position + 1]
+    return None
+
+def extract_js_json(source: str, name: str) -> Optional[Any]:
+    literal = extract_js_literal(source, name)
+    if literal is None:
+        return None
+    try:
+        return json.loads(literal)
+    except ValueError:
+        return None
@@ -0,0 +1,209 @@
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, get_args, get_origin
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+# Быстрая сериализация ответов: объекты ORM раскладываются в dict по заранее собранному
+# списку полей модели ответа и сразу кодируются orjson, без валидации Pydantic на каждый объект.
+# Значения берутся как есть, поэтому загружены должны быть все связи, которые есть в модели
+
+Serializer = Callable[[Any], Optional[Dict[str, Any]]]
+
+_serializers: Dict[type, Serializer] = {}
+
+def _nested_model(annotation) -> Tuple[Optional[type], bool]:
+    # Optional[X], List[X], Optional[List[X]] -> (X, список ли), если X - модель Pydantic
+    is_list = False
+    while True:
+        origin = get_origin(annotation)
+        if origin is Union:
+            args = [arg for arg in get_args(annotation) if arg is not type(None)]
+            if len(args) != 1:
+                return None, False
+            annotation = args[0]
+        elif origin in (list, List):
+            args = get_args(annotation)
+            if not args:
+                return None, False
+            is_list = True
+            annotation = args[0]
+        else:
+            break
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, is_list
+    return None, False
+
+def serializer(model: type) -> Serializer:
+    # Собирается один раз на модель: простые поля читаются одним attrgetter, вложенные модели - своими сериализаторами
+    if model in _serializers:
+        return _serializers[model]
+
+    plain: List[str] = []
+    nested: List[Tuple[str, type, bool]] = []
+    for name, field in model.model_fields.items():
+        nested_model, is_list = _nested_model(field.annotation)
+        if nested_model is None:
+            plain.append(name)
+        else:
+            nested.append((name, nested_model, is_list))
+
+    get_plain = attrgetter(*plain) if plain else None
+    single = len(plain) == 1
+    nested_serializers: List[Tuple[str, Serializer, bool]] = []
+
+    def serialize(obj: Any) -> Optional[Dict[str, Any]]:
+        if obj is None:
+            return None
+        if get_plain is None:
+            data = {}
+        elif single:
+            data = {plain[0]: get_plain(obj)}
+        else:
+            data = dict(zip(plain, get_plain(obj)))
+        for name, nested_serializer, is_list in nested_serializers:
+            value = getattr(obj, name)
+            if is_list:
+                data[name] = [nested_serializer(item) for item in value] if value is not None else None
+            else:
+                data[name] = nested_serializer(value)
+        return data
+
+    # Регистрируем до сборки вложенных: модель может ссылаться на себя
+    _serializers[model] = serialize
+    nested_serializers.extend((name, serializer(nested_model), is_list) for name, nested_model, is_list in nested)
+    return serialize
+
+def _default(value: Any) -> Any:
+    # То, что orjson не умеет сам (модели Pydantic, Decimal и т.п.), - через jsonable_encoder
+    return jsonable_encoder(value)
+
+def dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+if __name__ == "__main__":
+    # Бенчмарк на синтетических данных, база не нужна: python -m utils.serialization
+    import json
+    import time
+    from datetime import datetime, timedelta
+
+    from pydantic import TypeAdapter
+
+    from models import (
+        Breeder, Dog, DogRead, Litter, MedicalRecord, MergeLog, Owner, Title
+    )
+    from models.dog import DogListResponse
+    from services.pedigree_service import PedigreeService
+
+    born = datetime(2015, 4, 1)
+
+    def loaded(obj):
+        # Как у строки из базы: все колонки заполнены, незаданные - NULL
+        for name in type(obj).model_fields:
+            if name not in obj.__dict__:
+                setattr(obj, name, None)
+        return obj
+
+    def make_dog(dog_id: int, full: bool = True) -> Dog:
+        dog = loaded(Dog(
+            id=dog_id, uuid=f"uuid-{dog_id}", registered_name=f"Snowy Kennel Dog {dog_id}",
+            call_name=f"Dog{dog_id}", sex=1 + dog_id % 2, year_of_birth=2015, date_of_birth=born,
+            land_of_birth="Russia", color="black & white", coi=0.0123, coi_updated_on=born,
+            modified_at=born, source="breedarchive.com", has_conflicts=False,
+            health_info_general=[{"test": "hips", "result": "good"}], sports=["sled"],
+        ))
+        if not full:
+            return dog
+        dog.titles = [
+            Title(id=dog_id * 10 + i, dog_id=dog_id, short_name=f"CH{i}", long_name="Champion", is_prefix=True)
+            for i in range(3)
+        ]
+        dog.owners = [Owner(id=dog_id, uuid=f"owner-{dog_id}", name="Owner Name", is_main_owner=True)]
+        dog.breeders = [Breeder(id=dog_id, uuid=f"breeder-{dog_id}", name="Breeder Name", is_breeder=True)]
+        dog.sire = make_dog(dog_id + 100000, full=False)
+        dog.dam = make_dog(dog_id + 200000, full=False)
+        dog.siblings = [make_dog(dog_id + 300000 + i, full=False) for i in range(3)]
+        dog.birth_litter = Litter(id=dog_id, date_of_birth=born, litter_male_count=3, litter_female_count=2)
+        dog.litters_as_dam, dog.litters_as_sire, dog.litters_as_mating_partner = [], [], []
+        dog.medical_records = [
+            MedicalRecord(id=dog_id, dog_id=dog_id, registry="OFA", test_date=born, conclusion="Excellent")
+        ]
+        dog.merge_logs = [
+            MergeLog(
+                id=dog_id * 10 + i, dog_id=dog_id, resolved_fields={"color": "source"},
+                old_values={"color": "black"}, new_values={"color": "black & white"}, conflicts={},
+                resolved_date=born + timedelta(days=i)
+            )
+            for i in range(5)
+        ]
+        return dog
+
+    def measure(fn: Callable[[], bytes], repeat: int) -> Tuple[float, int]:
+        fn()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            size = len(fn())
+        return (time.perf_counter() - started) / repeat * 1000, size
+
+    def fastapi_json(content: Any) -> bytes:
+        # Как JSONResponse: separators без пробелов, ensure_ascii=False
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+    # Страница списка: 100 собак со всеми связями
+    page = {
+        "data": [make_dog(dog_id) for dog_id in range(1, 101)],
+        "meta": {"page": 1, "per_page": 100, "total": 100, "total_pages": 1, "has_more": False},
+    }
+    list_adapter = TypeAdapter(DogListResponse)
+    dog_read = serializer(DogRead)
+
+    def page_pydantic() -> bytes:
+        # Путь FastAPI с response_model: валидация модели ответа, затем dump в JSON-режиме
+        value = list_adapter.validate_python(page, from_attributes=True)
+        return fastapi_json(list_adapter.dump_python(value, mode="json"))
+
+    def page_fast() -> bytes:
+        return dumps({"data": [dog_read(dog) for dog in page["data"]], "meta": page["meta"]})
+
+    # Родословная на 8 поколений: полное двоичное дерево из 255 собак с титулами, владельцами и заводчиками
+    tree_dogs: Dict[int, Dog] = {}
+    for dog_id in range(1, 256):
+        dog = make_dog(dog_id, full=False)
+        dog.sire_id = dog_id * 2 if dog_id * 2 < 256 else None
+        dog.dam_id = dog_id * 2 + 1 if dog_id * 2 + 1 < 256 else None
+        dog.titles = [loaded(Title(id=dog_id, dog_id=dog_id, short_name="CH", long_name="Champion", is_prefix=True))]
+        dog.owners = [Owner(id=dog_id, uuid=f"owner-{dog_id}", name="Owner Name", is_main_owner=True)]
+        dog.breeders = [Breeder(id=dog_id, uuid=f"breeder-{dog_id}", name="Breeder Name", is_breeder=True)]
+        tree_dogs[dog_id] = dog
+    pedigree_service = PedigreeService(None)
+
+    def tree_model_dump() -> bytes:
+        # Прежний путь: model_dump каждой собаки и jsonable_encoder
+        def build(dog_id: Optional[int], depth: int) -> Optional[Dict[str, Any]]:
+            dog = tree_dogs.get(dog_id) if dog_id is not None else None
+            if depth == 0 or dog is None:
+                return None
+            node = dog.model_dump()
+            node["titles"] = [title.model_dump() for title in dog.titles]
+            node["owners"] = [owner.model_dump() for owner in dog.owners]
+            node["breeders"] = [breeder.model_dump() for breeder in dog.breeders]
+            node["dam"] = build(dog.dam_id, depth - 1)
+            node["sire"] = build(dog.sire_id, depth - 1)
+            return node
+        return fastapi_json(jsonable_encoder(build(1, 8)))
+
+    def tree_fast() -> bytes:
+        return dumps(pedigree_service.build_tree(tree_dogs, 1, 8, detailed=True))
+
+    assert json.loads(page_fast()) == json.loads(page_pydantic())
+    assert json.loads(tree_fast()) == json.loads(tree_model_dump())
+
+    print(f"{'payload':28s} {'current':>10s} {'orjson':>10s} {'speedup':>8s} {'bytes':>9s}")
+    for name, current, fast, repeat in (
+        ("100-dog page (DogRead)", page_pydantic, page_fast, 20),
+        ("8-generation tree (255)", tree_model_dump, tree_fast, 50),
+    ):
+        current_ms, size = measure(current, repeat)
+        fast_ms, _ = measure(fast, repeat)
+        print(f"{name:28s} {current_ms:8.2f}ms {fast_ms:8.2f}ms {current_ms / fast_ms:7.1f}x {size:9d}")
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+from utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Блокировка живет не дольше самого долгого вычисления: если держатель упал, ее заберет следующий
+LOCK_TTL = 30
+# Результат держится в Redis, пока его забирают ожидающие из других воркеров
+RESULT_TTL = 30
+POLL_MIN = 0.02
+POLL_MAX = 0.5
+
+# Снимаем блокировку, только если она все еще наша
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Результат "нет данных" (None) хранится пустой строкой
+NONE_MARKER = b""
+
+class SingleFlight:
+    # Объединение одинаковых одновременных вычислений:
+    # в процессе - общая задача, между воркерами - блокировка в Redis и общий результат.
+    # Функции возвращают готовые байты ответа (или None), чтобы их можно было передать через Redis
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.shared_local = 0
+        self.shared_remote = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared_local += 1
+        else:
+            # Вычисление идет в отдельной задаче, а не в запросе первого пришедшего:
+            # отмена этого запроса не должна обрывать вычисление для остальных
+            task = asyncio.get_running_loop().create_task(self._run(key, fn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        # shield: отмена одного ожидающего запроса (в том числе первого) не отменяет общее вычисление
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Если все ожидающие отменились, исключение никто не заберет; без этого Task ругался бы в лог
+        if not task.cancelled():
+            task.exception()
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        lock_key, result_key = f"sf:lock:{key}", f"sf:result:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + LOCK_TTL
+        delay = POLL_MIN
+        waiting = False
+        while True:
+            try:
+                # Ожидающий сначала проверяет результат: держатель мог закончить и снять блокировку
+                data = await cache.redis.get(result_key) if waiting else None
+                if data is None and await cache.redis.set(lock_key, token, nx=True, ex=LOCK_TTL):
+                    # Результат прошлого вычисления не должен достаться ожидающим этого
+                    await cache.redis.delete(result_key)
+                    break
+            except Exception as e:
+                # Redis недоступен - считаем сами
+                logger.warning(f"Single-flight lock unavailable for {key}: {str(e)}")
+                self.leaders += 1
+                return await fn()
+            if data is not None:
+                self.shared_remote += 1
+                return None if data == NONE_MARKER else data
+            if time.monotonic() > deadline:
+                break
+            waiting = True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, POLL_MAX)
+
+        # Держим блокировку (или не дождались чужого результата) - считаем сами
+        self.leaders += 1
+        try:
+            result = await fn()
+            try:
+                await cache.redis.set(result_key, NONE_MARKER if result is None else result, ex=RESULT_TTL)
+            except Exception as e:
+                logger.warning(f"Could not share single-flight result for {key}: {str(e)}")
+            return result
+        finally:
+            try:
+                await cache.redis.eval(RELEASE_SCRIPT, 1, lock_key, token)
+            except Exception as e:
+                logger.warning(f"Could not release single-flight lock for {key}: {str(e)}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "shared_local": self.shared_local,
+            "shared_remote": self.shared_remote,
+        }
+
+single_flight = SingleFlight()